@@ -0,0 +1,111 @@
+"""Iterative `camelize_object` vs the previous recursive implementation.
+
+Runs on wide (many keys, long lists) and deep (nested) data; the recursive
+version cannot convert data nested deeper than the recursion limit.
+Requires `djangorestframework` and `djangorestframework-camel-case`.
+
+Usage:
+    python benchmarks/camelize_object.py [--number N] [--depth D]
+"""
+import argparse
+import json
+import re
+import timeit
+from collections import OrderedDict
+
+from django.conf import settings
+
+settings.configure()
+
+from djangorestframework_camel_case.util import (  # noqa: E402
+    camelize_re,
+    is_iterable,
+    underscore_to_camel,
+)
+
+from communicate.utils.format.case.django import camelize_object  # noqa: E402
+
+
+def recursive_camelize_object(data, **options):
+    ignore_fields = options.get("ignore_fields") or ()
+    if isinstance(data, dict):
+        new_dict = OrderedDict()
+        for key, value in data.items():
+            if isinstance(key, str) and "_" in key:
+                new_key = re.sub(camelize_re, underscore_to_camel, key)
+            else:
+                new_key = key
+            if key not in ignore_fields and new_key not in ignore_fields:
+                new_dict[new_key] = recursive_camelize_object(value, **options)
+            else:
+                new_dict[key] = value
+        return new_dict
+    if is_iterable(data) and not isinstance(data, str):
+        return [recursive_camelize_object(item, **options) for item in data]
+    return data
+
+
+def wide(rows: int = 2000) -> dict:
+    return {
+        "next_page_url": "https://example.com/?page=2",
+        "total_count": rows,
+        "results": [
+            {
+                "order_id": index,
+                "customer_name": "name",
+                "created_at": "2024-01-01T00:00:00",
+                "shipping_address": {"street_name": "s", "postal_code": "1"},
+                "line_items": [
+                    {"unit_price": 1.5, "sku_code": "a", "tax_rate": 0.2}
+                    for _ in range(5)
+                ],
+            }
+            for index in range(rows)
+        ],
+    }
+
+
+def deep(depth: int) -> dict:
+    data = {"leaf_value": 1}
+    for level in range(depth):
+        data = {"child_node": data, "node_level": level}
+    return data
+
+
+def _measure(stmt, number: int) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label, data in (("wide", wide()), ("deep_500", deep(500))):
+        assert camelize_object(data) == recursive_camelize_object(data)
+        recursive = _measure(
+            lambda: recursive_camelize_object(data), args.number
+        )
+        iterative = _measure(lambda: camelize_object(data), args.number)
+        results[label] = {
+            "ms": {"recursive": recursive, "iterative": iterative},
+            "speedup": recursive / iterative,
+        }
+
+    data = deep(args.depth)
+    try:
+        recursive_camelize_object(data)
+        recursive = "ok"
+    except RecursionError:
+        recursive = "RecursionError"
+    results[f"deep_{args.depth}"] = {
+        "recursive": recursive,
+        "iterative_ms": _measure(lambda: camelize_object(data), 1),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cached vs uncached case conversion.
+
+Times the conversions on their own and the name conversions paid by every
+publish (`Payload.get_event_name`, the camelized publisher name) through
+`AmazonSNSPublisher.build_event`.
+
+Usage:
+    python benchmarks/case_conversion.py [--number N]
+"""
+import argparse
+import json
+import timeit
+from unittest import mock
+from uuid import UUID, uuid4
+
+from communicate.utils.eventbus import EventPayload
+from communicate.utils.eventbus import base
+from communicate.utils.eventbus.publisher import AmazonSNSPublisher, publishers
+from communicate.utils.format.case import base as case
+
+WORDS = ["order_id", "customer_id", "created_at", "unit_price", "line_items"]
+DATA = {
+    "order_id": 1,
+    "customer": {"customer_id": 2, "billing_address": "x"},
+    "line_items": [{"unit_price": 1.5, "sku_code": "a"} for _ in range(10)],
+}
+
+
+class BenchOrderPlacedPayload(EventPayload):
+    id: UUID
+    status: str
+
+
+def _measure(stmt, number: int) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def _uncached():
+    """Patch the call sites with the undecorated conversions"""
+    camelize = case.camelize.__wrapped__
+
+    def decamelize(word):
+        return case.EXTRA_UNDERSCORE_RE.sub(
+            "_", case._camel_to_snake.__wrapped__(word)
+        )
+
+    return mock.patch.multiple(
+        case, camelize=camelize, decamelize=decamelize
+    ), mock.patch.object(base, "camelize", camelize), mock.patch.object(
+        publishers, "camelize", camelize
+    )
+
+
+def _run(publisher, payload, number: int) -> dict:
+    return {
+        "camelize_us": _measure(
+            lambda: [case.camelize(w) for w in WORDS], number
+        ),
+        "decamelize_us": _measure(
+            lambda: [case.decamelize(case.camelize(w)) for w in WORDS], number
+        ),
+        "camelize_keys_us": _measure(lambda: case.camelize_keys(DATA), number),
+        "build_event_us": _measure(
+            lambda: publisher.build_event(payload.get_event_name(), payload),
+            number,
+        ),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    with mock.patch("boto3.session.Session"):
+        publisher = AmazonSNSPublisher(
+            "bench_order_service",
+            {"topic_arn": "arn:aws:sns:us-east-1:000000000000:bench"},
+        )
+    payload = BenchOrderPlacedPayload(id=uuid4(), status="placed")
+
+    results = {"cached": _run(publisher, payload, args.number)}
+    patches = _uncached()
+    for patch in patches:
+        patch.start()
+    try:
+        results["uncached"] = _run(publisher, payload, args.number)
+    finally:
+        for patch in patches:
+            patch.stop()
+    results["speedup"] = {
+        key: results["uncached"][key] / results["cached"][key]
+        for key in results["cached"]
+    }
+    results["cache_info"] = case.cache_info()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Tail latency of hedged vs plain publishes on simulated connections.
+
+Every attempt takes `--latency` ms, a `--slow` share of them is stuck on a
+slow connection and times out after `--slow-factor` times longer. Plain
+publishes retry a timed out attempt, hedged ones take the response of the
+hedge, which went out on another connection and drew its own latency.
+
+Usage:
+    python benchmarks/hedging.py [--calls N] [--slow 0.03] [--percentile 90]
+
+Hedging only helps when `--percentile` lies above the slow share.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from communicate.utils.eventbus.metrics import Timing
+from communicate.utils.eventbus.publisher.hedge import Hedger
+
+
+def _publish(latency: float, slow: float, factor: float, seed: int):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            stuck = rng.random() < slow
+        time.sleep(latency * (factor if stuck else 1.0))
+        if stuck:
+            raise TimeoutError
+
+    return call
+
+
+def _retried(call):
+    while True:
+        try:
+            return call()
+        except TimeoutError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--slow", type=float, default=0.03)
+    parser.add_argument("--slow-factor", type=float, default=15.0)
+    parser.add_argument("--percentile", type=float, default=90.0)
+    args = parser.parse_args(argv)
+
+    latency = args.latency / 1000
+    call = _publish(latency, args.slow, args.slow_factor, seed=1)
+    plain = Timing(args.calls)
+    for _ in range(args.calls):
+        started = time.perf_counter()
+        _retried(call)
+        plain.add(time.perf_counter() - started)
+
+    call = _publish(latency, args.slow, args.slow_factor, seed=1)
+    hedger = Hedger(
+        percentile=args.percentile, initial_delay=latency * 2, max_ratio=0.1
+    )
+    for _ in range(args.calls):
+        _retried(lambda: hedger.call(call))
+
+    stats = hedger.stats()
+    hedged = stats["timings"]["latency_seconds"]
+    print(json.dumps({
+        "plain_ms": {
+            "p50": plain.percentile(50) * 1e3,
+            "p99": plain.percentile(99) * 1e3,
+        },
+        "hedged_ms": {"p50": hedged["p50"] * 1e3, "p99": hedged["p99"] * 1e3},
+        "extra_requests": stats["extra_requests"],
+        "p99_saved_ms": stats["p99_saved_seconds"] * 1e3,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
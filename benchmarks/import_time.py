@@ -0,0 +1,78 @@
+"""Cold start regression benchmark based on ``python -X importtime``.
+
+Usage:
+    python benchmarks/import_time.py [module] [--runs N] [--budget-ms MS]
+
+Prints the cumulative import time of `module` (median of N fresh
+interpreters), the slowest imported packages and fails when one of the
+heavy transport dependencies gets imported eagerly again or when the
+budget is exceeded.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("boto3", "botocore", "kombu", "celery")
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            timings[match.group(4)] = int(match.group(2))
+    return timings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("module", nargs="?", default="communicate.utils.eventbus")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    total_ms = statistics.median(run[args.module] for run in runs) / 1000
+    last = runs[-1]
+    heavy = sorted(
+        name for name in last if name.split(".")[0] in HEAVY_MODULES
+    )
+    top = sorted(last.items(), key=lambda item: -item[1])[: args.top]
+
+    print(
+        json.dumps(
+            {
+                "module": args.module,
+                "cumulative_ms": total_ms,
+                "eagerly_imported_heavy_modules": heavy,
+                "top_us": dict(top),
+            },
+            indent=2,
+        )
+    )
+
+    if heavy:
+        print(f"FAIL: heavy modules imported eagerly: {heavy}", file=sys.stderr)
+        return 1
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(
+            f"FAIL: {total_ms:.1f}ms exceeds budget of {args.budget_ms}ms",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Payload-derived projection vs whole rows in `DjangoCeleryTaskWithCallback`.
+
+Loads wide rows from an on-disk SQLite database and builds the success
+payload, the way the task callbacks do.
+
+Usage:
+    python benchmarks/projection.py [--rows N] [--width BYTES]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+
+import django
+from django.conf import settings
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "projection.sqlite3")
+settings.configure(
+    DATABASES={
+        "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": DB_PATH}
+    },
+    # this script is the app of the benchmark models
+    INSTALLED_APPS=[__name__],
+)
+django.setup()
+
+from django.db import connection, models  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from pydantic import BaseModel  # noqa: E402
+
+from communicate.utils.eventbus import EventFailPayload, EventPayload  # noqa: E402
+from communicate.utils.eventbus.celery.tasks import (  # noqa: E402
+    DjangoCeleryTaskWithCallback,
+)
+
+
+class BenchCustomer(models.Model):
+    name = models.CharField(max_length=50)
+    profile = models.TextField()
+
+
+class BenchInvoice(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    number = models.CharField(max_length=20)
+    customer = models.ForeignKey(BenchCustomer, on_delete=models.CASCADE)
+    body = models.TextField()
+    audit_log = models.TextField()
+
+
+class BenchCustomerSchema(BaseModel):
+    name: str
+
+    class Config:
+        orm_mode = True
+
+
+class BenchInvoiceIssuedPayload(EventPayload):
+    id: uuid.UUID
+    number: str
+    customer: BenchCustomerSchema
+
+    class Config:
+        orm_mode = True
+
+
+class BenchInvoiceFailedPayload(EventFailPayload):
+    pass
+
+
+class IssueInvoiceTask(DjangoCeleryTaskWithCallback):
+    model = BenchInvoice
+    payload_cls = BenchInvoiceIssuedPayload
+    exception_payload_cls = BenchInvoiceFailedPayload
+
+
+def _setup(rows: int, width: int) -> list:
+    with connection.schema_editor() as editor:
+        editor.create_model(BenchCustomer)
+        editor.create_model(BenchInvoice)
+    customers = BenchCustomer.objects.bulk_create(
+        BenchCustomer(name=f"c{i}", profile="p" * width) for i in range(10)
+    )
+    invoices = BenchInvoice.objects.bulk_create(
+        BenchInvoice(
+            number=f"INV-{i}",
+            customer=customers[i % 10],
+            body="b" * width,
+            audit_log="a" * width,
+        )
+        for i in range(rows)
+    )
+    return [invoice.id for invoice in invoices]
+
+
+def _run(task, ids) -> dict:
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for invoice_id in ids:
+            task._instance = None
+            task._success_payload = None
+            task.get_instance(id=invoice_id)
+            task.get_event_payload()
+        elapsed = time.perf_counter() - started
+    return {
+        "queries": len(queries),
+        "total_seconds": elapsed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    ids = _setup(args.rows, args.width)
+    task = IssueInvoiceTask()
+    results = {}
+    for label, projection in (("whole_rows", False), ("projected", None)):
+        task.projection = projection
+        _run(task, ids[:50])  # warm up
+        results[label] = _run(task, ids)
+    results["speedup"] = (
+        results["whole_rows"]["total_seconds"]
+        / results["projected"]["total_seconds"]
+    )
+    print(json.dumps(results, indent=2))
+    os.remove(DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
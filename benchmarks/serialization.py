@@ -0,0 +1,83 @@
+"""Generated codecs vs pydantic `parse_raw`/`.json(by_alias=True)`.
+
+Usage:
+    python benchmarks/serialization.py [--number N]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID, uuid4
+
+from pydantic import BaseModel
+
+from communicate.utils.eventbus import Event, EventPayload, EventRegistry
+from communicate.utils.eventbus.serialization import get_codec
+
+
+class BenchLinePayload(BaseModel):
+    sku: str
+    quantity: int
+    price: float
+
+
+class BenchOrderPayload(EventPayload):
+    id: UUID
+    customer_id: UUID
+    status: str
+    total: float
+    created_at: datetime
+    note: Optional[str] = None
+    lines: List[BenchLinePayload] = []
+
+
+def _event() -> Event:
+    payload = BenchOrderPayload(
+        id=uuid4(),
+        customer_id=uuid4(),
+        status="placed",
+        total=42.5,
+        created_at=datetime.utcnow(),
+        lines=[
+            BenchLinePayload(sku=f"sku-{i}", quantity=i, price=i * 1.5)
+            for i in range(10)
+        ],
+    )
+    return Event.create("BenchOrder", "bench", payload)
+
+
+def _measure(stmt, number: int) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    registered = EventRegistry().get_event_by_name(
+        BenchOrderPayload.get_event_name()
+    )
+    raw = _event().json(by_alias=True)
+    results = {}
+    for label, model in (("Event", Event), ("registered", registered)):
+        codec = get_codec(model)
+        instance = model.parse_raw(raw)
+        pydantic_decode = _measure(lambda: model.parse_raw(raw), args.number)
+        fast_decode = _measure(lambda: codec.decode(raw), args.number)
+        pydantic_encode = _measure(
+            lambda: instance.json(by_alias=True), args.number
+        )
+        fast_encode = _measure(lambda: codec.encode(instance), args.number)
+        results[label] = {
+            "decode_us": {"pydantic": pydantic_decode, "generated": fast_decode},
+            "decode_speedup": pydantic_decode / fast_decode,
+            "encode_us": {"pydantic": pydantic_encode, "generated": fast_encode},
+            "encode_speedup": pydantic_encode / fast_encode,
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
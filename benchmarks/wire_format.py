@@ -0,0 +1,93 @@
+"""Size and encode/decode time of the wire formats.
+
+Compares `event.json(by_alias=True)`/`parse_raw` with the JSON and
+MessagePack `WireCodec`s on a numeric-heavy event. Requires `msgpack`.
+
+Usage:
+    python benchmarks/wire_format.py [--number N] [--readings R]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+from uuid import UUID, uuid4
+
+from pydantic import BaseModel
+
+from communicate.utils.eventbus import Event, EventPayload
+from communicate.utils.eventbus.wire import get_wire_codec
+
+
+class BenchReadingPayload(BaseModel):
+    sensor_id: int
+    value: float
+    delta: float
+    sampled_at: datetime
+
+
+class BenchTelemetryPayload(EventPayload):
+    id: UUID
+    device_id: int
+    counters: List[int]
+    readings: List[BenchReadingPayload]
+
+
+def _event(readings: int) -> Event:
+    started = datetime(2024, 1, 1)
+    payload = BenchTelemetryPayload(
+        id=uuid4(),
+        device_id=12345,
+        counters=[index * 7919 for index in range(readings)],
+        readings=[
+            BenchReadingPayload(
+                sensor_id=index,
+                value=index * 0.125,
+                delta=-index / 3,
+                sampled_at=started + timedelta(seconds=index),
+            )
+            for index in range(readings)
+        ],
+    )
+    return Event.create("BenchTelemetry", "bench", payload)
+
+
+def _measure(stmt, number: int) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    event = _event(args.readings)
+    baseline = event.json(by_alias=True)
+    results = {
+        "pydantic": {
+            "bytes": len(baseline.encode()),
+            "encode_us": _measure(
+                lambda: event.json(by_alias=True), args.number
+            ),
+            "decode_us": _measure(
+                lambda: Event.parse_raw(baseline), args.number
+            ),
+        }
+    }
+    for name in ("json", "msgpack"):
+        codec = get_wire_codec(name)
+        raw = codec.encode(event)
+        assert codec.decode(raw) == Event.parse_raw(baseline)
+        results[name] = {
+            "bytes": len(raw.encode()),
+            "encode_us": _measure(lambda: codec.encode(event), args.number),
+            "decode_us": _measure(lambda: codec.decode(raw), args.number),
+        }
+    for result in results.values():
+        result["size_ratio"] = result["bytes"] / results["pydantic"]["bytes"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
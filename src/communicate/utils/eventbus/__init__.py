@@ -1,8 +1,26 @@
+import importlib
+from typing import TYPE_CHECKING
+
 from .base import CeleryEvent, Event, EventMeta
-from .payload import EventConsumedPayload, EventFailPayload, EventPayload
-from .publisher import AmazonSNSPublisher, PublisherWithRouting
+from .envelope import LazyEvent
+from .payload import (
+    EventConsumedPayload,
+    EventDeltaPayload,
+    EventFailPayload,
+    EventPayload,
+)
 from .registry import EventRegistry
-from .subscriber import AmazonSNSSubscriber
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .publisher import AmazonSNSPublisher, PublisherWithRouting
+    from .subscriber import AmazonSNSSubscriber
+
+# Transport classes pull in boto3/kombu, import them on first access only
+_lazy_exports = {
+    "AmazonSNSPublisher": ".publisher",
+    "PublisherWithRouting": ".publisher",
+    "AmazonSNSSubscriber": ".subscriber",
+}
 
 __all__ = (
     "AmazonSNSPublisher",
@@ -11,8 +29,26 @@ __all__ = (
     "EventRegistry",
     "Event",
     "EventPayload",
+    "EventDeltaPayload",
     "EventFailPayload",
     "EventConsumedPayload",
     "EventMeta",
+    "LazyEvent",
     "PublisherWithRouting",
 )
+
+
+def __getattr__(name: str):
+    try:
+        module_name = _lazy_exports[name]
+    except KeyError:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        ) from None
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -29,6 +29,8 @@ class EventMeta(BaseModel):
     publisher_name: str
     event_name: str
     _routing_keys: Optional[dict] = {}
+    # generated decoders may skip __init__, see serialization.py
+    __fast_decode__ = True
 
     def __init__(self, **kwargs):
         self._routing_keys = kwargs.pop("routing_keys", {})
@@ -2,18 +2,42 @@ import json
 import logging
 from celery.exceptions import InvalidTaskError
 from celery.worker.consumer import Consumer as CeleryConsumer
-from communicate.utils.eventbus import CeleryEvent
+from communicate.utils.eventbus import CeleryEvent, profiling
+from communicate.utils.eventbus.dedup import DeduplicationStore, envelope_key
+from communicate.utils.eventbus.wire import content_type_of, get_wire_codec
 from kombu.exceptions import ContentDisallowed, DecodeError
 from kombu.message import Message
-from pydantic import ValidationError
 from vine import promise as vine_promise
 
 logger = logging.getLogger(__package__)
 
 
+def _completing(ack, dedup_store: DeduplicationStore, key: str):
+    """`ack` marking the claimed key as processed, the request acknowledges
+    its message after the task when it is `acks_late`"""
+
+    def on_ack(*args, **kwargs):
+        ack(*args, **kwargs)
+        dedup_store.complete(key)
+
+    return on_ack
+
+
+def _releasing(reject, dedup_store: DeduplicationStore, key: str):
+    """`reject` releasing the claimed key so the redelivery is processed"""
+
+    def on_reject(*args, **kwargs):
+        dedup_store.release(key)
+        reject(*args, **kwargs)
+
+    return on_reject
+
+
 class SQSConsumer(CeleryConsumer):  # pylint: disable=too-few-public-methods
 
     callbacks = None
+    # Set on a subclass to acknowledge SNS redeliveries without running tasks
+    dedup_store: DeduplicationStore = None
 
     def on_unknown_task(
             self, body, message, exc
@@ -31,7 +55,13 @@ class SQSConsumer(CeleryConsumer):  # pylint: disable=too-few-public-methods
         callbacks = self.on_task_message
         call_soon = self.call_soon
 
-        def on_task_received(  # pylint: disable=inconsistent-return-statements
+        dedup_store = self.dedup_store
+
+        def on_task_received(message: Message):
+            with profiling.section("consumer.task_received"):
+                return handle(message)
+
+        def handle(  # pylint: disable=inconsistent-return-statements
                 message: Message,
         ):
             try:
@@ -41,14 +71,23 @@ class SQSConsumer(CeleryConsumer):  # pylint: disable=too-few-public-methods
             except Exception as exc:  # pylint: disable=broad-except
                 return self.on_decode_error(message, exc)
 
+            dedup_key = envelope_key(data) if dedup_store is not None else None
+            if dedup_key is not None and not dedup_store.claim(dedup_key):
+                logger.info(  # pylint: disable=logging-too-many-args
+                    "Received duplicated event %s. Acknowledging...", dedup_key
+                )
+                return message.ack()
+
             try:
-                event = CeleryEvent.parse_raw(payload)
+                codec = get_wire_codec(content_type_of(data))
+                event = codec.decode(payload, CeleryEvent)
                 message._decoded_cache = (  # pylint: disable=protected-access
                     event.celery_payload
                 )
                 message.body = payload
                 message.headers = event.metadata.dict()
-            except ValidationError:
+            except ValueError:
+                # ValidationError, UnknownContentType, undecodable bodies
                 return on_unknown_message(payload, message)
 
             try:
@@ -56,17 +95,26 @@ class SQSConsumer(CeleryConsumer):  # pylint: disable=too-few-public-methods
             except KeyError as exc:
                 return on_unknown_task(None, message, exc)
 
+            on_ack, on_reject = message.ack_log_error, message.reject_log_error
+            if dedup_key is not None:
+                on_ack = _completing(on_ack, dedup_store, dedup_key)
+                on_reject = _releasing(on_reject, dedup_store, dedup_key)
+
             try:
                 strategy(
                     message,
                     event.celery_payload,
-                    promise(call_soon, (message.ack_log_error,)),
-                    promise(call_soon, (message.reject_log_error,)),
+                    promise(call_soon, (on_ack,)),
+                    promise(call_soon, (on_reject,)),
                     callbacks,
                 )
             except (InvalidTaskError, ContentDisallowed) as exc:
                 return on_invalid_task(event.celery_payload, message, exc)
             except DecodeError as exc:
                 return self.on_decode_error(message, exc)
+            except Exception:
+                if dedup_key is not None:
+                    dedup_store.release(dedup_key)
+                raise
 
         return on_task_received
@@ -0,0 +1,129 @@
+"""Load only the columns an event payload needs.
+
+`derive_projection(model, payload_cls)` maps the payload fields onto the
+Django model: plain fields go to `.only()`, forward foreign keys/one-to-one
+fields with a nested payload model to `.select_related()`, reverse foreign
+keys and many-to-many fields to `.prefetch_related()` with their own
+projected queryset. A payload field which is not a model field (property,
+method, annotation) may read any column, the model it belongs to is then
+loaded entirely.
+"""
+import functools
+from typing import Any, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel
+
+__all__ = (
+    "Projection",
+    "derive_projection",
+)
+
+
+class Projection(NamedTuple):
+    only: Tuple[str, ...] = ()
+    select_related: Tuple[str, ...] = ()
+    # (lookup, related model, projection of the related model or None)
+    prefetch_related: Tuple[Tuple[str, Any, Optional["Projection"]], ...] = ()
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> "Projection":
+        """Explicit projection, e.g.
+        `{"only": ["name", "author__name"], "select_related": ["author"],
+        "prefetch_related": ["tags"]}`
+        """
+        return cls(
+            only=tuple(spec.get("only", ())),
+            select_related=tuple(spec.get("select_related", ())),
+            prefetch_related=tuple(
+                (lookup, None, None) if isinstance(lookup, str) else lookup
+                for lookup in spec.get("prefetch_related", ())
+            ),
+        )
+
+    def apply(self, queryset):
+        from django.db.models import (  # pylint: disable=import-outside-toplevel
+            Prefetch,
+        )
+
+        if self.only:
+            queryset = queryset.only(*self.only)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        lookups = []
+        for lookup, model, projection in self.prefetch_related:
+            if model is None:
+                lookups.append(lookup)
+                continue
+            related = model._default_manager.all()  # pylint: disable=protected-access
+            if projection is not None:
+                related = projection.apply(related)
+            lookups.append(Prefetch(lookup, queryset=related))
+        if lookups:
+            queryset = queryset.prefetch_related(*lookups)
+        return queryset
+
+
+def _nested_model(field) -> Optional[type]:
+    type_ = field.type_
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        return type_
+    return None
+
+
+def _project(model, payload_cls, prefix: str = "", extra=()) -> Optional[Projection]:
+    from django.core.exceptions import (  # pylint: disable=import-outside-toplevel
+        FieldDoesNotExist,
+    )
+
+    opts = model._meta  # pylint: disable=protected-access
+    only = [prefix + opts.pk.name, *(prefix + name for name in extra)]
+    select_related = []
+    prefetch_related = []
+    for name, field in payload_cls.__fields__.items():
+        try:
+            model_field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        nested = _nested_model(field)
+
+        if model_field.many_to_many or model_field.one_to_many:
+            related = model_field.related_model
+            # the related queryset is joined back to the parent through
+            # the foreign key of a reverse relation
+            back = (
+                (model_field.field.name,)
+                if model_field.one_to_many and not model_field.concrete
+                else ()
+            )
+            inner = _project(related, nested, extra=back) if nested else None
+            prefetch_related.append((prefix + name, related, inner))
+        elif model_field.is_relation and nested is not None:
+            if not model_field.concrete:
+                # reverse one-to-one, cannot be restricted through only()
+                return None
+            inner = _project(
+                model_field.related_model, nested, prefix + name + "__"
+            )
+            select_related.append(prefix + name)
+            only.append(prefix + name)
+            if inner is not None:
+                only.extend(inner.only)
+                select_related.extend(inner.select_related)
+                prefetch_related.extend(inner.prefetch_related)
+        elif getattr(model_field, "concrete", False):
+            only.append(prefix + name)
+        else:
+            return None
+
+    return Projection(
+        only=tuple(dict.fromkeys(only)),
+        select_related=tuple(dict.fromkeys(select_related)),
+        prefetch_related=tuple(prefetch_related),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def derive_projection(model, payload_cls) -> Optional[Projection]:
+    """Projection loading the fields of `payload_cls` from `model`, None
+    when the payload needs the whole model"""
+    return _project(model, payload_cls)
@@ -1,16 +1,20 @@
 import abc
 import celery
 import logging
+import time
 from abc import ABC
 from billiard.einfo import ExceptionInfo
+from celery._state import _task_stack
 from ..exceptions import ApplicationError, EcosystemException
 from ..exceptions import ExceptionConvertor, GenericExceptionConvertor
-from ..payload import EventPayload
+from ..metrics import Stats
+from ..payload import EventDeltaPayload, EventPayload
+from .projection import Projection, derive_projection
 from ..publisher.publishers import AbstractPublisher
 from ...format.case.base import camelize
 from enum import Enum
 from pydantic import ValidationError
-from typing import Optional, Type
+from typing import Any, Dict, Iterable, List, Optional, Type, Union
 
 
 class TimeStamp(Enum):
@@ -34,6 +38,15 @@ class AbstractCeleryTaskWithCallback(celery.Task, ABC):
 
     logger = logging.getLogger("celery")
 
+    _metrics: Optional[Stats] = None
+
+    @property
+    def metrics(self) -> Stats:
+        """Payload construction counters/timings of this task"""
+        if self._metrics is None:
+            self._metrics = Stats()
+        return self._metrics
+
     @property
     def task_name(self) -> str:
         return camelize(self.__class__.__name__)
@@ -53,15 +66,26 @@ class AbstractCeleryTaskWithCallback(celery.Task, ABC):
         pass
 
     def _handle_callbacks(self, exc: Exception = None):
-        self._send_event(exc)
-        self._clean_db(exc)
-        self._clean()
+        try:
+            self._send_event(exc)
+            self._clean_db(exc)
+        finally:
+            # the task instance is shared by the runs of the worker
+            self._clean()
 
     def _clean(self):
         self._instance = None
 
-    def _send_event(self, exc: Exception):
+    def _build_event_payload(self, exc: Exception) -> Optional[EventPayload]:
+        started = time.perf_counter()
         payload = self.get_event_payload(exc)
+        self.metrics.observe(
+            "payload_seconds", time.perf_counter() - started
+        )
+        return payload
+
+    def _send_event(self, exc: Exception):
+        payload = self._build_event_payload(exc)
         if isinstance(payload, EventPayload):
             self.publisher.publish(payload.get_event_name(), payload)
 
@@ -122,6 +146,12 @@ class ModelCeleryTaskWithCallback(AbstractCeleryTaskWithCallback, ABC):
             a celery task to Ecosystem one.
         model: used to get model instance, generate event payload.
 
+        delta_payload_cls: opt-in, publish only the fields of `payload_cls`
+            changed since the instance was loaded by `get_instance`
+            instead of the whole success payload.
+        version_field: instance attribute holding the version of the
+            delta event, the publish time in nanoseconds when unset.
+
     Note:
         It is possible to override generated success event payload,
         by passing custom payload data using `self.task` setter.
@@ -132,6 +162,10 @@ class ModelCeleryTaskWithCallback(AbstractCeleryTaskWithCallback, ABC):
     exception_payload_cls: Type[EventPayload]
     exception_convertor: Type[ExceptionConvertor] = GenericExceptionConvertor
     model: Model
+    delta_payload_cls: Optional[Type[EventDeltaPayload]] = None
+    version_field: Optional[str] = None
+    _success_payload: Optional[EventPayload] = None
+    _snapshot: Optional[dict] = None
 
     def get_event_payload(
             self, exc: Optional[Exception] = None
@@ -140,6 +174,8 @@ class ModelCeleryTaskWithCallback(AbstractCeleryTaskWithCallback, ABC):
 
         if isinstance(exc, Exception):
             payload_getter = self._get_fail_event_payload
+        elif self.delta_payload_cls is not None:
+            payload_getter = self._get_delta_event_payload
         else:
             payload_getter = self._get_success_event_payload
 
@@ -158,12 +194,62 @@ class ModelCeleryTaskWithCallback(AbstractCeleryTaskWithCallback, ABC):
     def _get_success_event_payload(
             self, exc: Optional[Exception]  # pylint: disable=W0613
     ) -> EventPayload:
+        # built once per run, the fail event reuses it for the entity id
+        if self._success_payload is not None:
+            return self._success_payload
         if self.payload:
             event_payload = self.payload_cls(**self.payload)
         else:
             event_payload = self.payload_cls.from_orm(self._instance)
+        self.metrics.incr("payloads_built")
+        self._success_payload = event_payload
         return event_payload
 
+    def _take_snapshot(self):
+        """Remember the payload fields of the loaded instance"""
+        if self.delta_payload_cls is None or self._instance is None:
+            return
+        try:
+            self._snapshot = self.payload_cls.from_orm(self._instance).dict(
+                by_alias=True
+            )
+        except ValidationError:
+            # the delta event carries every field then
+            self._snapshot = None
+
+    def _get_version(self) -> int:
+        if self.version_field:
+            return getattr(self._instance, self.version_field)
+        return time.time_ns()
+
+    def _get_delta_event_payload(
+            self, exc: Optional[Exception]  # pylint: disable=W0613
+    ) -> EventDeltaPayload:
+        payload = self._get_success_event_payload(None)
+        # changes are keyed like the fields of the full event
+        current = payload.dict(by_alias=True)
+        snapshot = self._snapshot
+        if snapshot is None:
+            changes = current
+        else:
+            changes = {
+                name: value
+                for name, value in current.items()
+                if name not in snapshot or snapshot[name] != value
+            }
+        self.metrics.incr("delta_fields", len(changes))
+        return self.delta_payload_cls(
+            id=getattr(payload, "id", None),
+            version=self._get_version(),
+            changes=changes,
+            complete=snapshot is None,
+        )
+
+    def _clean(self):
+        super()._clean()
+        self._success_payload = None
+        self._snapshot = None
+
     def _get_id_from_payload(self):
         try:
             success_payload = self._get_success_event_payload(None)
@@ -197,16 +283,250 @@ class ModelCeleryTaskWithCallback(AbstractCeleryTaskWithCallback, ABC):
         if not self.payload_cls.Config.orm_mode:
             raise TypeError(f"{self.payload_cls} not support orm mode")
 
+        if self.delta_payload_cls is not None and not issubclass(
+                self.delta_payload_cls, EventDeltaPayload
+        ):
+            raise TypeError(
+                f"{self.delta_payload_cls} is not an EventDeltaPayload"
+            )
+
 
 class DjangoCeleryTaskWithCallback(ModelCeleryTaskWithCallback):
+    """
+    Attributes:
+        projection: columns loaded by `get_instance`. By default they are
+            derived from `payload_cls` (`.only()`, `.select_related()`,
+            `.prefetch_related()`); a dict such as
+            `{"only": [...], "select_related": [...]}` sets them
+            explicitly and `False` loads whole rows. Tasks reading other
+            fields of the instance should list them explicitly, deferred
+            fields cost a query each.
+    """
+
+    projection: Union[Projection, dict, bool, None] = None
+
+    def get_projection(self) -> Optional[Projection]:
+        if self.projection is False:
+            return None
+        if isinstance(self.projection, Projection):
+            return self.projection
+        if isinstance(self.projection, dict):
+            return Projection.from_spec(self.projection)
+        if self.payload or not getattr(self, "payload_cls", None):
+            # the success payload is not built from the instance
+            return None
+        return derive_projection(self.model, self.payload_cls)
+
+    def get_queryset(self):
+        queryset = self.model.objects.all()  # pylint: disable=no-member
+        projection = self.get_projection()
+        if projection is not None:
+            queryset = projection.apply(queryset)
+        return queryset
+
     def get_instance(self, **filter_by) -> Model:
         if filter_by:
-            self._instance = (
-                self.model.objects.get(  # pylint: disable=no-member
-                    **filter_by
-                )
-            )
+            self._success_payload = None
+            self._snapshot = None
+            self._instance = self.get_queryset().get(**filter_by)
+            self._take_snapshot()
         return self._instance
 
     def delete_instance(self, instance):
         instance.delete()
+
+
+class DjangoBatchCeleryTaskWithCallback(DjangoCeleryTaskWithCallback):
+    """Process many model instances in one task.
+
+    The task is called with a list of primary keys; the instances are
+    loaded in one query (`in_bulk`, with the payload projection) and the
+    task function runs once per instance::
+
+        @shared_task(bind=True, base=DjangoBatchCeleryTaskWithCallback, ...)
+        def do_entity_action(task, entity: Entity):
+            entity.do_action()
+
+        do_entity_action.delay_in_batches(entity_ids)
+
+    A failing instance does not stop the batch: its changes are rolled back
+    and it gets a fail event. Success and fail events are published with
+    one `publish_batch` call when the publisher supports it, instances are
+    deleted (`delete_on_success`/`delete_on_failure`) with one query.
+    Events the batch call fails or raises for (e.g. throttled) are retried
+    up to `publish_retries` times, events rejected as invalid are only
+    logged. Without `publish_batch` the events are published one by one and
+    failures are logged.
+
+    The task returns `{"succeeded": [pk, ...], "failed": {pk: error},
+    "unpublished": <number of events which could not be published>}`.
+    """
+
+    batch_size: int = 500
+    publish_retries: int = 3
+    publish_retry_delay: float = 0.5
+
+    def delay_in_batches(self, ids: Iterable, *args, **kwargs) -> list:
+        """Enqueue one task per `batch_size` primary keys"""
+        ids = list(ids)
+        return [
+            self.delay(ids[start:start + self.batch_size], *args, **kwargs)
+            for start in range(0, len(ids), self.batch_size)
+        ]
+
+    def get_instances(self, ids: Iterable) -> Dict[Any, Model]:
+        return self.get_queryset().in_bulk(list(ids))
+
+    def delete_instances(self, ids: List):
+        self.logger.info(
+            f"Deleting {len(ids)} instances of {self.model.__name__}"
+        )
+        self.model.objects.filter(pk__in=ids).delete()  # pylint: disable=no-member
+
+    def _run_one(self, instance, args, kwargs) -> Optional[Exception]:
+        from django.db import (  # pylint: disable=import-outside-toplevel
+            transaction,
+        )
+
+        try:
+            with transaction.atomic():
+                self.run(instance, *args, **kwargs)
+        except Exception as exc:  # noqa, pylint: disable=broad-except
+            self.logger.error(
+                f"Operation {self.task_name} instance: {instance} "
+                f"id: {instance.pk} Failed - {exc}"
+            )
+            return exc
+        return None
+
+    def _missing(self, pk) -> Exception:
+        return ApplicationError(
+            f"{self.model.__name__} {pk} does not exist", id=pk
+        )
+
+    def __call__(self, ids: Iterable, *args, **kwargs) -> dict:
+        # same request bookkeeping as celery.Task.__call__
+        _task_stack.push(self)
+        self.push_request(args=(ids, *args), kwargs=kwargs)
+        try:
+            return self.run_batch(ids, *args, **kwargs)
+        finally:
+            self.pop_request()
+            _task_stack.pop()
+
+    def run_batch(self, ids: Iterable, *args, **kwargs) -> dict:
+        to_python = self.model._meta.pk.to_python  # pylint: disable=protected-access
+        # ids may arrive serialized (e.g. UUIDs as strings)
+        requested = {to_python(pk): pk for pk in ids}
+        instances = self.get_instances(requested)
+        payloads = []
+        succeeded = []
+        failed = {}
+        to_delete = []
+
+        try:
+            for pk, raw_pk in requested.items():
+                instance = instances.get(pk)
+                self._instance = instance
+                self._success_payload = None
+                self._snapshot = None
+                self._take_snapshot()
+                if instance is None:
+                    exc = self._missing(raw_pk)
+                else:
+                    exc = self._run_one(instance, args, kwargs)
+                try:
+                    payload = self._build_event_payload(exc)
+                except ApplicationError:
+                    payload = None
+                if isinstance(payload, EventPayload):
+                    if exc is not None and payload.data.get("id") is None:
+                        payload.data["id"] = pk
+                    payloads.append(payload)
+
+                if exc is None:
+                    succeeded.append(raw_pk)
+                else:
+                    failed[raw_pk] = str(exc)
+                if instance is not None and (
+                        (exc and self.delete_on_failure)
+                        or (not exc and self.delete_on_success)
+                ):
+                    to_delete.append(pk)
+        finally:
+            self._clean()
+
+        unpublished = self._publish_payloads(payloads)
+        if to_delete:
+            self.delete_instances(to_delete)
+        return {
+            "succeeded": succeeded,
+            "failed": failed,
+            "unpublished": unpublished,
+        }
+
+    def _publish_payloads(self, payloads: List[EventPayload]) -> int:
+        """Publish the events of `payloads`, returns how many failed"""
+        if not payloads:
+            return 0
+        publish_batch = getattr(self.publisher, "publish_batch", None)
+        build_event = getattr(self.publisher, "build_event", None)
+        if publish_batch is None or build_event is None:
+            return self._publish_one_by_one(payloads)
+        events = [build_event(p.get_event_name(), p) for p in payloads]
+        rejected = 0
+        for attempt in range(self.publish_retries + 1):
+            if attempt:
+                self.metrics.incr("publish_retries")
+                time.sleep(self.publish_retry_delay * 2 ** (attempt - 1))
+            try:
+                response = publish_batch(events)
+            except Exception as exc:  # noqa, pylint: disable=broad-except
+                # the instances are committed already, retry or count them
+                self.logger.error(
+                    f"Batch operation {self.task_name} publishing "
+                    f"{len(events)} events failed - {exc!r}"
+                )
+                continue
+            retryable = []
+            for item in response.get("Failed", ()):
+                event = events[int(item["Id"])]
+                self.logger.error(
+                    f"Batch operation {self.task_name} publishing "
+                    f"{event.metadata.event_name} failed: "
+                    f"{item.get('Code')} {item.get('Message')}"
+                )
+                if item.get("SenderFault"):
+                    # the message itself is invalid, retrying would not help
+                    rejected += 1
+                else:
+                    retryable.append(event)
+            events = retryable
+            if not events:
+                break
+        self.metrics.incr("unpublished", rejected + len(events))
+        return rejected + len(events)
+
+    def _publish_one_by_one(self, payloads: List[EventPayload]) -> int:
+        unpublished = 0
+        for payload in payloads:
+            try:
+                self.publisher.publish(payload.get_event_name(), payload)
+            except Exception as exc:  # noqa, pylint: disable=broad-except
+                self.logger.error(
+                    f"Batch operation {self.task_name} publishing "
+                    f"{payload.get_event_name()} failed - {exc!r}"
+                )
+                unpublished += 1
+        self.metrics.incr("unpublished", unpublished)
+        return unpublished
+
+    # events were sent per instance by __call__
+    def on_success(self, retval, task_id, args, kwargs):
+        celery.Task.on_success(self, retval, task_id, args, kwargs)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        self.logger.error(
+            f"Batch operation {self.task_name} taskId: {task_id} Failed - {exc}"
+        )
+        celery.Task.on_failure(self, exc, task_id, args, kwargs, einfo)
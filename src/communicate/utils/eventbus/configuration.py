@@ -1,12 +1,35 @@
 import abc
+import errno
+import functools
 import json
 import logging
 import os
 import re
-from typing import List, Optional, Any
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger("config_builder")
 STORAGE = {}
+_MISSING = object()
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_path(path: str, delimiter: str = ".") -> Tuple[str, ...]:
+    """Split a dotted path once and reuse the resulting accessor keys."""
+    return tuple(path.split(delimiter))
+
+
+def _walk(config: dict, keys: Tuple[str, ...]) -> Any:
+    sel = config
+    try:
+        for key in keys:
+            sel = sel.get(key, _MISSING)
+            if sel is _MISSING:
+                break
+    except AttributeError:
+        return _MISSING
+    return sel
 
 
 class BaseConfigBuilder(abc.ABC):
@@ -48,12 +71,21 @@ class BaseConfigBuilder(abc.ABC):
         pass
 
 
+class NotEnoughCLIArguments(Exception):
+    pass
+
+
+class InterpolationCycleError(Exception):
+    pass
+
+
 class TemplateParser:
     tag_start: str
     _tag_start_len: int
     tag_end: str
     _tag_end_len: int
     tag_re: re.Pattern
+    _compiled: Dict[str, Tuple[Tuple[bool, str], ...]]
 
     def __init__(
             self,
@@ -69,34 +101,51 @@ class TemplateParser:
         self._tag_start_len = len(tag_start)
         self.tag_end = tag_end
         self._tag_end_len = len(tag_end)
+        self._compiled = {}
 
-    def __call__(self, obj: any, *args, **kwargs):
-        if isinstance(obj, str):
-            obj = self._parse(obj)
+    def __call__(self, obj: any, *args, _seen: tuple = (), **kwargs):
+        if isinstance(obj, str) and self.tag_start in obj:
+            obj = self._parse(obj, _seen)
         return obj
 
-    def _parse_item(self, entry: str) -> any:
-        if entry.startswith(self.tag_start):
-            x_path: str = entry[
-                          self._tag_start_len: -self._tag_end_len
-                          ].strip()
-            entry = self.inventory.read_value(x_path)
-        return entry
-
-    def _parse(self, line: str) -> any:
-        _res = []
+    def _compile(self, line: str) -> Tuple[Tuple[bool, str], ...]:
+        """Split `line` into (is_tag, text) parts, once per distinct string"""
+        try:
+            return self._compiled[line]
+        except KeyError:
+            pass
 
+        parts = []
         for entry in self.tag_re.split(line):
-            if entry:
-                _res.append(self._parse_item(entry))
+            if not entry:
+                continue
+            if entry.startswith(self.tag_start):
+                x_path: str = entry[
+                              self._tag_start_len: -self._tag_end_len
+                              ].strip()
+                parts.append((True, x_path))
+            else:
+                parts.append((False, entry))
 
-        res = _res[0] if len(_res) == 1 else "".join(map(str, _res))
+        compiled = self._compiled[line] = tuple(parts)
+        return compiled
 
-        return res
+    def _parse_item(self, x_path: str, _seen: tuple) -> any:
+        if x_path in _seen:
+            cycle = " -> ".join((*_seen, x_path))
+            raise InterpolationCycleError(f"Interpolation cycle: {cycle}")
+        value = self.inventory.read_value(x_path)
+        return self(value, _seen=(*_seen, x_path))
 
+    def _parse(self, line: str, _seen: tuple = ()) -> any:
+        _res = [
+            self._parse_item(text, _seen) if is_tag else text
+            for is_tag, text in self._compile(line)
+        ]
 
-class NotEnoughCLIArguments(Exception):
-    pass
+        res = _res[0] if len(_res) == 1 else "".join(map(str, _res))
+
+        return res
 
 
 class ConfigBuilder(BaseConfigBuilder):
@@ -115,6 +164,10 @@ class ConfigBuilder(BaseConfigBuilder):
     __class_name = "SETTINGS"
     __class = None
 
+    _lock = threading.RLock()
+    _read_cache: dict
+    _pending: list
+
     instance: "ConfigBuilder"
 
     def __new__(cls, *args, **kwargs):
@@ -133,16 +186,26 @@ class ConfigBuilder(BaseConfigBuilder):
         self._parse_text = parse_text
         self._parse_quoted_strings = parse_quoted_strings
         self._parse = parser(inventory=self)
+        self._read_cache = {}
+        if not hasattr(self, "_pending"):
+            self._pending = []
+
+    def invalidate(self):
+        """Drop cached reads, call it after mutating `config` in place"""
+        self._read_cache = {}
 
     def _add_value(self, entries: list, value: str):
-        sel = self._config
-        for entry in entries:
+        with self._lock:
+            sel = self._config
+            for entry in entries:
 
-            if entry == entries[-1]:
-                sel.setdefault(entry, self._parse_value(value))
-            else:
-                sel.setdefault(entry, {})
-            sel = sel[entry]
+                if entry == entries[-1]:
+                    sel.setdefault(entry, self._parse_value(value))
+                    self._pending.append((sel, entry))
+                else:
+                    sel.setdefault(entry, {})
+                sel = sel[entry]
+            self.invalidate()
 
     def _parse_value(self, value: str):
         value = value.strip()
@@ -172,13 +235,30 @@ class ConfigBuilder(BaseConfigBuilder):
     def set_base_path(self, path):
         self._base_path = path
 
-    def _from_dict(self, conf: dict, obj: dict):
+    def _merge(self, conf: dict, obj: dict, touched: list) -> dict:
         for setting, value in obj.items():
             _current_value = conf.get(setting)
             if isinstance(value, dict) and isinstance(_current_value, dict):
-                value = self._from_dict(_current_value, value)
+                value = self._merge(_current_value, value, touched)
+            else:
+                touched.append((conf, setting))
             conf[setting] = value
-        return self.resolve_interpolations(conf)
+        return conf
+
+    def _from_dict(self, conf: dict, obj: dict):
+        """Merge `obj` into `conf`, resolving templates only in the
+        subtrees that were replaced (plus values queued by env/CLI sources).
+        """
+        touched = self._pending
+        self._pending = []
+        conf = self._merge(conf, obj, touched)
+        self.invalidate()
+        try:
+            for container, key in touched:
+                container[key] = self.resolve_interpolations(container[key])
+        finally:
+            self.invalidate()
+        return conf
 
     def resolve_interpolations(self, config: any) -> any:
         if isinstance(config, dict):
@@ -192,7 +272,27 @@ class ConfigBuilder(BaseConfigBuilder):
         return config
 
     def add_in_memory_collection(self, obj: dict):
-        self._config = self._from_dict(self.config, obj)
+        with self._lock:
+            self._config = self._from_dict(self.config, obj)
+
+    def set_value(self, path: str, value: Any, delimiter: str = "."):
+        """Replace the subtree at `path`, creating missing parents"""
+        *parents, key = compile_path(path, delimiter)
+        with self._lock:
+            sel = self._config
+            for entry in parents:
+                sel = sel.setdefault(entry, {})
+            sel[key] = value
+            self.invalidate()
+
+    def remove_value(self, path: str, delimiter: str = "."):
+        """Drop the subtree at `path` if there is one"""
+        *parents, key = compile_path(path, delimiter)
+        with self._lock:
+            sel = _walk(self._config, tuple(parents))
+            if isinstance(sel, dict):
+                sel.pop(key, None)
+            self.invalidate()
 
     def add_json_file(self, file, abs_path=False):
         if not abs_path:
@@ -235,18 +335,22 @@ class ConfigBuilder(BaseConfigBuilder):
                 )
                 self._add_value(entries, args[index + 1])
 
+    def _lookup(self, path: str, delimiter: str) -> Any:
+        key = (path, delimiter)
+        cache = self._read_cache
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        value = _walk(self.config, compile_path(path, delimiter))
+        if value is None:
+            value = _MISSING
+        cache[key] = value
+        return value
+
     def _read_value(self, path: str, default=None, delimiter="."):
-        entries = path.split(delimiter)
-        _sel = self.config.get(entries.pop(0))
-        if _sel is not None:
-            for entry in entries:
-                _sel = _sel.get(entry, None)
-                if _sel is None:
-                    _sel = default
-                    break
-        else:
-            _sel = default
-        return _sel
+        value = self._lookup(path, delimiter)
+        return default if value is _MISSING else value
 
     def read_value(
             self,
@@ -260,10 +364,8 @@ class ConfigBuilder(BaseConfigBuilder):
                 lookup_path = f"{prefix}.{path}"
             else:
                 lookup_path = path
-            value = self._read_value(
-                path=lookup_path, default=None, delimiter=delimiter
-            )
-            if value is not None:
+            value = self._lookup(lookup_path, delimiter)
+            if value is not _MISSING:
                 return value
 
         return self._read_value(
@@ -272,6 +374,11 @@ class ConfigBuilder(BaseConfigBuilder):
             delimiter=delimiter,
         )
 
+    def freeze(self) -> "ConfigSnapshot":
+        """Immutable copy of the current configuration for lock-free reads"""
+        with self._lock:
+            return ConfigSnapshot(self.config)
+
     @property
     def config(self):
         return self._config
@@ -301,55 +408,141 @@ class ConfigBuilder(BaseConfigBuilder):
         self._inject(obj, setter=type(obj).__setattr__)
 
 
+def _freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(i) for i in obj)
+    return obj
+
+
+class ConfigSnapshot:
+    """Read-only view of a `ConfigBuilder` state.
+
+    Every dotted path is precomputed on creation, so `read_value` is a single
+    dict lookup and the snapshot can be shared between threads without locks.
+    """
+
+    _config: MappingProxyType
+    _paths: Dict[str, Any]
+
+    def __init__(self, config: dict):
+        self._config = _freeze(config)
+        self._paths = {}
+        self._index(self._config, "")
+
+    def _index(self, node: MappingProxyType, prefix: str):
+        for key, value in node.items():
+            path = f"{prefix}{key}"
+            self._paths[path] = value
+            if isinstance(value, MappingProxyType):
+                self._index(value, f"{path}.")
+
+    def _read_value(self, path: str, default=None, delimiter="."):
+        if delimiter == ".":
+            value = self._paths.get(path)
+        else:
+            value = _walk(self._config, compile_path(path, delimiter))
+            value = None if value is _MISSING else value
+        return default if value is None else value
+
+    def read_value(
+            self,
+            path: str,
+            default: Optional[Any] = None,
+            delimiter: str = ".",
+            lookup_prefixes: Optional[List] = None,
+    ):
+        for prefix in lookup_prefixes or []:
+            lookup_path = path if prefix is None else f"{prefix}.{path}"
+            value = self._read_value(lookup_path, delimiter=delimiter)
+            if value is not None:
+                return value
+        return self._read_value(path, default=default, delimiter=delimiter)
+
+    @property
+    def config(self) -> MappingProxyType:
+        return self._config
+
+
 class ConfigInjector:
     config_storage: str = "communicate.utils.configuration.ConfigBuilder"
     __config_builder: BaseConfigBuilder
     config: dict
 
     def setup_configuration(self):
-        self.__config_builder = ConfigBuilder()
+        self.__config_builder = get_config_builder()
         self.config = (
             self.__config_builder._config  # pylint: disable=protected-access
         )
 
 
-config_builder = ConfigBuilder()
-config_builder.add_environment_variables()
-
 # Workaround for EventBus
 default_topic = "events"
 # default_provider = config_builder.read_value("eventBus.publisher.default.provider")
 default_provider = "ProviderSNS"
 
-# TODO: This should be moved to a separate configuration file or settings file if you use Django
-
-event_bus = {
-    "awsAuth": {
-        "key": "000000000000",
-        "secret": config_builder.read_value("eventBus.publisher.default.secret"),
-        "region": "us-east-1",
-        "profiles": {
-            "default": {
-                "accountId": "000000000000",
-                "force_key_auth": True,
-                "secret": config_builder.read_value("eventBus.publisher.default.secret"),
-                "key": "000000000000",
-                "region": "us-east-1",
-                "endpoint": "http://localhost:4566"
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+
+def get_default_event_bus(builder: ConfigBuilder) -> dict:
+    # TODO: This should be moved to a separate configuration file or settings
+    # file if you use Django
+    secret = builder.read_value("eventBus.publisher.default.secret")
+    return {
+        "awsAuth": {
+            "key": "000000000000",
+            "secret": secret,
+            "region": "us-east-1",
+            "profiles": {
+                "default": {
+                    "accountId": "000000000000",
+                    "force_key_auth": True,
+                    "secret": secret,
+                    "key": "000000000000",
+                    "region": "us-east-1",
+                    "endpoint": "http://localhost:4566"
+                }
             }
-        }
-    },
-    "eventBus": {
-        "publisher": {
-            "targets": {
-                "allEventsTarget": {
-                    "route": "*",
-                    "provider": "sns",
-                    "wraps": {"topic": default_topic, "provider": default_provider},
+        },
+        "eventBus": {
+            "publisher": {
+                "targets": {
+                    "allEventsTarget": {
+                        "route": "*",
+                        "provider": "sns",
+                        "wraps": {"topic": default_topic, "provider": default_provider},
+                    }
                 }
             }
         }
     }
-}
 
-config_builder.add_in_memory_collection(event_bus)
+
+def get_config_builder() -> ConfigBuilder:
+    """Process-wide builder, bootstrapped on first use.
+
+    Environment variables and the default `event_bus` collection are loaded
+    here rather than at import time, so importing the package stays cheap.
+    """
+    global _bootstrapped  # pylint: disable=global-statement
+    if _bootstrapped:
+        return ConfigBuilder.instance
+
+    with _bootstrap_lock:
+        builder = ConfigBuilder()
+        if not _bootstrapped:
+            builder.add_environment_variables()
+            builder.add_in_memory_collection(get_default_event_bus(builder))
+            _bootstrapped = True
+    return builder
+
+
+def __getattr__(name: str):
+    # Backward compatibility for the former module level bootstrap
+    if name == "config_builder":
+        return get_config_builder()
+    if name == "event_bus":
+        return get_default_event_bus(get_config_builder())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,276 @@
+"""Idempotency layer for at-least-once delivery.
+
+SNS/SQS may deliver the same message more than once. Consumers claim a
+message key before running their handlers and acknowledge already claimed
+keys straight away. The key is the SNS `MessageId` of the envelope, or
+`(entity_id, event_name, publish_date)` of the event when the message was
+not delivered through SNS.
+
+A claim is a lease: it expires after `lease` seconds unless the handler
+succeeded and the key was marked `complete()`, then it is kept for `ttl`.
+Keys of failed handlers are released. When a worker is killed mid-message
+the lease expires, so keep `lease` below the visibility timeout of the queue
+for the redelivered copy to be processed again. A copy received while
+another one is leased is acknowledged, the leased one is redelivered if its
+handler fails.
+"""
+import abc
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from .metrics import Stats
+
+__all__ = (
+    "DeduplicationStore",
+    "MemoryDeduplicationStore",
+    "SQLiteDeduplicationStore",
+    "envelope_key",
+    "event_key",
+)
+
+
+def envelope_key(envelope: dict) -> Optional[str]:
+    """SNS MessageId of a notification envelope, payload is not decoded"""
+    message_id = envelope.get("MessageId")
+    return f"sns:{message_id}" if message_id else None
+
+
+def event_key(event) -> str:
+    metadata = event.metadata
+    return (
+        f"event:{metadata.entity_id}:{metadata.event_name}:"
+        f"{metadata.publish_date.isoformat()}"
+    )
+
+
+class DeduplicationStore(abc.ABC):
+    """Bounded set of recently processed message keys"""
+
+    ttl: float
+    lease: float
+    metrics: Stats
+
+    def __init__(self, ttl: float = 3600.0, lease: float = 20.0):
+        self.ttl = ttl
+        self.lease = lease
+        self.metrics = Stats()
+
+    def claim(self, key: Hashable) -> bool:
+        """Lease `key` for `lease` seconds while it is being processed.
+
+        Returns False when the key was already claimed, the message is then
+        a duplicate and can be acknowledged without processing.
+        """
+        claimed = self._claim(key)
+        self.metrics.incr("misses" if claimed else "hits")
+        return claimed
+
+    def complete(self, key: Hashable):
+        """Keep `key` for `ttl` seconds, its message was processed"""
+        self._complete(key)
+
+    def release(self, key: Hashable):
+        """Forget `key` so a redelivery of a failed message is processed"""
+        self._release(key)
+
+    @abc.abstractmethod
+    def _claim(self, key: Hashable) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def _complete(self, key: Hashable):
+        pass
+
+    @abc.abstractmethod
+    def _release(self, key: Hashable):
+        pass
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @property
+    @abc.abstractmethod
+    def memory_bytes(self) -> int:
+        pass
+
+    def stats(self) -> dict:
+        hits = self.metrics.get("hits")
+        misses = self.metrics.get("misses")
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "size": len(self),
+            "memory_bytes": self.memory_bytes,
+        }
+
+
+class MemoryDeduplicationStore(DeduplicationStore):
+    """Per-process set of keys, evicting the oldest claims first once
+    `max_size` is reached; each key is kept for at most `ttl` seconds"""
+
+    def __init__(
+            self,
+            max_size: int = 100_000,
+            ttl: float = 3600.0,
+            lease: float = 20.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(ttl=ttl, lease=lease)
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._keys_bytes = 0
+        self._lock = threading.Lock()
+
+    def _claim(self, key: Hashable) -> bool:
+        now = self._clock()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires > now:
+                return False
+            self._set(key, now + self.lease, now)
+        return True
+
+    def _complete(self, key: Hashable):
+        now = self._clock()
+        with self._lock:
+            self._set(key, now + self.ttl, now)
+
+    def _set(self, key: Hashable, expires: float, now: float):
+        if key not in self._entries:
+            self._keys_bytes += sys.getsizeof(key)
+        self._entries[key] = expires
+        self._entries.move_to_end(key)
+        self._evict(now)
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while entries:
+            key, expires = next(iter(entries.items()))
+            if len(entries) <= self.max_size and expires > now:
+                # entries are ordered by update time, the oldest is not stale
+                break
+            del entries[key]
+            self._keys_bytes -= sys.getsizeof(key)
+
+    def _release(self, key: Hashable):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._keys_bytes -= sys.getsizeof(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        # keys + the dict itself + a float and a linked list node per entry
+        return (
+                self._keys_bytes
+                + sys.getsizeof(self._entries)
+                + len(self._entries) * (sys.getsizeof(0.0) + 56)
+        )
+
+
+class SQLiteDeduplicationStore(DeduplicationStore):
+    """Keys shared by all worker processes through an SQLite file"""
+
+    purge_interval = 60.0
+
+    def __init__(
+            self,
+            path: str,
+            max_size: int = 1_000_000,
+            ttl: float = 3600.0,
+            lease: float = 20.0,
+            clock: Callable[[], float] = time.time,
+            timeout: float = 30.0,
+    ):
+        super().__init__(ttl=ttl, lease=lease)
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._clock = clock
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed_messages "
+                "(key TEXT PRIMARY KEY, expires REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS processed_messages_expires "
+                "ON processed_messages (expires)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads/processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _claim(self, key: Hashable) -> bool:
+        now = self._clock()
+        # single statement, atomic between processes in autocommit mode
+        cursor = self._connection().execute(
+            "INSERT INTO processed_messages (key, expires) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET expires = excluded.expires "
+            "WHERE processed_messages.expires <= ?",
+            (str(key), now + self.lease, now),
+        )
+        claimed = cursor.rowcount == 1
+        if now - self._last_purge > self.purge_interval:
+            self.purge(now)
+        return claimed
+
+    def _complete(self, key: Hashable):
+        self._connection().execute(
+            "INSERT INTO processed_messages (key, expires) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET expires = excluded.expires",
+            (str(key), self._clock() + self.ttl),
+        )
+
+    def _release(self, key: Hashable):
+        self._connection().execute(
+            "DELETE FROM processed_messages WHERE key = ?", (str(key),)
+        )
+
+    def purge(self, now: Optional[float] = None):
+        """Drop expired keys and the oldest ones above `max_size`"""
+        now = self._clock() if now is None else now
+        self._last_purge = now
+        conn = self._connection()
+        conn.execute("DELETE FROM processed_messages WHERE expires <= ?", (now,))
+        conn.execute(
+            "DELETE FROM processed_messages WHERE key IN ("
+            "SELECT key FROM processed_messages ORDER BY expires DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+    def __len__(self) -> int:
+        (count,) = self._connection().execute(
+            "SELECT COUNT(*) FROM processed_messages"
+        ).fetchone()
+        return count
+
+    @property
+    def memory_bytes(self) -> int:
+        conn = self._connection()
+        (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+        (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+        return page_count * page_size
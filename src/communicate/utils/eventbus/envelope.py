@@ -0,0 +1,143 @@
+"""Events decoded on demand and re-published from their original message.
+
+Consumers which only route, filter or forward events do not need the whole
+`Event`. A `LazyEvent` keeps the message it was received as and decodes
+`metadata` on first access and `payload` only when it is touched; the
+parsed JSON document is not kept around. Publishing an unmodified
+`LazyEvent` sends the original message verbatim.
+"""
+from typing import Any, Type, Union
+
+from pydantic import ValidationError
+
+from communicate.utils.eventbus.base import Event, EventMeta
+from communicate.utils.eventbus.serialization import get_codec
+
+__all__ = ("EnvelopeDecodeError", "LazyEvent")
+
+_UNSET = object()
+
+
+class EnvelopeDecodeError(ValueError):
+    """The message of a `LazyEvent` is not a valid event"""
+
+
+class LazyEvent:
+    """Read-mostly stand-in of `Event` for a received message.
+
+    Has the `metadata`, `payload` and `routing_keys` attributes and the
+    `json()`/`dict()` methods of `Event`, `to_event()` returns the decoded
+    `Event`. Decoding errors are raised as `EnvelopeDecodeError` on the
+    first access.
+    """
+
+    __slots__ = (
+        "raw",
+        "event_cls",
+        "_metadata",
+        "_original_metadata",
+        "_payload",
+        "_payload_set",
+    )
+
+    def __init__(self, raw: Union[str, bytes], event_cls: Type[Event] = Event):
+        self.raw = raw
+        self.event_cls = event_cls
+        self._metadata = None
+        self._original_metadata = None
+        self._payload = _UNSET
+        self._payload_set = False
+
+    def _load(self) -> dict:
+        try:
+            data = self.event_cls.__config__.json_loads(self.raw)
+        except (TypeError, ValueError) as err:
+            raise EnvelopeDecodeError(f"Invalid event: {err}") from err
+        if not isinstance(data, dict):
+            raise EnvelopeDecodeError("Invalid event: not a JSON object")
+        return data
+
+    def _field(self, data: dict, name: str) -> Any:
+        try:
+            return data[self.event_cls.__fields__[name].alias]
+        except KeyError:
+            pass
+        try:
+            return data[name]
+        except KeyError:
+            raise EnvelopeDecodeError(f"Invalid event: no {name}") from None
+
+    def _decode_metadata(self, data: dict):
+        metadata_cls = self.event_cls.__fields__["metadata"].type_
+        try:
+            metadata = get_codec(metadata_cls).decode_obj(
+                self._field(data, "metadata")
+            )
+        except ValidationError as err:
+            raise EnvelopeDecodeError(f"Invalid event metadata: {err}") from err
+        self._metadata = metadata
+        self._original_metadata = metadata.copy()
+
+    @property
+    def metadata(self) -> EventMeta:
+        if self._metadata is None:
+            self._decode_metadata(self._load())
+        return self._metadata
+
+    def _decode_payload(self, data: dict) -> Any:
+        if self.event_cls.__fields__["payload"].type_ is Any:
+            return self._field(data, "payload")
+        return self._decode().payload
+
+    @property
+    def payload(self) -> Any:
+        if self._payload is _UNSET:
+            data = self._load()
+            if self._metadata is None:
+                self._decode_metadata(data)
+            self._payload = self._decode_payload(data)
+        return self._payload
+
+    @payload.setter
+    def payload(self, value: Any):
+        self._payload = value
+        self._payload_set = True
+
+    routing_keys = Event.routing_keys
+
+    def is_modified(self) -> bool:
+        """Whether the original message no longer represents the event"""
+        if self._payload_set:
+            return True
+        metadata = self._metadata
+        if metadata is not None and metadata != self._original_metadata:
+            return True
+        if self._payload is not _UNSET:
+            # the payload handed out may have been changed in place
+            return self._payload != self._decode_payload(self._load())
+        return False
+
+    def _decode(self) -> Event:
+        try:
+            return get_codec(self.event_cls).decode(self.raw)
+        except ValidationError as err:
+            raise EnvelopeDecodeError(f"Invalid event: {err}") from err
+
+    def to_event(self) -> Event:
+        if self._metadata is None and self._payload is _UNSET:
+            return self._decode()
+        return self.event_cls(metadata=self.metadata, payload=self.payload)
+
+    def json(self, **kwargs) -> str:
+        """The original message when the event is unmodified and no option
+        but `by_alias` is passed, `Event.json(**kwargs)` otherwise"""
+        if kwargs.keys() <= {"by_alias"} and not self.is_modified():
+            raw = self.raw
+            return raw.decode() if isinstance(raw, bytes) else raw
+        return self.to_event().json(**kwargs)
+
+    def dict(self, **kwargs) -> dict:
+        return self.to_event().dict(**kwargs)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.raw)} bytes)"
@@ -10,6 +10,14 @@ class InvalidProvider(EventBusError):
     pass
 
 
+class FanOutError(EventBusError):
+    """Targets of a fan-out route failed, `errors` by target name"""
+
+    def __init__(self, message: str, errors: dict = None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
 class EcosystemException(Exception):
     """Base exception class for all ecosystem exceptions."""
     error_code: str = "UNKNOWN_ERROR"
@@ -0,0 +1,507 @@
+"""Synthetic traffic for capacity planning.
+
+`LoadGenerator` synthesizes valid payloads for every event registered in
+`EventRegistry` from the generated JSON schema, publishes them through
+`PublisherWithRouting` at a target rate and/or concurrency, consumes them
+back with `AmazonSNSSubscriber` and reports throughput, p50/p99 latencies
+and error counts as JSON.
+
+Usage::
+
+    eventbus-loadgen myapp.events --moto --rate 200 --duration 30
+
+`--moto` runs the whole SNS -> SQS path against an in-process moto
+backend; without it the configured routes and broker are used.
+"""
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import random
+import string
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from communicate.utils.eventbus.base import Event
+from communicate.utils.eventbus.metrics import Stats
+from communicate.utils.eventbus.registry import EventRegistry
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "LoadGenerator",
+    "SchemaSampler",
+    "main",
+)
+
+_TRACE_KEY = "loadgen"
+
+
+class SchemaSampler:
+    """Random instances of the JSON schemas generated by pydantic"""
+
+    def __init__(self, definitions: dict, rand: random.Random = None):
+        self.definitions = definitions
+        self.rand = rand or random.Random()
+
+    def _ref(self, ref: str) -> dict:
+        return self.definitions[ref.rsplit("/", 1)[-1]]
+
+    def sample(self, schema: dict, depth: int = 0):
+        rand = self.rand
+        if "$ref" in schema:
+            return self.sample(self._ref(schema["$ref"]), depth)
+        if "const" in schema:
+            return schema["const"]
+        if "enum" in schema:
+            return rand.choice(schema["enum"])
+        for key in ("allOf", "anyOf", "oneOf"):
+            if key in schema:
+                return self.sample(rand.choice(schema[key]), depth)
+        schema_type = schema.get("type")
+        if isinstance(schema_type, list):
+            schema_type = rand.choice(schema_type)
+        sampler = getattr(self, f"_sample_{schema_type}", None)
+        if sampler is None:
+            # Any
+            return schema.get("default", self._sample_string({}))
+        return sampler(schema, depth)
+
+    def _sample_object(self, schema: dict, depth: int) -> dict:
+        required = set(schema.get("required", ()))
+        result = {}
+        for name, prop in schema.get("properties", {}).items():
+            if name in required or self.rand.random() < 0.5:
+                result[name] = self.sample(prop, depth + 1)
+        extra = schema.get("additionalProperties")
+        if isinstance(extra, dict) and depth < 4:
+            for _ in range(self.rand.randint(0, 3)):
+                result[self._sample_string({})] = self.sample(extra, depth + 1)
+        return result
+
+    def _sample_array(self, schema: dict, depth: int) -> list:
+        low = schema.get("minItems", 0)
+        high = schema.get("maxItems", low + (3 if depth < 4 else 0))
+        items = schema.get("items", {})
+        count = self.rand.randint(low, max(low, high))
+        if isinstance(items, list):
+            # Tuple[...]
+            return [self.sample(item, depth + 1) for item in items]
+        return [self.sample(items, depth + 1) for _ in range(count)]
+
+    def _sample_string(self, schema: dict, depth: int = 0) -> str:
+        rand = self.rand
+        fmt = schema.get("format")
+        if fmt == "date-time":
+            return datetime.datetime.fromtimestamp(
+                rand.randint(0, 2 ** 31), tz=datetime.timezone.utc
+            ).isoformat()
+        if fmt == "date":
+            return datetime.date.fromordinal(rand.randint(700000, 750000)).isoformat()
+        if fmt == "uuid":
+            return str(uuid.UUID(int=rand.getrandbits(128), version=4))
+        if fmt == "email":
+            return f"{self._word(8)}@example.com"
+        if fmt in ("uri", "uri-reference"):
+            return f"https://example.com/{self._word(8)}"
+        low = schema.get("minLength", 1)
+        high = schema.get("maxLength", max(low, 16))
+        return self._word(rand.randint(low, max(low, high)))
+
+    def _word(self, length: int) -> str:
+        return "".join(self.rand.choices(string.ascii_letters, k=length))
+
+    def _bounds(self, schema: dict, default_low, default_high, step):
+        low = schema.get("minimum", default_low)
+        if "exclusiveMinimum" in schema:
+            low = schema["exclusiveMinimum"] + step
+        high = schema.get("maximum", max(low, default_high))
+        if "exclusiveMaximum" in schema:
+            high = schema["exclusiveMaximum"] - step
+        return low, high
+
+    def _sample_integer(self, schema: dict, depth: int) -> int:
+        low, high = self._bounds(schema, 0, 10_000, 1)
+        value = self.rand.randint(int(low), int(high))
+        multiple = schema.get("multipleOf")
+        if multiple:
+            value -= value % int(multiple)
+        return value
+
+    def _sample_number(self, schema: dict, depth: int) -> float:
+        low, high = self._bounds(schema, 0.0, 10_000.0, 1e-6)
+        return self.rand.uniform(low, high)
+
+    def _sample_boolean(self, schema: dict, depth: int) -> bool:
+        return self.rand.random() < 0.5
+
+    def _sample_null(self, schema: dict, depth: int):
+        return None
+
+
+class _EventTemplate:
+    __slots__ = ("name", "payload_cls", "schema")
+
+    def __init__(self, name: str, payload_cls: type, schema: dict):
+        self.name = name
+        self.payload_cls = payload_cls
+        self.schema = schema
+
+
+def _event_templates(
+        registry: EventRegistry, definitions: dict
+) -> List[_EventTemplate]:
+    templates = []
+    for event in registry.events_list():
+        name = event.__name__
+        definition = definitions.get(event.__name__) or next(
+            d for d in definitions.values() if d.get("title") == event.__name__
+        )
+        payload_schema = definition["properties"][
+            event.__fields__["payload"].alias
+        ]
+        templates.append(
+            _EventTemplate(name, event.__fields__["payload"].type_, payload_schema)
+        )
+    return templates
+
+
+class LoadGenerator:
+    """Publish synthesized events and measure them end to end.
+
+    :param publisher: `PublisherWithRouting`, or anything with
+        `name` and `publish_event(event)`
+    :param subscriber: consumes the published events; without it only the
+        publish side is measured
+    :param rate: total events per second, unlimited when None
+    :param concurrency: publishing threads
+    :param duration: seconds to publish for
+    :param total: stop after this many events, whichever comes first
+    :param drain_timeout: how long to wait for the last events to arrive
+    """
+
+    def __init__(
+            self,
+            publisher,
+            subscriber=None,
+            registry: EventRegistry = None,
+            rate: Optional[float] = None,
+            concurrency: int = 1,
+            duration: float = 10.0,
+            total: Optional[int] = None,
+            drain_timeout: float = 10.0,
+            seed: Optional[int] = None,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.publisher = publisher
+        self.subscriber = subscriber
+        self.registry = registry or EventRegistry()
+        self.rate = rate
+        self.concurrency = concurrency
+        self.duration = duration
+        self.total = total
+        self.drain_timeout = drain_timeout
+        self.seed = seed
+        self.metrics = Stats(window=1_000_000)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sent: Dict[str, float] = {}
+        self._sequence = 0
+        self._definitions: dict = {}
+        self._all_received = threading.Event()
+        self._publishing_done = False
+
+    def _next_sequence(self) -> Optional[int]:
+        with self._lock:
+            if self.total is not None and self._sequence >= self.total:
+                return None
+            self._sequence += 1
+            return self._sequence
+
+    def _publish_loop(self, index: int, templates, deadline: float):
+        seed = None if self.seed is None else self.seed + index
+        rand = random.Random(seed)
+        sampler = SchemaSampler(self._definitions, rand)
+        interval = self.concurrency / self.rate if self.rate else 0.0
+        # spread the threads over the first interval
+        next_at = self._clock() + interval * index / self.concurrency
+        while self._clock() < deadline:
+            if interval:
+                delay = next_at - self._clock()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            sequence = self._next_sequence()
+            if sequence is None:
+                return
+            template = rand.choice(templates)
+            try:
+                payload = template.payload_cls.parse_obj(
+                    sampler.sample(template.schema)
+                )
+            except ValueError as err:
+                logger.warning(f"Invalid sample of {template.name}: {err}")
+                self.metrics.incr("invalid_samples")
+                continue
+            event = Event.create(
+                template.name,
+                publisher_name=self.publisher.name,
+                payload=payload,
+                metadata={"tracestate": f"{_TRACE_KEY}={sequence}"},
+            )
+            started = self._clock()
+            with self._lock:
+                self._sent[str(sequence)] = started
+            try:
+                self.publisher.publish_event(event)
+            except Exception as err:  # noqa, pylint: disable=broad-except
+                logger.debug(f"Publish failed: {err!r}")
+                self.metrics.incr("publish_errors")
+                with self._lock:
+                    self._sent.pop(str(sequence), None)
+                continue
+            self.metrics.observe("publish_latency", self._clock() - started)
+            self.metrics.incr("published")
+            self.metrics.incr(f"published.{template.name}")
+
+    def hook(self, event: Event, trace_ctx=None):
+        """Subscriber hook recording the end-to-end latency"""
+        now = self._clock()
+        key, _, sequence = event.metadata.tracestate.partition("=")
+        if key != _TRACE_KEY:
+            self.metrics.incr("foreign_events")
+            return
+        with self._lock:
+            sent = self._sent.pop(sequence, None)
+            drained = self._publishing_done and not self._sent
+        if sent is None:
+            self.metrics.incr("duplicates")
+            return
+        self.metrics.observe("end_to_end_latency", now - sent)
+        self.metrics.incr("received")
+        if drained:
+            self._all_received.set()
+
+    def run(self) -> dict:
+        self._definitions = self.registry.generate_schema().get(
+            "definitions", {}
+        )
+        templates = _event_templates(self.registry, self._definitions)
+        if not templates:
+            raise ValueError("No events registered in EventRegistry")
+
+        consumer = None
+        if self.subscriber is not None:
+            self.subscriber.hook = self.hook
+            consumer = threading.Thread(
+                target=self.subscriber.run, name="loadgen-consumer", daemon=True
+            )
+            consumer.start()
+
+        started = self._clock()
+        deadline = started + self.duration
+        threads = [
+            threading.Thread(
+                target=self._publish_loop,
+                args=(index, templates, deadline),
+                name=f"loadgen-publisher-{index}",
+            )
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        published_in = self._clock() - started
+
+        if consumer is not None:
+            with self._lock:
+                self._publishing_done = True
+                if not self._sent:
+                    self._all_received.set()
+            self._all_received.wait(self.drain_timeout)
+            self.subscriber.stop()
+            consumer.join(self.drain_timeout)
+        elapsed = self._clock() - started
+        return self.report(published_in, elapsed)
+
+    def report(self, published_in: float, elapsed: float) -> dict:
+        snapshot = self.metrics.snapshot()
+        counters = snapshot["counters"]
+        timings = snapshot["timings"]
+        published = counters.get("published", 0)
+        received = counters.get("received", 0)
+        report = {
+            "duration": round(elapsed, 3),
+            "concurrency": self.concurrency,
+            "target_rate": self.rate,
+            "published": published,
+            "publish_errors": counters.get("publish_errors", 0),
+            "invalid_samples": counters.get("invalid_samples", 0),
+            "publish_throughput": published / published_in if published_in else 0.0,
+            "publish_latency": timings.get("publish_latency"),
+            "events": {
+                name.split(".", 1)[1]: count
+                for name, count in sorted(counters.items())
+                if name.startswith("published.")
+            },
+        }
+        if self.subscriber is not None:
+            report.update(
+                received=received,
+                lost=len(self._sent),
+                duplicates=counters.get("duplicates", 0),
+                consume_throughput=received / elapsed if elapsed else 0.0,
+                end_to_end_latency=timings.get("end_to_end_latency"),
+            )
+        return report
+
+
+class _MotoMocks:
+    """Start/stop several moto<5 service mocks together"""
+
+    def __init__(self, *mocks):
+        self.mocks = mocks
+
+    def start(self):
+        for mock in self.mocks:
+            mock.start()
+
+    def stop(self):
+        for mock in reversed(self.mocks):
+            mock.stop()
+
+
+def _moto_mock():
+    """`mock_aws` of moto>=5, the SNS and SQS mocks of older versions"""
+    # pylint: disable=import-outside-toplevel
+    try:
+        from moto import mock_aws
+    except ImportError:
+        from moto import mock_sns, mock_sqs
+
+        return _MotoMocks(mock_sns(), mock_sqs())
+    return mock_aws()
+
+
+def _moto_environment(region: str, publisher_name: str):
+    """Topic and subscribed queue in an in-process moto backend"""
+    # pylint: disable=import-outside-toplevel
+    import boto3
+
+    from communicate.utils.eventbus.publisher import PublisherWithRouting
+    from communicate.utils.eventbus.publisher.routing import Router
+    from communicate.utils.eventbus.subscriber import AmazonSNSSubscriber
+
+    mock = _moto_mock()
+    mock.start()
+    sns = boto3.client("sns", region_name=region)
+    sqs = boto3.client("sqs", region_name=region)
+    topic_arn = sns.create_topic(Name="loadgen")["TopicArn"]
+    queue_url = sqs.create_queue(QueueName="loadgen")["QueueUrl"]
+    queue_arn = sqs.get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=["QueueArn"]
+    )["Attributes"]["QueueArn"]
+    sns.subscribe(TopicArn=topic_arn, Protocol="sqs", Endpoint=queue_arn)
+
+    router = Router(
+        config={
+            "awsAuth": {
+                "profiles": {
+                    "default": {"accountId": "123456789012", "region": region}
+                }
+            },
+            "eventBus": {
+                "publisher": {
+                    "eventsTargets": {
+                        f"{publisher_name}.*": {
+                            "provider": "sns",
+                            "topic": topic_arn,
+                        },
+                    }
+                }
+            },
+        }
+    )
+    publisher = PublisherWithRouting(router=router, name=publisher_name)
+    subscriber = AmazonSNSSubscriber("sqs://", "loadgen", region=region)
+    subscriber.poll_timeout = 0.5
+    return mock, publisher, subscriber
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="eventbus-loadgen",
+        description="Publish synthesized events and report the throughput",
+    )
+    parser.add_argument(
+        "modules", nargs="*",
+        help="modules registering events in EventRegistry",
+    )
+    parser.add_argument("--moto", action="store_true",
+                        help="use an in-process moto SNS/SQS backend")
+    parser.add_argument("--queue", help="queue to consume, measures end to end")
+    parser.add_argument("--url", default="sqs://", help="kombu connection url")
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument("--publisher", default="loadgen",
+                        help="publisher name used for routing")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="events per second (default: unlimited)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--total", type=int, default=None)
+    parser.add_argument("--drain-timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="write the JSON report to a file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    for module in args.modules:
+        importlib.import_module(module)
+
+    mock = None
+    if args.moto:
+        mock, publisher, subscriber = _moto_environment(
+            args.region, args.publisher
+        )
+    else:
+        # pylint: disable=import-outside-toplevel
+        from communicate.utils.eventbus.publisher import PublisherWithRouting
+        from communicate.utils.eventbus.subscriber import AmazonSNSSubscriber
+
+        publisher = PublisherWithRouting(name=args.publisher)
+        subscriber = None
+        if args.queue:
+            subscriber = AmazonSNSSubscriber(
+                args.url, args.queue, region=args.region
+            )
+            subscriber.poll_timeout = 0.5
+    try:
+        report = LoadGenerator(
+            publisher,
+            subscriber=subscriber,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            total=args.total,
+            drain_timeout=args.drain_timeout,
+            seed=args.seed,
+        ).run()
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
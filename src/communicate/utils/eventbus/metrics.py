@@ -0,0 +1,88 @@
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class Timing:
+    """Count/total/max of an observed value plus a window of recent samples"""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+        return ordered[index]
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+        }
+
+
+class Stats:
+    """Thread-safe counters and timings of a long running component.
+
+    Components keep a `Stats` instance in `metrics` and expose
+    `metrics.snapshot()` (usually through their own `stats()` method), so
+    they can be scraped by whatever monitoring the service uses.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, Timing] = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = Timing(self._window)
+            timing.add(value)
+
+    def get(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        with self._lock:
+            timing = self._timings.get(name)
+            return timing.percentile(q) if timing else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {
+                    name: timing.as_dict()
+                    for name, timing in self._timings.items()
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._timings = {}
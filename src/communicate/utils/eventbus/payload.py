@@ -1,5 +1,7 @@
 import abc
 from communicate.utils.eventbus.registry import EventRegistry
+from pydantic import Field
+from typing import Any
 from uuid import uuid4
 
 from .base import Payload
@@ -31,3 +33,19 @@ class EventFailPayload(EventPayload):
         else:
             _id = getattr(self.data, "id", _id)
         return _id
+
+
+class EventDeltaPayload(EventPayload):
+    """Fields of an entity changed by an operation.
+
+    `changes` maps the payload fields which changed (by alias, as in the
+    full event) to their new value, `version` orders the changes of one
+    entity. When `complete` is False the other fields are unknown and
+    consumers needing them should fetch the entity.
+    """
+
+    # Any fields are optional unless required explicitly
+    id: Any = Field(...)
+    version: int
+    changes: dict
+    complete: bool = False
@@ -0,0 +1,344 @@
+"""On-demand profiling of the consumer loops and the publish path.
+
+The subscriber, the Celery `SQSConsumer`, providers, `AmazonSNSPublisher`
+and `eventbus-relay` run their per-message work in a `section()`. While
+profiling is off `section()` returns a shared no-op context manager. When it
+is on, the active `Profiler` either
+
+* ``cprofile``: runs every `every`-th call of each section under cProfile
+  and aggregates the results into ``<section>-<pid>.prof`` (load them with
+  `pstats` or snakeviz), or
+* ``sample``: records the stacks of every thread each `interval` seconds
+  for `window` seconds into ``sample-<pid>-<time>.folded``, the collapsed
+  stack format of flamegraph.pl and speedscope; stacks are prefixed with the
+  section the thread is in. Profiling stops once the window is over.
+
+With `tracemalloc` frames set, every dump also writes a tracemalloc snapshot
+and its top allocations, compared to the previous snapshot.
+
+Profiling starts at import when ``EVENTBUS_PROFILE`` is set to a mode,
+options are read from ``EVENTBUS_PROFILE_DIR``, ``EVENTBUS_PROFILE_EVERY``,
+``EVENTBUS_PROFILE_DUMP_EVERY``, ``EVENTBUS_PROFILE_WINDOW``,
+``EVENTBUS_PROFILE_INTERVAL`` and ``EVENTBUS_PROFILE_TRACEMALLOC``. After
+`install_signal_handler()` (done by ``eventbus-consume`` and
+``eventbus-relay``) SIGUSR2 toggles it::
+
+    kill -USR2 <pid>
+"""
+import contextlib
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, ContextManager, Dict, Mapping, NamedTuple, Optional
+
+from communicate.utils.eventbus.metrics import Stats
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "ProfileOptions",
+    "Profiler",
+    "active",
+    "disable",
+    "enable",
+    "install_signal_handler",
+    "section",
+    "toggle",
+)
+
+MODES = ("cprofile", "sample")
+ENV_PREFIX = "EVENTBUS_PROFILE"
+
+_DISABLED = contextlib.nullcontext()
+
+
+class ProfileOptions(NamedTuple):
+    directory: str = os.path.join(tempfile.gettempdir(), "eventbus-profiles")
+    mode: str = "cprofile"
+    # cprofile: profile every Nth call of a section, dump every Nth profile
+    every: int = 100
+    dump_every: int = 10
+    # sample: seconds between stack samples, seconds to sample for
+    interval: float = 0.01
+    window: float = 30.0
+    # frames kept per tracemalloc trace, 0 disables it
+    tracemalloc: int = 0
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = None) -> "ProfileOptions":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        options = cls(
+            directory=environ.get(f"{ENV_PREFIX}_DIR", defaults.directory),
+            mode=environ.get(ENV_PREFIX) or defaults.mode,
+            every=int(environ.get(f"{ENV_PREFIX}_EVERY", defaults.every)),
+            dump_every=int(
+                environ.get(f"{ENV_PREFIX}_DUMP_EVERY", defaults.dump_every)
+            ),
+            interval=float(
+                environ.get(f"{ENV_PREFIX}_INTERVAL", defaults.interval)
+            ),
+            window=float(environ.get(f"{ENV_PREFIX}_WINDOW", defaults.window)),
+            tracemalloc=int(
+                environ.get(f"{ENV_PREFIX}_TRACEMALLOC", defaults.tracemalloc)
+            ),
+        )
+        if options.mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {options.mode}")
+        return options
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """Profile sections of the current process, see the module docstring"""
+
+    def __init__(
+            self,
+            options: ProfileOptions = None,
+            clock: Callable[[], float] = time.time,
+    ):
+        self.options = options or ProfileOptions()
+        self.metrics = Stats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counts: Dict[str, int] = {}
+        self._profiles: Dict[str, pstats.Stats] = {}
+        self._sections: Dict[int, str] = {}
+        self._stacks: Counter = Counter()
+        self._stopping = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.options.directory, name)
+
+    def start(self):
+        os.makedirs(self.options.directory, exist_ok=True)
+        if self.options.tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start(self.options.tracemalloc)
+            self._started_tracemalloc = True
+        if self.options.mode == "sample":
+            self._stopping.clear()
+            self._sampler = threading.Thread(
+                target=self._sample, name="eventbus-profiler", daemon=True
+            )
+            self._sampler.start()
+        logger.info(
+            f"Profiling ({self.options.mode}) into {self.options.directory}"
+        )
+
+    def stop(self):
+        """Stop sampling and write what was collected"""
+        self._stopping.set()
+        sampler = self._sampler
+        if sampler is not None and sampler is not threading.current_thread():
+            sampler.join()
+        if self.options.mode == "cprofile":
+            self.dump()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        logger.info(f"Profiling stopped: {self.metrics.snapshot()['counters']}")
+
+    def section(self, name: str) -> ContextManager:
+        if self.options.mode == "sample":
+            return self._tracked(name)
+        with self._lock:
+            count = self._counts[name] = self._counts.get(name, 0) + 1
+        if count % self.options.every or getattr(self._local, "busy", False):
+            # nested sections are part of the outer profile
+            return _DISABLED
+        return self._profiled(name)
+
+    @contextlib.contextmanager
+    def _profiled(self, name: str):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another thread is being profiled, Python 3.12+ allows one
+            yield
+            return
+        self._local.busy = True
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.busy = False
+            self._add(name, profile)
+
+    def _add(self, name: str, profile: cProfile.Profile):
+        with self._lock:
+            stats = self._profiles.get(name)
+            if stats is None:
+                self._profiles[name] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        self.metrics.incr("profiled")
+        if self.metrics.get("profiled") % self.options.dump_every == 0:
+            self.dump()
+
+    @contextlib.contextmanager
+    def _tracked(self, name: str):
+        ident = threading.get_ident()
+        outer = self._sections.get(ident)
+        self._sections[ident] = name
+        try:
+            yield
+        finally:
+            if outer is None:
+                self._sections.pop(ident, None)
+            else:
+                self._sections[ident] = outer
+
+    def _sample(self):
+        own = threading.get_ident()
+        deadline = self._clock() + self.options.window
+        while (
+                not self._stopping.wait(self.options.interval)
+                and self._clock() < deadline
+        ):
+            for ident, frame in sys._current_frames().items():  # noqa, pylint: disable=protected-access
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                section_name = self._sections.get(ident)
+                if section_name is not None:
+                    stack.append(section_name)
+                self._stacks[";".join(reversed(stack))] += 1
+            self.metrics.incr("samples")
+        self.dump()
+        # the window is over, leave the hot paths alone again
+        disable(self)
+
+    def dump(self):
+        """Write the collected profiles and a tracemalloc snapshot"""
+        pid = os.getpid()
+        with self._lock:
+            for name, stats in self._profiles.items():
+                stats.dump_stats(self._path(f"{name}-{pid}.prof"))
+            stacks, self._stacks = self._stacks, Counter()
+        if stacks:
+            path = self._path(f"sample-{pid}-{int(self._clock())}.folded")
+            with open(path, "w", encoding="utf-8") as folded:
+                for stack, count in stacks.most_common():
+                    folded.write(f"{stack} {count}\n")
+        if tracemalloc.is_tracing():
+            self._dump_tracemalloc(pid)
+        self.metrics.incr("dumps")
+
+    def _dump_tracemalloc(self, pid: int):
+        snapshot = tracemalloc.take_snapshot()
+        path = self._path(f"tracemalloc-{pid}-{int(self._clock())}")
+        snapshot.dump(f"{path}.snap")
+        if self._snapshot is None:
+            top = snapshot.statistics("lineno")
+        else:
+            top = snapshot.compare_to(self._snapshot, "lineno")
+        self._snapshot = snapshot
+        with open(f"{path}.txt", "w", encoding="utf-8") as report:
+            for stat in top[:25]:
+                report.write(f"{stat}\n")
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.options.mode,
+            "directory": self.options.directory,
+            **self.metrics.snapshot(),
+        }
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def section(name: str) -> ContextManager:
+    """Context manager around the per-message work called `name`"""
+    profiler = _profiler
+    if profiler is None:
+        return _DISABLED
+    return profiler.section(name)
+
+
+def active() -> Optional[Profiler]:
+    return _profiler
+
+
+def enable(options: ProfileOptions = None) -> Profiler:
+    """Start profiling, options from the environment by default"""
+    global _profiler  # pylint: disable=global-statement
+    with _profiler_lock:
+        if _profiler is None:
+            profiler = Profiler(options or ProfileOptions.from_env())
+            profiler.start()
+            _profiler = profiler
+        return _profiler
+
+
+def disable(profiler: Profiler = None) -> Optional[Profiler]:
+    """Stop profiling (only if `profiler` is the active one, when given)"""
+    global _profiler  # pylint: disable=global-statement
+    with _profiler_lock:
+        current = _profiler
+        if current is None or profiler not in (None, current):
+            return None
+        _profiler = None
+    current.stop()
+    return current
+
+
+def toggle():
+    if _profiler is None:
+        enable()
+    else:
+        disable()
+
+
+def install_signal_handler(signum: int = getattr(signal, "SIGUSR2", None)):
+    """Toggle profiling on `signum`, must be called from the main thread"""
+    if signum is None:
+        logger.warning("Signals are not available, profiling uses the env")
+        return
+
+    def on_signal(*_):
+        # the interrupted frame may hold the profiler locks
+        threading.Thread(target=toggle, name="eventbus-profiler-toggle").start()
+
+    signal.signal(signum, on_signal)
+
+
+def _after_fork():
+    """Forked workers profile on their own, without the parent's data"""
+    global _profiler, _profiler_lock  # pylint: disable=global-statement
+    _profiler_lock = threading.Lock()
+    if _profiler is not None:
+        parent, _profiler = _profiler, None
+        enable(parent.options)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+if os.environ.get(ENV_PREFIX):
+    try:
+        enable()
+    except (ValueError, OSError):
+        logger.exception("Profiling requested by the environment failed")
@@ -3,3 +3,7 @@ from .publishers import (
     AmazonSNSPublisher,
     PublisherWithRouting,
 )
+from .journal import Journal
+from .resilience import CircuitBreaker, SpillingPublisher
+from .background import BackgroundPublisher
+from .pool import ClientPool
@@ -0,0 +1,183 @@
+"""Publish events from a background thread, in batches.
+
+`BackgroundPublisher` has the `publish(name, data, routing_attrs)`
+interface of the other publishers, so it can replace one anywhere (e.g. as
+the `publisher` of Celery tasks with callbacks). The event is built on the
+caller's thread and queued; a daemon thread publishes queued events through
+`publish_batch` when the wrapped publisher supports it, one by one
+otherwise.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from communicate.utils.eventbus.base import Event
+from communicate.utils.eventbus.metrics import Stats
+
+logger = logging.getLogger(__name__)
+
+__all__ = ("BackgroundPublisher",)
+
+_STOP = object()
+
+
+class BackgroundPublisher:
+    """
+    :param publisher: `AmazonSNSPublisher`, `PublisherWithRouting` or any
+        publisher with `build_event` and `publish_event`
+    :param batch_size: events published per call
+    :param linger: seconds to wait for a batch to fill up
+    :param max_queue: queued events above which `publish` falls back to
+        publishing synchronously
+    """
+
+    def __init__(
+            self,
+            publisher,
+            batch_size: int = 10,
+            linger: float = 0.05,
+            max_queue: int = 10_000,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.publisher = publisher
+        self.name = getattr(publisher, "name", None)
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_queue = max_queue
+        self.metrics = Stats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._atexit = False
+
+    def _ensure_started(self) -> queue.Queue:
+        # threads do not survive a fork (celery prefork pool), start anew
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return self._queue
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue(self.max_queue)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(self._queue,),
+                    name="background-publisher",
+                    daemon=True,
+                )
+                self._thread.start()
+                if not self._atexit:
+                    atexit.register(self.close)
+                    self._atexit = True
+        return self._queue
+
+    def publish(
+            self, name: str, data: any, routing_attrs: dict = None
+    ) -> dict:
+        return self.publish_event(self.build_event(name, data, routing_attrs))
+
+    def build_event(
+            self, name: str, data: any, routing_attrs: dict = None
+    ) -> Event:
+        return self.publisher.build_event(name, data, routing_attrs)
+
+    def publish_batch(self, events: List[Event]) -> dict:
+        """Queue the events, they are published with the next batches"""
+        for event in events:
+            self.publish_event(event)
+        return {"Queued": True}
+
+    def publish_event(self, event: Event) -> dict:
+        try:
+            self._ensure_started().put_nowait(event)
+        except queue.Full:
+            self.metrics.incr("overflow")
+            return self._publish([event])
+        self.metrics.incr("queued")
+        return {"Queued": True}
+
+    def _publish(self, events: List[Event]) -> dict:
+        started = self._clock()
+        try:
+            publish_batch = getattr(self.publisher, "publish_batch", None)
+            if publish_batch is not None and len(events) > 1:
+                response = publish_batch(events)
+                failed = response.get("Failed", ())
+                for item in failed:
+                    logger.error(
+                        f"Background publish of "
+                        f"{events[int(item['Id'])].metadata.event_name} "
+                        f"failed: {item.get('Code')} {item.get('Message')}"
+                    )
+                self.metrics.incr("failed", len(failed))
+                self.metrics.incr("published", len(events) - len(failed))
+                return response
+            for event in events:
+                response = self.publisher.publish_event(event)
+            self.metrics.incr("published", len(events))
+            return response
+        finally:
+            self.metrics.observe("publish_seconds", self._clock() - started)
+
+    def _next_batch(self, events: queue.Queue) -> List:
+        batch = [events.get()]
+        deadline = self._clock() + self.linger
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            timeout = deadline - self._clock()
+            try:
+                batch.append(
+                    events.get(timeout=timeout) if timeout > 0
+                    else events.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, events: queue.Queue):
+        while True:
+            batch = self._next_batch(events)
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                try:
+                    self._publish(batch)
+                except Exception:  # noqa, pylint: disable=broad-except
+                    logger.exception(
+                        f"Background publish of {len(batch)} events failed"
+                    )
+                    self.metrics.incr("failed", len(batch))
+            for _ in range(len(batch) + stop):
+                events.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Wait until every queued event was handled"""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self, timeout: float = 10.0):
+        """Publish the queued events and stop the thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid():
+                return
+            self._thread = None
+            self._pid = None
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(
+                f"{self._queue.qsize()} events were not published in time"
+            )
+
+    def stats(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        snapshot["pending"] = self._queue.qsize() if self._queue else 0
+        return snapshot
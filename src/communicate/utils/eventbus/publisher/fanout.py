@@ -0,0 +1,207 @@
+"""Publish one event to several targets at once.
+
+A route may list several targets instead of a single provider::
+
+    "orders": {
+        "route": "Orders.*",
+        "ack": "primary",
+        "targets": [
+            {"provider": "sns", "topic": "arn:aws:sns:us-east-1:...:orders"},
+            {"provider": "sns", "topic": "arn:aws:sns:eu-west-1:...:orders",
+             "profile": "eu"},
+            {"provider": "my_package.providers.ProviderArchive"}
+        ]
+    }
+
+The router resolves it to a `FanOutProvider` which publishes to every
+target concurrently on a shared executor, so publishing takes as long as
+the slowest target waited for rather than the sum of all of them. A fan-out
+started by a target (e.g. a provider which is a fan-out itself) publishes
+inline: waiting for executor threads from one of them could deadlock.
+
+Ack policies:
+
+- `all` (default): wait for every target, raise `FanOutError` if any failed
+- `any`: return once one target succeeded, raise if all failed
+- `primary`: wait for the first target only, the others are best-effort
+"""
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from communicate.utils.eventbus.exceptions import FanOutError
+from communicate.utils.eventbus.metrics import Stats
+from communicate.utils.eventbus.publisher.providers import Provider
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "ACK_ALL",
+    "ACK_ANY",
+    "ACK_PRIMARY",
+    "FanOutProvider",
+    "get_executor",
+    "target_names",
+)
+
+ACK_ALL = "all"
+ACK_ANY = "any"
+ACK_PRIMARY = "primary"
+ACK_POLICIES = (ACK_ALL, ACK_ANY, ACK_PRIMARY)
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# set in the threads running the targets of a fan-out
+_worker = threading.local()
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Executor shared by every fan-out of the process"""
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    thread_name_prefix="eventbus-fanout"
+                )
+    return _executor
+
+
+class FanOutProvider(Provider):
+    """Publish to `providers` concurrently.
+
+    The provider hooks run once around the whole fan-out, not per target.
+    `publish` returns the response of the primary (first) target, with the
+    `any` policy the response of the first target that succeeded.
+
+    :param providers: targets, the first one is the primary
+    :param names: target names used in `stats()`, `<index>:<class>` by
+        default
+    :param ack: `all`, `any` or `primary`
+    """
+
+    def __init__(
+            self,
+            providers: Sequence[Provider],
+            names: Sequence[str] = None,
+            ack: str = ACK_ALL,
+            executor: concurrent.futures.Executor = None,
+            **kwargs,
+    ):
+        if not providers:
+            raise ValueError("Fan-out needs at least one target")
+        if ack not in ACK_POLICIES:
+            raise ValueError(f"Unknown ack policy {ack!r}")
+        super().__init__(**kwargs)
+        self.providers = list(providers)
+        self.names = list(names or (
+            f"{index}:{type(provider).__name__}"
+            for index, provider in enumerate(self.providers)
+        ))
+        self.ack = ack
+        self.executor = executor
+        self.metrics = Stats()
+
+    def _publish_one(self, name: str, provider: Provider, event) -> Any:
+        started = time.perf_counter()
+        try:
+            # the provider's own hooks are skipped, they ran for the fan-out
+            return type(provider).publish(provider, event)
+        except Exception:
+            self.metrics.incr(f"{name}.errors")
+            raise
+        finally:
+            self.metrics.observe(
+                f"{name}.latency_seconds", time.perf_counter() - started
+            )
+
+    def _run_target(self, name: str, provider: Provider, event) -> Any:
+        _worker.active = True
+        try:
+            return self._publish_one(name, provider, event)
+        finally:
+            _worker.active = False
+
+    def _submit(
+            self,
+            executor: concurrent.futures.Executor,
+            name: str,
+            provider: Provider,
+            event,
+    ) -> concurrent.futures.Future:
+        if not getattr(_worker, "active", False):
+            return executor.submit(self._run_target, name, provider, event)
+        # nested fan-out, the executor threads may all be waiting for it
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        try:
+            future.set_result(self._publish_one(name, provider, event))
+        except Exception as err:  # noqa, pylint: disable=broad-except
+            future.set_exception(err)
+        return future
+
+    def _log_best_effort(self, name: str, future: concurrent.futures.Future):
+        err = future.exception()
+        if err is not None:
+            logger.warning(f"Best-effort target {name} failed: {err!r}")
+
+    def publish(self, event) -> dict:
+        executor = self.executor or get_executor()
+        futures: Dict[concurrent.futures.Future, str] = {
+            self._submit(executor, name, provider, event): name
+            for name, provider in zip(self.names, self.providers)
+        }
+        primary = next(iter(futures))
+        self.metrics.incr("published")
+
+        if self.ack == ACK_PRIMARY:
+            for future, name in futures.items():
+                if future is not primary:
+                    future.add_done_callback(
+                        lambda f, n=name: self._log_best_effort(n, f)
+                    )
+            try:
+                return primary.result()
+            except Exception as err:
+                raise FanOutError(
+                    f"Primary target {futures[primary]} failed",
+                    errors={futures[primary]: err},
+                ) from err
+
+        if self.ack == ACK_ANY:
+            errors = {}
+            pending = set(futures)
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    errors[futures[future]] = future.exception()
+            raise FanOutError("Every target failed", errors=errors)
+
+        concurrent.futures.wait(futures)
+        errors = {
+            name: future.exception()
+            for future, name in futures.items()
+            if future.exception() is not None
+        }
+        if errors:
+            raise FanOutError(
+                f"{len(errors)} of {len(futures)} targets failed",
+                errors=errors,
+            )
+        return primary.result()
+
+    def stats(self) -> dict:
+        return self.metrics.snapshot()
+
+
+def target_names(targets: List[dict]) -> List[str]:
+    """`name` of the target configs, `<index>:<provider>` if missing"""
+    return [
+        target.get("name") or f"{index}:{target.get('provider')}"
+        for index, target in enumerate(targets)
+    ]
@@ -0,0 +1,246 @@
+"""Hedged publishes.
+
+Most publishes are fast, a few hit a slow connection and take many times
+longer, often only to time out. A `Hedger` runs a publish on the caller's
+thread and, when it has not completed within the `percentile` of recent
+first-attempt latencies, sends a second attempt from a shared executor.
+Each attempt checks out its own client, with `pool_size` set the hedge goes
+out on another pooled connection. The caller returns once its own attempt
+is over: the hedge's response if that came first, or if the first attempt
+failed, so a stuck connection costs the caller its timeout but no retry.
+
+Enabled per route or `AmazonSNSPublisher` config::
+
+    "hedge": {"percentile": 95, "max_ratio": 0.05}
+
+Hedging trades extra requests for tail latency: at most `max_ratio` of
+the publishes are hedged. Both attempts may be delivered; FIFO topics get a
+`MessageDeduplicationId` derived from the event, so SNS drops the second
+copy, subscribers of standard topics should expect the duplicate.
+"""
+import concurrent.futures
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from communicate.utils.eventbus.dedup import event_key
+from communicate.utils.eventbus.metrics import Stats
+
+logger = logging.getLogger(__name__)
+
+__all__ = ("Hedger", "deduplication_id", "get_executor")
+
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Executor of the hedged attempts, apart from the fan-out one since
+    fan-out targets wait for their hedges"""
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    thread_name_prefix="eventbus-hedge"
+                )
+    return _executor
+
+
+class _Timer:
+    """One daemon thread running callbacks at their monotonic deadline"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Callable[[], None]]] = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, delay: float, callback: Callable[[], None]):
+        with self._cond:
+            heapq.heappush(
+                self._heap,
+                (time.monotonic() + delay, next(self._order), callback),
+            )
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="eventbus-hedge-timer", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, _, callback = self._heap[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception as err:  # noqa, pylint: disable=broad-except
+                logger.error(f"Hedge not sent: {err}")
+
+
+_timer = _Timer()
+
+
+class _Attempts:
+    """The hedge of one call, sent unless the first attempt is over"""
+
+    __slots__ = ("lock", "over", "hedge")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.over = False
+        self.hedge: Optional[concurrent.futures.Future] = None
+
+    def finish(self) -> Optional[concurrent.futures.Future]:
+        """End of the first attempt, the hedge if one was sent"""
+        with self.lock:
+            self.over = True
+            return self.hedge
+
+
+def deduplication_id(event) -> str:
+    """`MessageDeduplicationId` of an event, equal for every attempt"""
+    return hashlib.sha256(event_key(event).encode("utf-8")).hexdigest()
+
+
+class Hedger:
+    """Run a call, start a second attempt of it when the first one is slow.
+
+    :param percentile: hedge after this percentile of the first-attempt
+        latencies observed so far
+    :param initial_delay: hedge delay until `min_samples` are observed
+    :param min_delay: lower bound of the hedge delay
+    :param max_ratio: hedges per call at most, every call earns
+        `max_ratio` of a hedge, up to `burst` hedges
+    """
+
+    def __init__(
+            self,
+            percentile: float = 95.0,
+            initial_delay: float = 0.1,
+            min_delay: float = 0.005,
+            min_samples: int = 20,
+            max_ratio: float = 0.05,
+            burst: float = 10.0,
+            executor: concurrent.futures.Executor = None,
+            clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.executor = executor
+        self.metrics = Stats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._budget = burst
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> Optional["Hedger"]:
+        """Hedger of a `hedge` config, None when it is not set"""
+        if not config:
+            return None
+        return cls(**config)
+
+    def delay(self) -> float:
+        """Seconds to wait for the first attempt before hedging"""
+        if self.metrics.get("calls") < self.min_samples:
+            return self.initial_delay
+        latency = self.metrics.percentile("first_attempt_seconds", self.percentile)
+        if latency is None:
+            return self.initial_delay
+        return max(self.min_delay, latency)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+    def _attempt(self, func: Callable[[], Any], timing: str) -> Any:
+        started = self._clock()
+        try:
+            return func()
+        finally:
+            self.metrics.observe(timing, self._clock() - started)
+
+    def _hedge(self, attempts: _Attempts, func: Callable[[], Any]):
+        with attempts.lock:
+            if attempts.over or not self._spend():
+                return
+            self.metrics.incr("hedged")
+            executor = self.executor or get_executor()
+            attempts.hedge = executor.submit(self._attempt, func, "hedge_seconds")
+
+    def call(self, func: Callable[[], Any]) -> Any:
+        """Result of `func()`, of its hedge when that completed first or
+        the first attempt failed"""
+        started = self._clock()
+        with self._lock:
+            self._budget = min(self.burst, self._budget + self.max_ratio)
+            can_hedge = self._budget >= 1
+        self.metrics.incr("calls")
+
+        attempts = _Attempts()
+        if can_hedge:
+            _timer.schedule(self.delay(), lambda: self._hedge(attempts, func))
+        unhedged = None
+        try:
+            try:
+                result = self._attempt(func, "first_attempt_seconds")
+            except Exception:
+                hedge = attempts.finish()
+                if hedge is None:
+                    raise
+                # without the hedge the caller would retry now
+                unhedged = self._clock() - started
+                result = hedge.result()
+                self.metrics.incr("hedge_wins")
+                return result
+            hedge = attempts.finish()
+            if hedge is not None and hedge.done() and hedge.exception() is None:
+                self.metrics.incr("hedge_wins")
+                return hedge.result()
+            return result
+        finally:
+            latency = self._clock() - started
+            self.metrics.observe("latency_seconds", latency)
+            if unhedged is None:
+                unhedged = latency
+            else:
+                unhedged += (
+                    self.metrics.percentile("first_attempt_seconds", 50) or 0.0
+                )
+            self.metrics.observe("unhedged_seconds", unhedged)
+
+    def stats(self) -> dict:
+        """Counters and timings, plus what hedging costs and saves:
+        `extra_requests` per call and the p99 callers would have waited
+        for without hedges (retrying a failed first attempt, at the median
+        first-attempt latency) less the p99 they waited for"""
+        stats = self.metrics.snapshot()
+        calls = stats["counters"].get("calls", 0)
+        first = stats["timings"].get("unhedged_seconds", {}).get("p99")
+        waited = stats["timings"].get("latency_seconds", {}).get("p99")
+        stats["extra_requests"] = (
+            stats["counters"].get("hedged", 0) / calls if calls else 0.0
+        )
+        stats["p99_saved_seconds"] = (
+            first - waited if first is not None and waited is not None else None
+        )
+        return stats
@@ -0,0 +1,260 @@
+"""Append-only local journal of messages that could not be published.
+
+The journal is a directory of numbered segment files. Each record is
+framed as `<length><crc32><data>` so a record torn by a crash is detected
+and dropped on the next start. A `checkpoint` file keeps the position up
+to which records were replayed; fully replayed segments are deleted.
+
+A journal directory must be used by a single process at a time.
+"""
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "FSYNC_ALWAYS",
+    "FSYNC_INTERVAL",
+    "FSYNC_NEVER",
+    "Journal",
+    "JournalPosition",
+)
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+
+_HEADER = struct.Struct("<II")
+_SEGMENT_SUFFIX = ".seg"
+_CHECKPOINT = "checkpoint"
+
+
+class JournalPosition(NamedTuple):
+    segment: int
+    offset: int
+
+
+def _segment_name(segment: int) -> str:
+    return f"{segment:016d}{_SEGMENT_SUFFIX}"
+
+
+def _read_records(
+        path: str, offset: int, limit: int
+) -> Tuple[List[bytes], int, bool]:
+    """Up to `limit` valid records from `offset`, the offset after them and
+    whether reading stopped on a torn or corrupted record"""
+    records = []
+    with open(path, "rb") as file:
+        file.seek(offset)
+        while len(records) < limit:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return records, offset, bool(header)
+            length, checksum = _HEADER.unpack(header)
+            data = file.read(length)
+            if len(data) < length or zlib.crc32(data) != checksum:
+                return records, offset, True
+            records.append(data)
+            offset += _HEADER.size + length
+    return records, offset, False
+
+
+class Journal:
+    """Segmented write-ahead journal.
+
+    :param directory: where segments are stored, created when missing
+    :param segment_bytes: size after which a new segment is started
+    :param fsync: `always` syncs every append, `interval` at most once per
+        `fsync_interval` seconds, `never` leaves it to the OS. With
+        `interval`, appends are synced by the next append or by
+        `sync_if_due()`, which writers call periodically so the last records
+        are not left unsynced once appends stop
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            segment_bytes: int = 16 * 1024 * 1024,
+            fsync: str = FSYNC_INTERVAL,
+            fsync_interval: float = 1.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file = None
+        self._last_sync = clock()
+        self._dirty = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._position = self._load_checkpoint()
+        segments = self.segments()
+        self._segment = segments[-1] if segments else self._position.segment
+        self._open_segment(self._segment)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def segments(self) -> List[int]:
+        return sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+
+    def _load_checkpoint(self) -> JournalPosition:
+        try:
+            with open(self._path(_CHECKPOINT)) as file:
+                segment, offset = file.read().split()
+            return JournalPosition(int(segment), int(offset))
+        except FileNotFoundError:
+            return JournalPosition(0, 0)
+        except ValueError:
+            logger.warning("Corrupted journal checkpoint, replaying everything")
+            return JournalPosition(0, 0)
+
+    def _open_segment(self, segment: int):
+        path = self._path(_segment_name(segment))
+        if os.path.exists(path):
+            # drop a record torn by a crash, appends would be unreadable
+            offset = 0
+            while True:
+                records, offset, torn = _read_records(path, offset, 1024)
+                if torn:
+                    logger.warning(f"Truncating torn journal record in {path}")
+                    os.truncate(path, offset)
+                    break
+                if not records:
+                    break
+        self._file = open(path, "ab")
+        self._segment = segment
+
+    def _sync(self, force: bool = False):
+        now = self._clock()
+        if (
+                force
+                or self.fsync == FSYNC_ALWAYS
+                or (
+                        self.fsync == FSYNC_INTERVAL
+                        and now - self._last_sync >= self.fsync_interval
+                )
+        ):
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+            self._dirty = False
+
+    def append(self, data: bytes):
+        record = _HEADER.pack(len(data), zlib.crc32(data)) + data
+        with self._lock:
+            size = self._file.tell()
+            if size and size + len(record) > self.segment_bytes:
+                self._roll()
+            self._file.write(record)
+            self._file.flush()
+            self._dirty = True
+            if self.fsync != FSYNC_NEVER:
+                self._sync()
+
+    def _roll(self):
+        if self._dirty and self.fsync != FSYNC_NEVER:
+            self._sync(force=True)
+        self._file.close()
+        self._open_segment(self._segment + 1)
+
+    def read(self, limit: int) -> Tuple[List[bytes], JournalPosition]:
+        """Up to `limit` records after the checkpoint and the position to
+        `commit` once they were handled"""
+        records: List[bytes] = []
+        segment, offset = self._position
+        with self._lock:
+            segments = [s for s in self.segments() if s >= segment]
+            for current in segments:
+                if current != segment:
+                    segment, offset = current, 0
+                path = self._path(_segment_name(current))
+                chunk, offset, torn = _read_records(
+                    path, offset, limit - len(records)
+                )
+                records.extend(chunk)
+                if len(records) >= limit or current == self._segment:
+                    break
+                if torn:
+                    logger.error(f"Skipping corrupted end of journal {path}")
+        return records, JournalPosition(segment, offset)
+
+    def commit(self, position: JournalPosition):
+        """Mark records up to `position` as replayed"""
+        tmp = self._path(_CHECKPOINT + ".tmp")
+        with open(tmp, "w") as file:
+            file.write(f"{position.segment} {position.offset}")
+            file.flush()
+            if self.fsync != FSYNC_NEVER:
+                os.fsync(file.fileno())
+        os.replace(tmp, self._path(_CHECKPOINT))
+        with self._lock:
+            self._position = position
+            for segment in self.segments():
+                if segment >= position.segment:
+                    break
+                os.remove(self._path(_segment_name(segment)))
+
+    def skip_segment(self) -> JournalPosition:
+        """Give up on the rest of the checkpoint's segment, e.g. when a
+        corrupted record in its middle stops `read()`; later appends go to a
+        new segment"""
+        with self._lock:
+            segment = self._position.segment
+            if segment == self._segment:
+                self._roll()
+        logger.error(f"Skipping unreadable records of journal segment {segment}")
+        position = JournalPosition(segment + 1, 0)
+        self.commit(position)
+        return position
+
+    def pending_bytes(self) -> int:
+        """Size of the records which were not replayed yet"""
+        segment, offset = self._position
+        total = 0
+        for current in self.segments():
+            if current < segment:
+                continue
+            size = os.path.getsize(self._path(_segment_name(current)))
+            total += size - offset if current == segment else size
+        return max(total, 0)
+
+    def sync_if_due(self):
+        """fsync appends older than `fsync_interval` (`interval` policy)"""
+        with self._lock:
+            if (
+                    self._dirty
+                    and self._file is not None
+                    and self.fsync == FSYNC_INTERVAL
+            ):
+                self._sync()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._sync(force=True)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                if self._dirty and self.fsync != FSYNC_NEVER:
+                    self._sync(force=True)
+                self._file.close()
+                self._file = None
+
+    @property
+    def position(self) -> JournalPosition:
+        return self._position
@@ -0,0 +1,156 @@
+"""Clients shared by threads and greenlets.
+
+boto3 sessions are not thread-safe and one client's connection pool
+(botocore `max_pool_connections`) caps how many calls it runs at once. A
+`ClientPool` hands every caller a client of its own for the duration of a
+call: clients are created on demand, each from its own session, up to the
+pool size, further callers wait for one to be returned.
+
+Works with `--pool=threads` and, as Celery monkey-patches `threading` and
+`queue` for them, with `--pool=gevent`/`--pool=eventlet`.
+"""
+import contextlib
+import logging
+import queue
+import threading
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+from communicate.utils.eventbus.metrics import Stats
+from communicate.utils.eventbus.publisher.hedge import Hedger
+from communicate.utils.eventbus.publisher.throttle import (
+    TokenBucket,
+    limited_call,
+)
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "ClientPool",
+    "PoolExhausted",
+    "PooledClientMixin",
+    "DEFAULT_POOL_SIZE",
+)
+
+# botocore's default `max_pool_connections`
+DEFAULT_POOL_SIZE = 10
+
+
+class PoolExhausted(Exception):
+    """No client was returned to the pool within the timeout"""
+
+
+class ClientPool:
+    """Bounded pool of clients, each used by one caller at a time.
+
+    :param factory: creates a client
+    :param size: maximum number of clients
+    :param timeout: seconds to wait for a client when all are in use, None
+        waits forever
+    """
+
+    def __init__(
+            self,
+            factory: Callable[[], Any],
+            size: int = DEFAULT_POOL_SIZE,
+            timeout: Optional[float] = None,
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.metrics = Stats()
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Any:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                client = self.factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            self.metrics.incr("created")
+            return client
+
+        self.metrics.incr("waits")
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhausted(
+                f"No client available within {self.timeout}s"
+            ) from None
+
+    @contextlib.contextmanager
+    def client(self) -> Iterator[Any]:
+        """Check a client out for the duration of the block"""
+        client = self._acquire()
+        try:
+            yield client
+        finally:
+            self._idle.put(client)
+
+    def stats(self) -> dict:
+        counters = self.metrics.snapshot()["counters"]
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": self._idle.qsize(),
+            "waits": counters.get("waits", 0),
+        }
+
+
+class PooledClientMixin:
+    """`client()`/`call()` of publishers with an optional `ClientPool`.
+
+    Subclasses implement `_create_client` and call `_setup_clients` once
+    configured; every call then runs with a client of its own when a pool
+    size was given, with the shared `conn` otherwise.
+    """
+
+    conn: Any = None
+    clients: Optional[ClientPool] = None
+    limiter: Optional[TokenBucket] = None
+
+    def _create_client(self) -> Any:
+        raise NotImplementedError
+
+    def _setup_clients(
+            self, pool_size: Optional[int], pool_timeout: Optional[float]
+    ):
+        if pool_size:
+            self.clients = ClientPool(
+                self._create_client, size=pool_size, timeout=pool_timeout
+            )
+            self.conn = None
+        else:
+            self.clients = None
+            self.conn = self._create_client()
+
+    def client(self) -> ContextManager:
+        """Client for one call, checked out of the pool if there is one"""
+        if self.clients is None:
+            return contextlib.nullcontext(self.conn)
+        return self.clients.client()
+
+    def call(self, func: Callable, tokens: int = 1, hedger: Hedger = None):
+        """`func(client)` once the rate limit allows `tokens` messages,
+        hedged by `hedger` if given"""
+
+        def run():
+            with self.client() as conn:
+                return func(conn)
+
+        if hedger is not None:
+            return limited_call(self.limiter, tokens, lambda: hedger.call(run))
+        return limited_call(self.limiter, tokens, run)
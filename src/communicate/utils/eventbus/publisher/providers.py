@@ -9,17 +9,26 @@ __all__ = (
 )
 
 import abc
-import boto3
 import functools
 import warnings
 import logging
+from communicate.utils.eventbus import profiling
 from communicate.utils.eventbus.hooks import (
     HookRegistry,
     get_default_registry,
 )
+from communicate.utils.eventbus.publisher.hedge import Hedger
+from communicate.utils.eventbus.publisher.pool import PooledClientMixin
+from communicate.utils.eventbus.publisher.throttle import (
+    TokenBucket,
+    watch_client,
+)
 from communicate.utils.eventbus.publisher.utils import (
     AmazonMessageExtender,
+    publish_sns_batch,
 )
+from communicate.utils.eventbus.wire import get_wire_codec
+from typing import Iterable
 
 logging = logging.getLogger(__name__)
 
@@ -39,11 +48,14 @@ class Provider(abc.ABC):
 
     @staticmethod
     def pre_process(func, provider):
+        section_name = f"publish.{type(provider).__name__}"
+
         @functools.wraps(func)
         def wrapper(event):
-            event = provider.hook.run_pre_hooks(event)
-            result = func(event)
-            provider.hook.run_post_hooks(event)
+            with profiling.section(section_name):
+                event = provider.hook.run_pre_hooks(event)
+                result = func(event)
+                provider.hook.run_post_hooks(event)
             return result
 
         return wrapper
@@ -53,7 +65,7 @@ class Provider(abc.ABC):
         pass
 
 
-class ProviderAWS(Provider):
+class ProviderAWS(PooledClientMixin, Provider):
     resource: str
 
     def __init__(
@@ -64,18 +76,43 @@ class ProviderAWS(Provider):
             region: str = "us-east-1",
             endpoint: str = None,
             force_key_auth: bool = False,
+            pool_size: int = None,
+            pool_timeout: float = None,
+            rate_limit: dict = None,
             **kwargs,
     ):
+        """
+        :param pool_size: give every thread/greenlet publishing at the same
+            time a client of its own, at most `pool_size` of them
+        :param pool_timeout: seconds to wait for a pooled client
+        :param rate_limit: `TokenBucket` arguments, messages per second
+            sent to the target
+        """
         self.account_id = kwargs["accountId"]
         self.force_key_auth = force_key_auth
         self.secret = secret
         self.key = key
         self.region = region
         self.endpoint = endpoint
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.limiter = TokenBucket.from_config(rate_limit)
         super().__init__(*args, **kwargs)
         self._setup_connection()
 
     def _setup_connection(self):
+        self._setup_clients(self.pool_size, self.pool_timeout)
+        if self.clients is None:
+            logging.info(
+                f"DEBUG INFO! Connected to {self.resource} with {self.conn}"
+            )
+
+    def _create_client(self):
+        import boto3  # pylint: disable=import-outside-toplevel
+        from botocore.config import (  # pylint: disable=import-outside-toplevel
+            Config,
+        )
+
         _auth = {}
 
         if self.force_key_auth:
@@ -90,10 +127,14 @@ class ProviderAWS(Provider):
             "use_ssl": True,
             "endpoint_url": self.endpoint,
         }
+        if self.pool_size:
+            # a pooled client serves one call at a time
+            client_kwargs["config"] = Config(max_pool_connections=1)
 
-        self.conn = session.client(self.resource, **client_kwargs)
-
-        logging.info(f"DEBUG INFO! Connected to {self.resource} with {self.conn}")
+        client = session.client(self.resource, **client_kwargs)
+        if self.limiter is not None:
+            watch_client(client, self.limiter)
+        return client
 
 
 class ProviderSNS(AmazonMessageExtender, ProviderAWS):
@@ -101,13 +142,41 @@ class ProviderSNS(AmazonMessageExtender, ProviderAWS):
 
     @property
     def arn(self):
+        # routes may name the topic by its full ARN
+        if isinstance(self.topic, str) and self.topic.startswith("arn:"):
+            return self.topic
         return "arn:aws:sns:us-east-1:000000000000:events"
 
+    def __init__(
+            self, *args, codec: str = None, hedge: dict = None, **kwargs
+    ):
+        """
+        :param codec: wire format of the route, JSON by default
+        :param hedge: `Hedger` arguments, send a second attempt of slow
+            publishes
+        """
+        self.codec = get_wire_codec(codec)
+        self.hedger = Hedger.from_config(hedge)
+        super().__init__(*args, **kwargs)
+
     def publish(self, event) -> dict:
-        return self.conn.publish(
-            TopicArn=self.arn,
-            Message=event.json(by_alias=True),
-            MessageAttributes=self.get_msg_attrs(event),
+        entry = self.build_publish_entry(
+            event, self.arn, hedged=self.hedger is not None
+        )
+        return self.call(
+            lambda conn: conn.publish(TopicArn=self.arn, **entry),
+            hedger=self.hedger,
+        )
+
+    def publish_batch(self, events: Iterable) -> dict:
+        """Publish several events at once, provider hooks are not run"""
+        return self.publish_entries(self.build_entry(e) for e in events)
+
+    def publish_entries(self, entries: Iterable[dict]) -> dict:
+        entries = list(entries)
+        return self.call(
+            lambda conn: publish_sns_batch(conn, self.arn, entries),
+            tokens=len(entries),
         )
 
 
@@ -1,14 +1,22 @@
 import abc
+import copy
 
-import boto3
-from botocore.config import Config
-
+from communicate.utils.eventbus import profiling
 from communicate.utils.eventbus.base import Event
+from communicate.utils.eventbus.publisher.hedge import Hedger
+from communicate.utils.eventbus.publisher.pool import PooledClientMixin
 from communicate.utils.eventbus.publisher.routing import Router
+from communicate.utils.eventbus.publisher.throttle import (
+    TokenBucket,
+    watch_client,
+)
 from communicate.utils.eventbus.publisher.utils import (
     AmazonMessageExtender,
+    publish_sns_batch,
 )
+from communicate.utils.eventbus.wire import get_wire_codec
 from communicate.utils.format import camelize
+from typing import Dict, Iterable, List, Optional, Tuple
 
 
 class AbstractPublisher(abc.ABC):
@@ -38,34 +46,45 @@ class AbstractPublisher(abc.ABC):
         pass
 
 
-class AmazonSNSPublisher(AmazonMessageExtender):
+class AmazonSNSPublisher(AmazonMessageExtender, PooledClientMixin):
     _default_region = "us-east-1"
+    hedger: Optional[Hedger] = None
 
     def _load_config(self, conf: any = None):
         if conf:
-            self.config = conf
-
-    def _setup_connection(self):
+            # never modify the caller's dict, it may be shared
+            self.config = copy.deepcopy(conf)
 
-        access_key_id = self.config.pop("key", "test")
-        secret_access_key = self.config.pop("secret", "test")
-        session_token = self.config.pop("session_token", None)
-        region = self.config.pop("region", self._default_region)
+    def _create_client(self):
+        import boto3  # pylint: disable=import-outside-toplevel
+        from botocore.config import (  # pylint: disable=import-outside-toplevel
+            Config,
+        )
 
         session = boto3.session.Session(
-            region_name=region,
-            aws_access_key_id=access_key_id,
-            aws_secret_access_key=secret_access_key,
-            aws_session_token=session_token,
+            region_name=self.config.get("region", self._default_region),
+            aws_access_key_id=self.config.get("key", "test"),
+            aws_secret_access_key=self.config.get("secret", "test"),
+            aws_session_token=self.config.get("session_token"),
         )
         client_kwargs = {
             "use_ssl": True,
             "endpoint_url": self.config.get("endpoint_url") or self.config.get("endpoint", "http://localhost:4566"),
         }
+        aws = dict(self.config.get("aws", {}))
+        if self.clients is not None:
+            # a pooled client serves one call at a time
+            aws.setdefault("max_pool_connections", 1)
 
-        config = Config(**self.config.pop("aws", {}))
+        client = session.client("sns", config=Config(**aws), **client_kwargs)
+        if self.limiter is not None:
+            watch_client(client, self.limiter)
+        return client
 
-        self.conn = session.client("sns", config=config, **client_kwargs)
+    def _setup_connection(self):
+        self._setup_clients(
+            self.config.get("pool_size"), self.config.get("pool_timeout")
+        )
 
     def __init__(self, name: str, config: dict = None):
         """
@@ -76,21 +95,45 @@ class AmazonSNSPublisher(AmazonMessageExtender):
             - region: AWS default region
             - endpoint_url: AWS default entrypoint
             - aws: AWS custom configuration
+            - codec: wire format, JSON by default
+            - pool_size: give every thread/greenlet publishing at the same
+              time a client of its own, at most `pool_size` of them
+            - pool_timeout: seconds to wait for a pooled client
+            - rate_limit: `TokenBucket` arguments, messages per second sent
+              to the topic
+            - hedge: `Hedger` arguments, send a second attempt of slow
+              publishes
         """
         self.name = name
         self._load_config(config)
+        self.codec = get_wire_codec(self.config.get("codec"))
+        self.limiter = TokenBucket.from_config(self.config.get("rate_limit"))
+        self.hedger = Hedger.from_config(self.config.get("hedge"))
         self._setup_connection()
 
     def publish_event(self, event: Event) -> dict:
-        return self.conn.publish(
-            TopicArn=self.topic,
-            Message=event.json(by_alias=True),
-            MessageAttributes=self.get_msg_attrs(event),
+        with profiling.section("publish.AmazonSNSPublisher"):
+            entry = self.build_publish_entry(
+                event, self.topic, hedged=self.hedger is not None
+            )
+            return self.call(
+                lambda conn: conn.publish(TopicArn=self.topic, **entry),
+                hedger=self.hedger,
+            )
+
+    def publish_batch(self, events: Iterable[Event]) -> dict:
+        return self.publish_entries(self.build_entry(e) for e in events)
+
+    def publish_entries(self, entries: Iterable[dict]) -> dict:
+        entries = list(entries)
+        return self.call(
+            lambda conn: publish_sns_batch(conn, self.topic, entries),
+            tokens=len(entries),
         )
 
-    def publish(
+    def build_event(
             self, name: str, data: any, routing_attrs: dict = None
-    ) -> dict:
+    ) -> Event:
         event = Event.create(
             name,
             publisher_name=camelize(self.name),
@@ -98,13 +141,28 @@ class AmazonSNSPublisher(AmazonMessageExtender):
         )
         if isinstance(routing_attrs, dict):
             event.metadata.update_routing_keys(routing_attrs)
-        return self.publish_event(event)
+        return event
+
+    def publish(
+            self, name: str, data: any, routing_attrs: dict = None
+    ) -> dict:
+        return self.publish_event(self.build_event(name, data, routing_attrs))
 
     @property
     def topic(self) -> str:
         return self.config["topic_arn"]
 
 
+def _failed_item(index: int, err: Exception) -> dict:
+    """`Failed` item of an event whose publish raised `err`"""
+    return {
+        "Id": str(index),
+        "Code": type(err).__name__,
+        "Message": str(err),
+        "SenderFault": False,
+    }
+
+
 class PublisherWithRouting:
     name: str
     router: Router
@@ -117,17 +175,64 @@ class PublisherWithRouting:
 
         self.router = router
 
-    def publish(
+    def build_event(
             self, name: str, data: any, routing_attrs: dict = None
-    ) -> dict:
+    ) -> Event:
         event = Event.create(name, publisher_name=self.name, payload=data)
         if isinstance(routing_attrs, dict):
             event.metadata.update_routing_keys(routing_attrs)
-        return self.publish_event(event)
+        return event
+
+    def publish(
+            self, name: str, data: any, routing_attrs: dict = None
+    ) -> dict:
+        return self.publish_event(self.build_event(name, data, routing_attrs))
 
     def publish_event(self, event: Event) -> dict:
         return self._publish(event)
 
+    def publish_batch(self, events: Iterable[Event]) -> dict:
+        """Publish the events through their providers, a `publish_batch` call
+        per provider when it has one.
+
+        Returns `Successful`/`Failed` like SNS PublishBatch, the `Id` of an
+        item is the index of its event; errors raised by a provider are
+        reported as `Failed` items of its events.
+        """
+        groups: Dict[int, Tuple[object, List[int]]] = {}
+        events = list(events)
+        for index, event in enumerate(events):
+            provider = self.router.resolve(self.name, event.metadata.event_name)
+            groups.setdefault(id(provider), (provider, []))[1].append(index)
+
+        successful: List[dict] = []
+        failed: List[dict] = []
+        for provider, indexes in groups.values():
+            publish_batch = getattr(provider, "publish_batch", None)
+            if publish_batch is None:
+                for index in indexes:
+                    try:
+                        provider.publish(events[index])
+                    except Exception as err:  # noqa, pylint: disable=broad-except
+                        failed.append(_failed_item(index, err))
+                    else:
+                        successful.append({"Id": str(index)})
+                continue
+            try:
+                response = publish_batch([events[index] for index in indexes])
+            except Exception as err:  # noqa, pylint: disable=broad-except
+                failed.extend(_failed_item(index, err) for index in indexes)
+                continue
+            for items, merged in (
+                    (response.get("Successful", ()), successful),
+                    (response.get("Failed", ()), failed),
+            ):
+                merged.extend(
+                    {**item, "Id": str(indexes[int(item["Id"])])}
+                    for item in items
+                )
+        return {"Successful": successful, "Failed": failed}
+
     def publish_outbox_event(self, event: Event) -> dict:
         return self._publish(event, is_outbox=True)
 
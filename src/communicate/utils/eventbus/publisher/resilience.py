@@ -0,0 +1,302 @@
+"""Circuit breaker and spill-to-disk fallback for publishers.
+
+`SpillingPublisher` wraps an SNS publisher or provider. While the target
+works, events are published directly. Failed or slow publishes open the
+circuit; while it is open, events are appended to a local `Journal`
+without waiting for the target, and a background replayer drains the
+journal through `publish_entries` (PublishBatch) once the target recovers.
+
+Events keep being journaled until the journal is drained, so they are
+published in order; only entries throttled during the replay are appended
+again behind newer ones. Records which cannot be read back (corrupted on
+disk) are skipped with the rest of their segment.
+"""
+import base64
+import json
+import logging
+import threading
+import time
+from typing import Callable, List
+
+from communicate.utils.eventbus.base import Event
+from communicate.utils.eventbus.metrics import Stats
+from communicate.utils.eventbus.publisher.journal import Journal
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "CircuitBreaker",
+    "SpillingPublisher",
+)
+
+
+def _dump_entry(entry: dict) -> bytes:
+    """Journal record of a publish entry, binary attribute values are base64
+    encoded"""
+    attrs = entry.get("MessageAttributes")
+    if attrs and any(
+            isinstance(attr.get("BinaryValue"), bytes) for attr in attrs.values()
+    ):
+        entry = {**entry, "MessageAttributes": {
+            name: {
+                **attr,
+                "BinaryValue": base64.b64encode(attr["BinaryValue"]).decode(),
+            } if isinstance(attr.get("BinaryValue"), bytes) else attr
+            for name, attr in attrs.items()
+        }}
+    return json.dumps(entry).encode("utf-8")
+
+
+def _load_entry(record: bytes) -> dict:
+    entry = json.loads(record)
+    for attr in entry.get("MessageAttributes", {}).values():
+        if isinstance(attr.get("BinaryValue"), str):
+            attr["BinaryValue"] = base64.b64decode(attr["BinaryValue"])
+    return entry
+
+
+class CircuitBreaker:
+    """Consecutive failure counter with closed/open/half-open states.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    `allow()` refuses calls for `reset_timeout` seconds. Then a single
+    trial call is allowed (half-open): its success closes the circuit,
+    its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if (
+                    self._state == self.OPEN
+                    and self._clock() - self._opened_at >= self.reset_timeout
+            ):
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if (
+                    self._state == self.OPEN
+                    and self._clock() - self._opened_at >= self.reset_timeout
+            ):
+                # the caller owns the trial call until it reports back
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (
+                    self._state == self.HALF_OPEN
+                    or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class SpillingPublisher:
+    """Publish through `target`, spill to `journal` while it is unavailable.
+
+    :param target: `AmazonSNSPublisher` or `ProviderSNS`, anything with
+        `build_entry(event)` and `publish_entries(entries)`
+    :param journal: where events are kept during outages
+    :param breaker: circuit breaker of the target
+    :param slow_call_threshold: publishes slower than this many seconds
+        count as failures, even though they succeeded
+    :param batch_size: records replayed per PublishBatch round
+    :param replay_interval: how often the replayer checks the journal
+
+    Pre/post hooks of providers only run on direct publishes, replayed
+    events are sent as they were journaled.
+    """
+
+    def __init__(
+            self,
+            target,
+            journal: Journal,
+            breaker: CircuitBreaker = None,
+            slow_call_threshold: float = None,
+            batch_size: int = 10,
+            replay_interval: float = 1.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.target = target
+        self.journal = journal
+        self.breaker = breaker or CircuitBreaker()
+        self.slow_call_threshold = slow_call_threshold
+        self.batch_size = batch_size
+        self.replay_interval = replay_interval
+        self.metrics = Stats()
+        self._clock = clock
+        self._replay_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        # journaled events are left from an outage, publish behind them
+        self._backlog_lock = threading.Lock()
+        self._backlog = journal.pending_bytes() > 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _send(self, event: Event) -> dict:
+        publish = getattr(self.target, "publish_event", None)
+        if publish is None:
+            publish = self.target.publish
+        return publish(event)
+
+    def publish_event(self, event: Event) -> dict:
+        if not self._backlog and self.breaker.allow():
+            started = self._clock()
+            try:
+                result = self._send(event)
+            except Exception as err:  # noqa, pylint: disable=broad-except
+                self.breaker.record_failure()
+                self.metrics.incr("failures")
+                logger.warning(f"Publish failed, journaling event: {err!r}")
+            else:
+                elapsed = self._clock() - started
+                self.metrics.observe("publish_seconds", elapsed)
+                if (
+                        self.slow_call_threshold is not None
+                        and elapsed > self.slow_call_threshold
+                ):
+                    self.breaker.record_failure()
+                    self.metrics.incr("slow_calls")
+                else:
+                    self.breaker.record_success()
+                self.metrics.incr("published")
+                return result
+        return self._spill(event)
+
+    # Router providers are called through `publish(event)`
+    publish = publish_event
+
+    def _spill(self, event: Event) -> dict:
+        entry = self.target.build_entry(event)
+        with self._backlog_lock:
+            self.journal.append(_dump_entry(entry))
+            self._backlog = True
+        self.metrics.incr("spilled")
+        self.start()
+        return {"Journaled": True}
+
+    def replay(self) -> int:
+        """Publish journaled events while the target accepts them.
+
+        Returns the number of replayed events.
+        """
+        replayed = 0
+        with self._replay_lock:
+            while self.journal.pending_bytes():
+                records, position = self.journal.read(self.batch_size)
+                if not records:
+                    if position != self.journal.position:
+                        # skipped the corrupted end of a segment
+                        self.journal.commit(position)
+                    else:
+                        # a corrupted record in place, nothing after it in
+                        # the segment can be read
+                        self.journal.skip_segment()
+                        self.metrics.incr("skipped_segments")
+                        continue
+                    break
+                if not self.breaker.allow():
+                    break
+                entries = [_load_entry(record) for record in records]
+                try:
+                    response = self.target.publish_entries(entries)
+                except Exception as err:  # noqa, pylint: disable=broad-except
+                    self.breaker.record_failure()
+                    logger.warning(f"Journal replay failed: {err!r}")
+                    break
+                failed = response.get("Failed", ())
+                if len(failed) == len(entries) and not any(
+                        item.get("SenderFault") for item in failed
+                ):
+                    self.breaker.record_failure()
+                    break
+                self.breaker.record_success()
+                self._requeue(entries, failed)
+                self.journal.commit(position)
+                replayed += len(entries) - len(failed)
+                if failed:
+                    # throttled, retry the rest on the next round
+                    break
+            with self._backlog_lock:
+                if not self.journal.pending_bytes():
+                    self._backlog = False
+        self.metrics.incr("replayed", replayed)
+        return replayed
+
+    def _requeue(self, entries: List[dict], failed):
+        for item in failed:
+            entry = entries[int(item["Id"])]
+            if item.get("SenderFault"):
+                # the message itself is invalid, retrying would not help
+                logger.error(
+                    f"Dropping journaled event rejected by the target: "
+                    f"{item.get('Code')} {item.get('Message')}"
+                )
+                self.metrics.incr("rejected")
+                continue
+            self.journal.append(_dump_entry(entry))
+
+    def _run(self):
+        while not self._stopped.wait(self.replay_interval):
+            try:
+                self.journal.sync_if_due()
+                self.replay()
+            except Exception:  # noqa, pylint: disable=broad-except
+                logger.exception("Journal replayer failed")
+
+    def start(self):
+        """Start the background replayer, also done on the first spill"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="journal-replayer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.journal.flush()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "pending_bytes": self.journal.pending_bytes(),
+            **self.metrics.snapshot(),
+        }
@@ -1,15 +1,29 @@
 import abc
 import copy
 import fnmatch
+import functools
 import importlib
+import json
+import os
 import re
+import threading
 from collections import OrderedDict
-from communicate.utils.eventbus.configuration import ConfigInjector
+from communicate.utils.eventbus.configuration import (
+    ConfigInjector,
+    ConfigSnapshot,
+    get_config_builder,
+)
 from communicate.utils.eventbus.exceptions import ApplicationError
+from communicate.utils.eventbus.metrics import Stats
 from communicate.utils.eventbus.exceptions import (
     InvalidProvider,
     InvalidRoute,
 )
+from communicate.utils.eventbus.publisher.fanout import (
+    ACK_ALL,
+    FanOutProvider,
+    target_names,
+)
 from communicate.utils.eventbus.publisher.providers import (
     NullProvider,
     Provider,
@@ -17,10 +31,24 @@ from communicate.utils.eventbus.publisher.providers import (
     ProviderS3,
     ProviderSNS,
 )
-from typing import MutableMapping, Type
+from importlib import metadata
+from typing import Dict, Mapping, MutableMapping, Optional, Set, Type
 from logging import getLogger
 
 logger = getLogger(__name__)
+ENTRY_POINTS_GROUP = "ecosystem_events"
+
+
+@functools.lru_cache(maxsize=None)
+def discover_entry_points(group: str = ENTRY_POINTS_GROUP) -> Dict:
+    """Installed entry points of `group` by name, scanned once per process"""
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        selected = entry_points.select(group=group)
+    else:  # python<3.10
+        selected = entry_points.get(group, ())
+    return {entry_point.name: entry_point for entry_point in selected}
+
 
 class RouteResolve:
     mapping: dict
@@ -79,14 +107,58 @@ class BaseRouter(abc.ABC):
         pass
 
 
+def target_key(config: Mapping) -> str:
+    """Identity of a target config, equal configs share a provider"""
+    return json.dumps(config, sort_keys=True, default=dict)
+
+
+class RoutingSnapshot:
+    """Routing state of a `Router` at one point in time.
+
+    The configuration is frozen and never changes, a reload creates a new
+    snapshot, so threads resolve routes from it without locking. Providers
+    are created on first use and cached by `target_key`.
+    """
+
+    __slots__ = ("config", "resolver", "providers")
+
+    def __init__(
+            self,
+            config: Mapping,
+            resolver: RouteResolve,
+            providers: Dict[str, Provider] = None,
+    ):
+        self.config = config
+        self.resolver = resolver
+        self.providers = providers if providers is not None else {}
+
+    def target_keys(self) -> Set[str]:
+        """Keys of every target and outbox target of the routes"""
+        keys = set()
+        targets = [
+            *self.resolver.mapping.values(),
+            *self.resolver.patterns.values(),
+        ]
+        for target in targets:
+            keys.add(target_key(target))
+            if "wraps" in target:
+                keys.add(target_key(target["wraps"]))
+        return keys
+
+
 class Router(ConfigInjector, BaseRouter):
-    """Singleton"""
+    """Singleton
+
+    Routes are read from an immutable `RoutingSnapshot` which `reload()`
+    replaces atomically; constructing the router again (as every
+    `PublisherWithRouting()` does) only reloads when a config is passed.
+    """
 
     instance: "Router"
-    config: dict
     resolver_cls: Type[RouteResolve]
-    resolver: RouteResolve
     providers: MutableMapping[str, Type[Provider]]
+    _snapshot: RoutingSnapshot
+    _reload_lock = threading.Lock()
     _default_providers = OrderedDict(
         s3=ProviderS3,
         sns=ProviderSNS,
@@ -105,14 +177,61 @@ class Router(ConfigInjector, BaseRouter):
             config: dict = None,
             providers: MutableMapping[str, Type[Provider]] = None,
     ):
-
-        if not config:
+        with self._reload_lock:
+            if providers:
+                self.providers = providers
+            elif not hasattr(self, "providers"):
+                self.providers = self.get_default_providers()
+        if config:
+            self.reload(config)
+        elif not hasattr(self, "_snapshot"):
             self.setup_configuration()
+
+    def setup_configuration(self):
+        self.reload()
+
+    def reload(self, config: Mapping = None) -> RoutingSnapshot:
+        """Swap in the routes of `config`, or of the `ConfigBuilder`.
+
+        Providers of targets whose config is unchanged are carried over to
+        the new snapshot, unless the AWS credentials changed.
+        """
+        if config is None:
+            config = get_config_builder().freeze().config
         else:
-            self.config = config
+            config = ConfigSnapshot(config).config
+        with self._reload_lock:
+            snapshot = RoutingSnapshot(config, self.get_resolver(config))
+            previous = getattr(self, "_snapshot", None)
+            if previous is not None and previous.config.get(
+                    "awsAuth"
+            ) == config.get("awsAuth"):
+                keep = snapshot.target_keys()
+                snapshot.providers.update(
+                    (key, provider)
+                    for key, provider in list(previous.providers.items())
+                    if key in keep
+                )
+            self._snapshot = snapshot
+        return snapshot
+
+    def watch(self, path: str, interval: float = 5.0) -> "RouteFileWatcher":
+        """Reload the routes whenever the JSON file at `path` changes"""
+        watcher = RouteFileWatcher(path, router=self, interval=interval)
+        watcher.start()
+        return watcher
 
-        self.resolver = self.get_resolver()
-        self.providers = providers or self.get_default_providers()
+    @property
+    def snapshot(self) -> RoutingSnapshot:
+        return self._snapshot
+
+    @property
+    def config(self) -> Mapping:
+        return self._snapshot.config
+
+    @property
+    def resolver(self) -> RouteResolve:
+        return self._snapshot.resolver
 
     @classmethod
     def get_default_providers(cls) -> OrderedDict:
@@ -123,14 +242,14 @@ class Router(ConfigInjector, BaseRouter):
             raise ApplicationError("Undefined Resolver")
         return self.resolver_cls
 
-    def get_resolver(self) -> RouteResolve:
+    def get_resolver(self, config: Mapping = None) -> RouteResolve:
+        if config is None:
+            config = self.config
         try:
-            resolver_config = self.config["eventBus"]["publisher"][
-                "eventsTargets"
-            ]
+            resolver_config = config["eventBus"]["publisher"]["eventsTargets"]
             self.resolver_cls = RouteResolve
         except KeyError:
-            resolver_config = self.config["eventBus"]["publisher"]["targets"]
+            resolver_config = config["eventBus"]["publisher"]["targets"]
             self.resolver_cls = RouteResolveV2
         return self.get_resolver_cls()(resolver_config)
 
@@ -155,24 +274,68 @@ class Router(ConfigInjector, BaseRouter):
     def resolve(
             self, publisher_name: str, event_name: str, is_outbox=False
     ) -> "Provider":
+        snapshot = self._snapshot
         _route = self._construct_route(publisher_name, event_name)
-        _config = self.resolver(_route)
+        _config = snapshot.resolver(_route)
 
         if is_outbox:
             _config = self._get_outbox_config(_config)
 
-        return self.get_provider(_config)
+        key = target_key(_config)
+        try:
+            return snapshot.providers[key]
+        except KeyError:
+            pass
+        return snapshot.providers.setdefault(
+            key, self.get_provider(_config, snapshot.config)
+        )
 
-    def get_provider(self, config) -> Provider:
+    def get_provider(self, config, root_config: Mapping = None) -> Provider:
+        """Provider of a target, `root_config` has the AWS credentials
+        (the current configuration by default)"""
+        if "targets" in config:
+            return self.construct_fan_out(config, root_config)
         try:
             provider_type = config["provider"]
             provider_cls = self.providers.get(provider_type)
+            if not provider_cls:
+                provider_cls = self.__load_provider_from_entry_points(
+                    provider_type
+                )
             if not provider_cls:
                 provider_cls = self.__load_provider_from_module(provider_type)
         except (KeyError, AttributeError) as err:
             raise InvalidProvider from err
 
-        return self.construct_provider(provider_cls, config)
+        return self.construct_provider(provider_cls, config, root_config)
+
+    def __load_provider_from_entry_points(self, provider_type: str):
+        """Provider cls registered by an installed package
+        Configuration Example:
+            setup.cfg:
+              [options.entry_points]
+              ecosystem_events =
+                  kinesis = my_package.providers.ProviderKinesis
+            route:
+              "provider": "kinesis",
+        """
+        entry_point = discover_entry_points().get(provider_type)
+        if entry_point is None:
+            return None
+        try:
+            provider_cls = entry_point.load()
+        except (ImportError, AttributeError) as err:
+            logger.warning(f"Entry point {entry_point.value} not loaded: {err}")
+            return None
+        if not (
+                isinstance(provider_cls, type)
+                and issubclass(provider_cls, Provider)
+        ):
+            # the group also lists the publisher, subscriber and Event
+            logger.debug(f"Entry point {entry_point.value} is not a provider")
+            return None
+        self.providers[provider_type] = provider_cls
+        return provider_cls
 
     def __load_provider_from_module(self, provider_type: str):
         """Lazy load of provider cls for event publishing
@@ -189,7 +352,171 @@ class Router(ConfigInjector, BaseRouter):
             return provider_cls
         raise KeyError(f"No such provider {provider_type}")
 
-    def construct_provider(self, provider_cls: Type[Provider], config: dict):
+    def construct_fan_out(
+            self, config: Mapping, root_config: Mapping = None
+    ) -> FanOutProvider:
+        """Provider publishing to every target of a multi-target route"""
+        targets = config["targets"]
+        try:
+            return FanOutProvider(
+                [self.get_provider(target, root_config) for target in targets],
+                names=target_names(targets),
+                ack=config.get("ack", ACK_ALL),
+            )
+        except ValueError as err:
+            raise InvalidProvider(str(err)) from err
+
+    def construct_provider(
+            self,
+            provider_cls: Type[Provider],
+            config: dict,
+            root_config: Mapping = None,
+    ):
+        aws_auth = (
+            self.aws_auth if root_config is None else root_config["awsAuth"]
+        )
         profile_name = config.get("profile", "default")
-        profile = self.aws_auth["profiles"].get(profile_name)
+        profile = aws_auth["profiles"].get(profile_name)
         return provider_cls(**config, **profile)
+
+
+ROUTES_PATH = "eventBus.publisher"
+ROUTING_TABLES = ("eventsTargets", "targets")
+
+
+def _thawed(obj):
+    """Mutable deep copy of a (frozen) configuration value"""
+    if isinstance(obj, Mapping):
+        return {key: _thawed(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_thawed(item) for item in obj]
+    return obj
+
+
+def _routing_tables(config: Mapping) -> Dict[str, dict]:
+    """Copies of the routing tables of `config` by name"""
+    publisher = config.get("eventBus", {}).get("publisher", {})
+    return {
+        name: _thawed(publisher[name])
+        for name in ROUTING_TABLES
+        if name in publisher
+    }
+
+
+def _with_tables(config: Mapping, tables: Mapping[str, dict]) -> dict:
+    """Copy of `config` with `tables` as its only routing tables"""
+    event_bus = dict(config.get("eventBus", {}))
+    publisher = {
+        key: value
+        for key, value in event_bus.get("publisher", {}).items()
+        if key not in ROUTING_TABLES
+    }
+    publisher.update(tables)
+    event_bus["publisher"] = publisher
+    return {**config, "eventBus": event_bus}
+
+
+class RouteFileWatcher:
+    """Reload a `Router` when a JSON routing file changes.
+
+    The file is polled for a changed modification time. The watcher owns
+    the routing tables (`eventBus.publisher.targets` or `eventsTargets`):
+    the routes of the file are laid over the routes the `ConfigBuilder` had
+    when the watcher started (never over a previous version of the file, so
+    removed routes disappear), the rest of the configuration is read from
+    the builder as it is now. Only once the router built the new routes
+    are the tables written back to the builder. A file that fails to load
+    or to build leaves routes and builder untouched.
+
+    :param path: JSON file with routing tables, e.g.
+        `{"eventBus": {"publisher": {"targets": {...}}}}`
+    :param interval: seconds between two polls
+    """
+
+    def __init__(
+            self,
+            path: str,
+            router: Router = None,
+            builder=None,
+            interval: float = 5.0,
+    ):
+        self.path = os.path.abspath(path)
+        self.router = router or Router()
+        self.builder = builder or get_config_builder()
+        self._base = _routing_tables(self.builder.freeze().config)
+        self._owned: Set[str] = set(self._base)
+        self.interval = interval
+        self.metrics = Stats()
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_tables(self) -> Dict[str, dict]:
+        with open(self.path, "r", encoding="utf-8") as routes:
+            loaded = _routing_tables(
+                self.builder.resolve_interpolations(json.load(routes))
+            )
+        if not loaded:
+            raise KeyError(f"no {' or '.join(ROUTING_TABLES)} in {ROUTES_PATH}")
+        tables = _thawed(self._base)
+        for name, routes in loaded.items():
+            tables.setdefault(name, {}).update(routes)
+        return tables
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last check"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as err:
+            logger.warning(f"Routing file unavailable: {err}")
+            self.metrics.incr("errors")
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            tables = self._load_tables()
+            self.router.reload(
+                _with_tables(self.builder.freeze().config, tables)
+            )
+        except (OSError, ValueError, KeyError, AttributeError) as err:
+            # JSONDecodeError is a ValueError, KeyError: no targets or a
+            # target without a route, AttributeError: not a JSON object
+            logger.error(f"Reloading routes from {self.path} failed: {err}")
+            self.metrics.incr("errors")
+            return False
+        finally:
+            # a broken file is not retried until it changes again
+            self._mtime = mtime
+        for name in self._owned - set(tables):
+            self.builder.remove_value(f"{ROUTES_PATH}.{name}")
+        for name, routes in tables.items():
+            self.builder.set_value(f"{ROUTES_PATH}.{name}", routes)
+        self._owned = set(tables)
+        logger.info(f"Routes reloaded from {self.path}")
+        self.metrics.incr("reloads")
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.check()
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="route-file-watcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return self.metrics.snapshot()
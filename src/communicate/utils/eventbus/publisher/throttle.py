@@ -0,0 +1,207 @@
+"""Client side rate limiting of publishes.
+
+A `TokenBucket` spaces out publishes to a topic instead of letting bursts
+run into SNS throttling, which botocore hides behind retries with growing
+backoff. The rate adapts: throttling errors cut it by `decrease` (at most once
+per `cooldown`, down to `min_rate`), afterwards it grows back by `recovery`
+messages per second, every second, up to the configured rate.
+
+Routes and `AmazonSNSPublisher` configs enable it with `rate_limit`::
+
+    "rate_limit": {"rate": 300, "burst": 50, "min_rate": 10}
+
+The limiter of a provider counts every message, PublishBatch calls take one
+token per entry. Throttling is detected from raised errors, from the
+`Failed` items of batch responses and, through a botocore event handler,
+from the attempts botocore retries on its own.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from communicate.utils.eventbus.metrics import Stats
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "THROTTLING_CODES",
+    "TokenBucket",
+    "is_throttling",
+    "limited_call",
+    "watch_client",
+)
+
+THROTTLING_CODES = frozenset({
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "Throttled",
+    "RequestThrottled",
+    "TooManyRequestsException",
+})
+
+
+def is_throttling(err: BaseException) -> bool:
+    """Whether `err` is a botocore throttling `ClientError`"""
+    response = getattr(err, "response", None)
+    if not isinstance(response, dict):
+        return False
+    return response.get("Error", {}).get("Code") in THROTTLING_CODES
+
+
+class TokenBucket:
+    """Token bucket with an adaptive refill rate.
+
+    `acquire()` reserves tokens and sleeps until they are available;
+    reservations are served in order, the bucket may go into debt.
+
+    :param rate: tokens per second, the upper bound of the adaptive rate
+    :param burst: bucket capacity, `rate` by default
+    :param min_rate: lower bound of the adaptive rate, `rate / 20` by
+        default
+    :param decrease: factor applied to the rate on throttling
+    :param recovery: rate increase per second without throttling, `rate /
+        10` by default
+    :param cooldown: seconds after a decrease during which further
+        throttling (e.g. of the same burst) does not decrease the rate again
+    :param clock: monotonic time source, `sleep` must advance it
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            burst: float = None,
+            min_rate: float = None,
+            decrease: float = 0.5,
+            recovery: float = None,
+            cooldown: float = 1.0,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], Any] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.min_rate = float(min_rate if min_rate is not None else rate / 20)
+        self.decrease = decrease
+        self.recovery = float(recovery if recovery is not None else rate / 10)
+        self.cooldown = cooldown
+        self.metrics = Stats()
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._current_rate = self.rate
+        self._tokens = self.burst
+        self._updated = clock()
+        self._decreased: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> Optional["TokenBucket"]:
+        """Limiter of a `rate_limit` config, None when it is not set"""
+        if not config:
+            return None
+        return cls(**config)
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed <= 0:
+            return
+        self._updated = now
+        if self._current_rate < self.rate:
+            self._current_rate = min(
+                self.rate, self._current_rate + self.recovery * elapsed
+            )
+        self._tokens = min(
+            self.burst, self._tokens + elapsed * self._current_rate
+        )
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take `tokens`, returns the seconds to wait before using them"""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._current_rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Wait until `tokens` are available, returns the seconds waited"""
+        wait = self.reserve(tokens)
+        self.metrics.incr("acquired", int(tokens))
+        if wait > 0:
+            self.metrics.incr("waits")
+            self.metrics.observe("wait_seconds", wait)
+            self._sleep(wait)
+        return wait
+
+    def record_throttle(self):
+        """Slow down after the target throttled a call"""
+        self.metrics.incr("throttles")
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if (
+                    self._decreased is not None
+                    and now - self._decreased < self.cooldown
+            ):
+                return
+            self._decreased = now
+            rate = max(self.min_rate, self._current_rate * self.decrease)
+            if rate < self._current_rate:
+                logger.info(
+                    f"Throttled, rate {self._current_rate:.1f} -> {rate:.1f}/s"
+                )
+            self._current_rate = rate
+            self._tokens = min(self._tokens, 0.0)
+
+    @property
+    def current_rate(self) -> float:
+        with self._lock:
+            self._refill(self._clock())
+            return self._current_rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill(self._clock())
+            state = {
+                "rate": self.rate,
+                "current_rate": self._current_rate,
+                "tokens": self._tokens,
+            }
+        return {**state, **self.metrics.snapshot()}
+
+
+def limited_call(limiter: Optional[TokenBucket], tokens: int, call: Callable):
+    """`call()` once `tokens` are available, reporting throttling back"""
+    if limiter is None:
+        return call()
+    limiter.acquire(tokens)
+    try:
+        response = call()
+    except Exception as err:
+        if is_throttling(err):
+            limiter.record_throttle()
+        raise
+    failed = response.get("Failed", ()) if isinstance(response, dict) else ()
+    if any(item.get("Code") in THROTTLING_CODES for item in failed):
+        limiter.record_throttle()
+    return response
+
+
+def watch_client(client, limiter: TokenBucket):
+    """Report throttled attempts which botocore retries to `limiter`"""
+
+    def on_needs_retry(response=None, **kwargs):
+        if response is not None:
+            code = response[1].get("Error", {}).get("Code")
+            if code in THROTTLING_CODES:
+                limiter.record_throttle()
+        # leave the retry decision to botocore
+
+    # first, botocore's own handler stops the event when it retries
+    client.meta.events.register_first(
+        f"needs-retry.{client.meta.service_model.service_id.hyphenize()}",
+        on_needs_retry,
+    )
+    return client
@@ -3,7 +3,17 @@ from communicate.utils.eventbus.attribute import (
     Attribute,
     get_attribute_type,
 )
-from typing import Any
+from communicate.utils.eventbus.publisher.hedge import deduplication_id
+from communicate.utils.eventbus.wire import (
+    CONTENT_TYPE_ATTRIBUTE,
+    JsonCodec,
+    WireCodec,
+    get_wire_codec,
+)
+from typing import Any, Iterable, List
+
+# SNS PublishBatch accepts at most 10 messages per request
+SNS_MAX_BATCH = 10
 
 
 class AmazonMessageExtender:
@@ -39,8 +49,13 @@ class AmazonMessageExtender:
 
         # These attributes can then be used in SNS subscription filters like:
         # { "entityName": ["User"], "eventName": ["UserCreated"] }
+
+    Events are encoded with `codec`, codecs other than JSON are advertised
+    in the `contentType` attribute.
     """
 
+    codec: WireCodec = get_wire_codec(JsonCodec.name)
+
     @classmethod
     def resolve(cls, value: Any) -> dict:
         attribute_type: Attribute = get_attribute_type(value)
@@ -61,3 +76,48 @@ class AmazonMessageExtender:
         for name, value in event.routing_keys.items():
             attrs[name] = cls.resolve(value)
         return attrs
+
+    def build_entry(self, event: Event) -> dict:
+        """Message body and attributes of `event`, as sent to SNS"""
+        attrs = self.get_msg_attrs(event)
+        if self.codec.name != JsonCodec.name:
+            attrs[CONTENT_TYPE_ATTRIBUTE] = self.resolve(self.codec.content_type)
+        return {
+            "Message": self.codec.encode(event),
+            "MessageAttributes": attrs,
+        }
+
+    def build_publish_entry(
+            self, event: Event, topic_arn: str, hedged: bool = False
+    ) -> dict:
+        """`build_entry` of a single publish to `topic_arn`, hedged publishes
+        to a FIFO topic get a `MessageDeduplicationId`"""
+        entry = self.build_entry(event)
+        if hedged and topic_arn.endswith(".fifo"):
+            # SNS keeps one copy when both attempts are delivered
+            entry["MessageDeduplicationId"] = deduplication_id(event)
+        return entry
+
+
+def publish_sns_batch(conn, topic_arn: str, entries: Iterable[dict]) -> dict:
+    """Publish prepared entries through PublishBatch, 10 messages a call.
+
+    Returns the merged `Successful`/`Failed` lists of every call, the `Id`
+    of an item is its index in `entries`.
+    """
+    entries = list(entries)
+    successful: List[dict] = []
+    failed: List[dict] = []
+    for start in range(0, len(entries), SNS_MAX_BATCH):
+        batch = [
+            {"Id": str(index), **entry}
+            for index, entry in enumerate(
+                entries[start:start + SNS_MAX_BATCH], start
+            )
+        ]
+        response = conn.publish_batch(
+            TopicArn=topic_arn, PublishBatchRequestEntries=batch
+        )
+        successful.extend(response.get("Successful", ()))
+        failed.extend(response.get("Failed", ()))
+    return {"Successful": successful, "Failed": failed}
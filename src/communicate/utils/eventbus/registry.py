@@ -1,7 +1,10 @@
+import copy
+import hashlib
 import json
 from collections import OrderedDict
 from communicate.utils.eventbus import Event
-from pydantic.schema import schema
+from communicate.utils.eventbus.serialization import ModelCodec, get_codec
+from typing import Dict, Optional, Tuple
 
 config = {}
 app_name = "CommonEvents"
@@ -14,6 +17,17 @@ class EventRegistry:
     _instance = None
     ref_prefix = None
 
+    # Bumped on every registration, used to invalidate assembled documents
+    _revision = 0
+    # Bumped when the definition names of already known models change,
+    # used to invalidate the per-event schema cache
+    _generation = 0
+    _flat_models: Dict[type, frozenset] = {}
+    _model_name_map: Dict[type, str] = {}
+    _name_map_revision = 0
+    _event_schemas: Dict[tuple, Tuple[dict, dict]] = {}
+    _documents: Dict[tuple, Tuple[dict, str, bytes, str]] = {}
+
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super().__new__(cls, *args, **kwargs)
@@ -22,7 +36,10 @@ class EventRegistry:
     @classmethod
     def register(cls, payload, name: str = None):
         name = name or payload.get_event_name()
-        cls._registry[name] = cls._build_event(payload, name)
+        event = cls._registry[name] = cls._build_event(payload, name)
+        get_codec(event).compile()
+        cls._revision += 1
+        cls._documents = {}
 
     @classmethod
     def _build_event(cls, payload, name) -> type:
@@ -36,24 +53,121 @@ class EventRegistry:
     def construct_id(name: str, version: str):
         return f"Events.{name}.{version}"
 
-    def generate_schema(
+    @classmethod
+    def _refresh_model_names(cls):
+        """Keep the definition names of every referenced model up to date.
+
+        Only events registered since the last call are walked. Cached event
+        schemas stay valid unless a new model forces pydantic to rename an
+        existing definition (two models with the same class name).
+        """
+        if cls._name_map_revision == cls._revision:
+            return
+
+        from pydantic.schema import (  # pylint: disable=import-outside-toplevel
+            get_flat_models_from_model,
+            get_model_name_map,
+        )
+
+        events = cls._registry.values()
+        for event in events:
+            if event not in cls._flat_models:
+                cls._flat_models[event] = frozenset(
+                    get_flat_models_from_model(event)
+                )
+        flat_models = set().union(*(cls._flat_models[e] for e in events))
+        name_map = get_model_name_map(flat_models)
+
+        previous = cls._model_name_map
+        if any(
+                previous.get(model, name) != name
+                for model, name in name_map.items()
+        ):
+            cls._generation += 1
+            cls._event_schemas = {}
+        cls._model_name_map = name_map
+        cls._name_map_revision = cls._revision
+
+    def _event_schema(self, event, ref_template: str) -> Tuple[dict, dict]:
+        key = (event, self._generation, self.ref_prefix, ref_template)
+        try:
+            return self._event_schemas[key]
+        except KeyError:
+            pass
+
+        from pydantic.schema import (  # pylint: disable=import-outside-toplevel
+            model_process_schema,
+        )
+
+        m_schema, m_definitions, _ = model_process_schema(
+            event,
+            by_alias=True,
+            model_name_map=self._model_name_map,
+            ref_prefix=self.ref_prefix,
+            ref_template=ref_template,
+        )
+        self._event_schemas[key] = (m_schema, m_definitions)
+        return m_schema, m_definitions
+
+    def _document(
             self,
-            service_name: str = app_name,
-            version: str = app_version,
+            service_name: str,
+            version: str,
+            indent=None,
             **kwargs,
-    ):
+    ) -> Tuple[dict, str, bytes, str]:
+        key = (
+            self._revision,
+            self.ref_prefix,
+            service_name,
+            version,
+            indent,
+            tuple(sorted(kwargs.items())),
+        )
+        try:
+            return self._documents[key]
+        except KeyError:
+            pass
+
+        from pydantic.schema import (  # pylint: disable=import-outside-toplevel
+            default_ref_template,
+        )
+
+        self._refresh_model_names()
         kwargs.setdefault(
             "title", f"Events for {service_name} service, version of {version}"
         )
-        schema_ = schema(
-            self.events_list(),
-            ref_prefix=self.ref_prefix,
-            by_alias=True,
-            **kwargs,
-        )
+        ref_template = kwargs.get("ref_template", default_ref_template)
+
+        schema_ = {}
+        if kwargs.get("title"):
+            schema_["title"] = kwargs["title"]
+        if kwargs.get("description"):
+            schema_["description"] = kwargs["description"]
+        definitions = {}
+        for event in self.events_list():
+            m_schema, m_definitions = self._event_schema(event, ref_template)
+            definitions.update(m_definitions)
+            definitions[self._model_name_map[event]] = m_schema
+        if definitions:
+            schema_["definitions"] = definitions
         schema_["id"] = self.construct_id(service_name, version)
         schema_["$schema"] = _schema
-        return schema_
+
+        text = json.dumps(schema_, indent=indent)
+        data = text.encode("utf-8")
+        fingerprint = hashlib.sha256(data).hexdigest()
+        document = self._documents[key] = (schema_, text, data, fingerprint)
+        return document
+
+    def generate_schema(
+            self,
+            service_name: str = app_name,
+            version: str = app_version,
+            **kwargs,
+    ):
+        schema_, *_ = self._document(service_name, version, **kwargs)
+        return copy.deepcopy(schema_)
 
     def generate_json_schema(
             self,
@@ -62,13 +176,35 @@ class EventRegistry:
             version: str = app_version,
             **kwargs,
     ):
-        return json.dumps(
-            self.generate_schema(service_name, version, **kwargs),
-            indent=indent,
+        _, text, *_ = self._document(
+            service_name, version, indent=indent, **kwargs
         )
+        return text
+
+    def generate_json_schema_bytes(
+            self,
+            indent=None,
+            service_name: str = app_name,
+            version: str = app_version,
+            **kwargs,
+    ) -> Tuple[bytes, str]:
+        """Encoded JSON schema and its fingerprint, usable as an ETag.
+
+        Both are computed once per registry state, repeated calls return
+        the same objects.
+        """
+        *_, data, fingerprint = self._document(
+            service_name, version, indent=indent, **kwargs
+        )
+        return data, fingerprint
 
     def events_list(self):
         return list(self._registry.values())
 
     def get_event_by_name(self, name) -> Event:
         return self._registry.get(name)
+
+    def get_codec(self, name) -> Optional[ModelCodec]:
+        """Generated decoder/encoder of a registered event"""
+        event = self._registry.get(name)
+        return get_codec(event) if event else None
@@ -0,0 +1,405 @@
+"""Relay events from an SQS queue to an SNS topic.
+
+`Relay` receives messages in batches of 10, filters and rewrites their
+routing keys (the SNS message attributes) as declared by `RelayRules`, and
+republishes them through PublishBatch. The event itself is forwarded
+verbatim, it is never decoded. A source message is deleted only once its
+copy was published (or it was filtered out); messages which failed to be
+published become visible again after the queue's visibility timeout.
+
+The kombu consumer of `AmazonSNSSubscriber` hands messages over one by one,
+so the relay talks to SQS directly.
+
+Usage::
+
+    eventbus-relay --source-queue orders-relay --topic arn:aws:sns:...:orders \\
+        --rules rules.json --concurrency 4
+"""
+import argparse
+import base64
+import fnmatch
+import json
+import logging
+import os
+import re
+import signal
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from communicate.utils.eventbus import profiling
+from communicate.utils.eventbus.metrics import Stats
+from communicate.utils.eventbus.publisher.throttle import (
+    TokenBucket,
+    limited_call,
+    watch_client,
+)
+from communicate.utils.eventbus.publisher.utils import (
+    AmazonMessageExtender,
+    publish_sns_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "Relay",
+    "RelayRules",
+    "main",
+    "unwrap",
+)
+
+# SQS ReceiveMessage/DeleteMessageBatch handle at most 10 messages
+SQS_MAX_BATCH = 10
+
+
+def _patterns(spec: Dict[str, Iterable[str]]) -> Dict[str, re.Pattern]:
+    return {
+        name: re.compile(
+            "|".join(fnmatch.translate(p) for p in (
+                [patterns] if isinstance(patterns, str) else patterns
+            ))
+        )
+        for name, patterns in (spec or {}).items()
+    }
+
+
+class RelayRules:
+    """Declarative routing key filters and rewrites.
+
+    :param include: `{key: [pattern, ...]}`, relay only messages whose
+        keys all match one of their glob patterns
+    :param exclude: `{key: [pattern, ...]}`, skip messages with a key
+        matching one of its patterns
+    :param rename: `{old key: new key}`
+    :param drop: keys to remove
+    :param set: `{key: value}` to add or overwrite, applied last
+
+    Example (`--rules` file of `eventbus-relay`)::
+
+        {
+            "include": {"eventName": ["Order*"]},
+            "exclude": {"entityName": ["Test*"]},
+            "rename": {"publisherName": "originPublisher"},
+            "set": {"publisherName": "OrdersRelay"}
+        }
+    """
+
+    def __init__(
+            self,
+            include: Dict[str, Iterable[str]] = None,
+            exclude: Dict[str, Iterable[str]] = None,
+            rename: Dict[str, str] = None,
+            drop: Iterable[str] = (),
+            set: Dict[str, object] = None,  # pylint: disable=redefined-builtin
+    ):
+        self.include = _patterns(include)
+        self.exclude = _patterns(exclude)
+        self.rename = dict(rename or {})
+        self.drop = tuple(drop)
+        self.set = {
+            name: AmazonMessageExtender.resolve(value)
+            for name, value in (set or {}).items()
+        }
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> "RelayRules":
+        return cls(**spec)
+
+    def accepts(self, attrs: dict) -> bool:
+        for name, pattern in self.include.items():
+            attr = attrs.get(name)
+            if attr is None or not pattern.match(attr.get("StringValue", "")):
+                return False
+        for name, pattern in self.exclude.items():
+            attr = attrs.get(name)
+            if attr is not None and pattern.match(attr.get("StringValue", "")):
+                return False
+        return True
+
+    def apply(self, attrs: dict) -> Optional[dict]:
+        """Rewritten attributes, None when the message is filtered out"""
+        if not self.accepts(attrs):
+            return None
+        attrs = dict(attrs)
+        for old, new in self.rename.items():
+            if old in attrs:
+                attrs[new] = attrs.pop(old)
+        for name in self.drop:
+            attrs.pop(name, None)
+        attrs.update(self.set)
+        return attrs
+
+
+def _publish_attr(attr: dict) -> dict:
+    """SNS notification attribute (`Type`/`Value`) as a publish attribute"""
+    data_type = attr["Type"]
+    if data_type == "Binary":
+        return {"DataType": data_type, "BinaryValue": base64.b64decode(attr["Value"])}
+    return {"DataType": data_type, "StringValue": attr["Value"]}
+
+
+def unwrap(sqs_message: dict) -> Tuple[str, dict]:
+    """Event and routing attributes of a received SQS message.
+
+    The body is an SNS notification envelope, or the event itself when the
+    subscription has raw message delivery enabled. The event is not decoded.
+    """
+    body = sqs_message["Body"]
+    envelope = None
+    if body.startswith("{") and '"TopicArn"' in body:
+        envelope = json.loads(body)
+    if isinstance(envelope, dict) and envelope.get("Type") == "Notification":
+        attrs = {
+            name: _publish_attr(attr)
+            for name, attr in envelope.get("MessageAttributes", {}).items()
+        }
+        return envelope["Message"], attrs
+    attrs = {
+        name: {
+            key: value for key, value in attr.items()
+            if key in ("DataType", "StringValue", "BinaryValue")
+        }
+        for name, attr in sqs_message.get("MessageAttributes", {}).items()
+    }
+    return body, attrs
+
+
+class Relay:
+    """Move events from `source_queue_url` to `topic_arn`.
+
+    :param sqs: boto3 SQS client of the source queue
+    :param sns: boto3 SNS client of the target topic
+    :param rules: filters/rewrites of the routing keys
+    :param concurrency: threads receiving and publishing batches
+    :param wait_time: long polling of ReceiveMessage, also bounds how long
+        `stop()` takes
+    :param limiter: rate limit of the messages published to the topic
+    """
+
+    def __init__(
+            self,
+            sqs,
+            sns,
+            source_queue_url: str,
+            topic_arn: str,
+            rules: RelayRules = None,
+            concurrency: int = 1,
+            wait_time: int = 20,
+            clock: Callable[[], float] = time.time,
+            limiter: TokenBucket = None,
+    ):
+        self.sqs = sqs
+        self.sns = sns
+        self.source_queue_url = source_queue_url
+        self.topic_arn = topic_arn
+        self.rules = rules or RelayRules()
+        self.concurrency = concurrency
+        self.wait_time = wait_time
+        self.limiter = limiter
+        self.metrics = Stats()
+        self._clock = clock
+        self._started: Optional[float] = None
+        self._stopping = threading.Event()
+
+    def _receive(self) -> List[dict]:
+        response = self.sqs.receive_message(
+            QueueUrl=self.source_queue_url,
+            MaxNumberOfMessages=SQS_MAX_BATCH,
+            WaitTimeSeconds=self.wait_time,
+            AttributeNames=["SentTimestamp"],
+            MessageAttributeNames=["All"],
+        )
+        return response.get("Messages", [])
+
+    def _observe_lag(self, sqs_message: dict, now: float):
+        sent = sqs_message.get("Attributes", {}).get("SentTimestamp")
+        if sent is not None:
+            self.metrics.observe("lag_seconds", max(now - int(sent) / 1000, 0))
+
+    def _publish(self, entries: List[dict]) -> List[int]:
+        """Indexes of the published entries"""
+        started = self._clock()
+        try:
+            response = limited_call(
+                self.limiter,
+                len(entries),
+                lambda: publish_sns_batch(self.sns, self.topic_arn, entries),
+            )
+        except Exception:  # noqa, pylint: disable=broad-except
+            logger.exception(f"Relaying {len(entries)} messages failed")
+            self.metrics.incr("failed", len(entries))
+            return []
+        finally:
+            self.metrics.observe("publish_seconds", self._clock() - started)
+        for item in response["Failed"]:
+            logger.error(
+                f"Relaying message failed: {item.get('Code')} "
+                f"{item.get('Message')}"
+            )
+            self.metrics.incr("failed")
+        return [int(item["Id"]) for item in response["Successful"]]
+
+    def _ack(self, sqs_messages: List[dict]):
+        response = self.sqs.delete_message_batch(
+            QueueUrl=self.source_queue_url,
+            Entries=[
+                {"Id": str(index), "ReceiptHandle": m["ReceiptHandle"]}
+                for index, m in enumerate(sqs_messages)
+            ],
+        )
+        for item in response.get("Failed", ()):
+            logger.warning(f"Deleting relayed message failed: {item}")
+            self.metrics.incr("ack_failed")
+
+    def relay_batch(self) -> int:
+        """Receive and relay one batch, returns the number of messages"""
+        sqs_messages = self._receive()
+        if not sqs_messages:
+            return 0
+        now = self._clock()
+        self.metrics.incr("received", len(sqs_messages))
+        entries, sources, done = [], [], []
+        for sqs_message in sqs_messages:
+            self._observe_lag(sqs_message, now)
+            try:
+                message, attrs = unwrap(sqs_message)
+            except (KeyError, TypeError, ValueError) as err:
+                # left to the redrive policy of the source queue
+                logger.warning(
+                    f"Invalid message {sqs_message.get('MessageId')}: {err}"
+                )
+                self.metrics.incr("invalid")
+                continue
+            attrs = self.rules.apply(attrs)
+            if attrs is None:
+                self.metrics.incr("filtered")
+                done.append(sqs_message)
+                continue
+            entries.append({"Message": message, "MessageAttributes": attrs})
+            sources.append(sqs_message)
+
+        if entries:
+            published = self._publish(entries)
+            if published:
+                self.metrics.incr("relayed", len(published))
+            done.extend(sources[index] for index in published)
+        if done:
+            self._ack(done)
+        return len(sqs_messages)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with profiling.section("relay.relay_batch"):
+                    self.relay_batch()
+            except Exception as err:  # noqa, pylint: disable=broad-except
+                logger.exception(f"Relay batch failed: {err}")
+                self.metrics.incr("errors")
+                self._stopping.wait(1.0)
+
+    def run(self):
+        """Relay until `stop()`"""
+        self._stopping.clear()
+        self._started = time.monotonic()
+        threads = [
+            threading.Thread(target=self._run, name=f"relay-{index}")
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self, *_):
+        self._stopping.set()
+
+    def stats(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        snapshot["throughput"] = (
+            snapshot["counters"].get("relayed", 0) / elapsed if elapsed else 0.0
+        )
+        if self.limiter is not None:
+            snapshot["rate_limit"] = self.limiter.stats()
+        return snapshot
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="eventbus-relay",
+        description="Relay events from an SQS queue to an SNS topic",
+    )
+    parser.add_argument(
+        "--source-queue", required=True, help="SQS queue name or url"
+    )
+    parser.add_argument("--topic", required=True, help="target SNS topic ARN")
+    parser.add_argument("--rules", help="JSON file of the RelayRules")
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument(
+        "--endpoint-url", default=os.environ.get("EVENTBUS_ENDPOINT_URL"),
+    )
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--wait-time", type=int, default=20)
+    parser.add_argument(
+        "--rate", type=float, help="messages per second published at most"
+    )
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s %(threadName)s %(levelname)s %(message)s",
+    )
+    import boto3  # pylint: disable=import-outside-toplevel
+
+    session = boto3.session.Session(region_name=args.region)
+    sqs = session.client("sqs", endpoint_url=args.endpoint_url)
+    sns = session.client("sns", endpoint_url=args.endpoint_url)
+    queue_url = args.source_queue
+    if "://" not in queue_url:
+        queue_url = sqs.get_queue_url(QueueName=queue_url)["QueueUrl"]
+    limiter = None
+    if args.rate:
+        limiter = TokenBucket(args.rate)
+        watch_client(sns, limiter)
+    rules = None
+    if args.rules:
+        with open(args.rules, encoding="utf-8") as rules_file:
+            rules = RelayRules.from_spec(json.load(rules_file))
+
+    relay = Relay(
+        sqs,
+        sns,
+        queue_url,
+        args.topic,
+        rules=rules,
+        concurrency=args.concurrency,
+        wait_time=args.wait_time,
+        limiter=limiter,
+    )
+    signal.signal(signal.SIGTERM, relay.stop)
+    signal.signal(signal.SIGINT, relay.stop)
+    profiling.install_signal_handler()
+
+    stopped = threading.Event()
+
+    def reporter():
+        while not stopped.wait(args.report_interval):
+            stats = relay.stats()
+            lag = stats["timings"].get("lag_seconds", {})
+            logger.info(
+                f"{stats['counters']}, {stats['throughput']:.1f} msg/s, "
+                f"lag p50 {lag.get('p50')} p99 {lag.get('p99')}"
+            )
+
+    threading.Thread(target=reporter, name="reporter", daemon=True).start()
+    try:
+        relay.run()
+    finally:
+        stopped.set()
+        logger.info(f"Relay stopped: {relay.stats()}")
+
+
+if __name__ == "__main__":
+    main()
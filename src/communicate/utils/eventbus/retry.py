@@ -0,0 +1,119 @@
+"""Retry/backoff policies and dead-letter destinations for consumers."""
+import abc
+import logging
+import random
+from typing import Callable, Optional
+
+from .visibility import SQS_MAX_VISIBILITY, sqs_target
+
+logger = logging.getLogger(__package__)
+
+__all__ = (
+    "Backoff",
+    "RetryPolicy",
+    "DeadLetterDestination",
+    "SQSDeadLetterQueue",
+    "receive_count",
+)
+
+
+class Backoff:
+    """Exponential backoff with equal jitter.
+
+    The delay of attempt `n` (starting at 0) is `min(cap, base * factor**n)`,
+    half of which is randomized when `jitter` is set, so many workers that
+    failed together do not retry together.
+    """
+
+    def __init__(
+            self,
+            base: float = 1.0,
+            factor: float = 2.0,
+            cap: float = 60.0,
+            jitter: bool = True,
+            rand: Callable[[], float] = random.random,
+    ):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+        self._rand = rand
+
+    def delay(self, attempt: int) -> float:
+        try:
+            delay = min(self.cap, self.base * self.factor ** max(attempt, 0))
+        except OverflowError:
+            delay = self.cap
+        if self.jitter:
+            delay = delay / 2 + self._rand() * delay / 2
+        return delay
+
+
+class RetryPolicy:
+    """Redelivery of failed messages through a delayed SQS visibility.
+
+    :param backoff: delay of the n-th redelivery
+    :param max_receive_count: messages received this many times are moved
+        to the dead-letter destination instead of being retried
+    """
+
+    def __init__(
+            self,
+            backoff: Backoff = None,
+            max_receive_count: int = 5,
+    ):
+        self.backoff = backoff or Backoff(base=2.0, cap=900.0)
+        self.max_receive_count = max_receive_count
+
+    def exhausted(self, count: Optional[int]) -> bool:
+        return count is not None and count >= self.max_receive_count
+
+    def visibility_timeout(self, count: Optional[int]) -> int:
+        delay = self.backoff.delay((count or 1) - 1)
+        return int(min(max(delay, 1), SQS_MAX_VISIBILITY))
+
+
+def receive_count(message) -> Optional[int]:
+    """ApproximateReceiveCount of a kombu SQS message"""
+    delivery_info = getattr(message, "delivery_info", None) or {}
+    sqs_message = delivery_info.get("sqs_message") or {}
+    count = sqs_message.get("Attributes", {}).get("ApproximateReceiveCount")
+    return int(count) if count is not None else None
+
+
+class DeadLetterDestination(abc.ABC):
+    """Where poison messages are moved to"""
+
+    @abc.abstractmethod
+    def send(self, body: str, reason: str, message=None):
+        pass
+
+
+class SQSDeadLetterQueue(DeadLetterDestination):
+    """Send the raw message body to an SQS queue.
+
+    Without an explicit `client` the client of the consumed message is
+    used, which suits a dead-letter queue in the same account/region.
+    """
+
+    def __init__(self, queue_url: str, client=None):
+        self.queue_url = queue_url
+        self.client = client
+
+    def send(self, body: str, reason: str, message=None):
+        client = self.client
+        if client is None:
+            target = sqs_target(message)
+            if target is None:
+                raise ValueError("No SQS client for the dead-letter queue")
+            client = target.client
+        client.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=body,
+            MessageAttributes={
+                "deadLetterReason": {
+                    "DataType": "String",
+                    "StringValue": reason[:1024] or "unknown",
+                }
+            },
+        )
@@ -0,0 +1,447 @@
+"""Generated fast-path decoders/encoders for pydantic models.
+
+`Model.parse_raw` and `instance.json()` go through the generic pydantic
+machinery for every field of every message. A `ModelCodec` looks at the
+field annotations once and generates a decode function that accepts the
+already well-typed JSON values directly, and an encode function that builds
+the aliased dict without pydantic's include/exclude bookkeeping.
+
+The fast path is strict: any value it is not sure about (wrong JSON type,
+missing required field, custom validators, unsupported annotations, ...)
+makes it hand the whole message over to pydantic, so results and errors are
+the same as with `parse_raw`/`.json(by_alias=True)`.
+
+Generated decoders build instances without calling `__init__`. Models which
+override it are decoded by pydantic, unless the class defining `__init__`
+sets `__fast_decode__ = True` to declare that skipping it is safe for
+messages without unknown keys (like `EventMeta`, whose `__init__` only
+consumes `routing_keys`).
+"""
+import threading
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Type, Union
+from uuid import UUID
+
+from pydantic import BaseModel, Extra, ValidationError
+from pydantic.datetime_parse import parse_date, parse_datetime
+from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_SINGLETON, ModelField
+from pydantic.typing import is_namedtuple
+from pydantic.utils import ROOT_KEY, sequence_like
+
+__all__ = ("ModelCodec", "get_codec", "decode", "encode")
+
+_MISSING = object()
+_object_setattr = object.__setattr__
+
+
+class _Fallback(Exception):
+    """The fast path can not decide, let pydantic handle the value"""
+
+
+class _Unsupported(Exception):
+    """The model can not be compiled"""
+
+
+def _identity(value):
+    return value
+
+
+def _parser(parse: Callable) -> Callable:
+    def convert(value):
+        try:
+            return parse(value)
+        except (TypeError, ValueError) as err:
+            raise _Fallback from err
+
+    return convert
+
+
+def _uuid(value):
+    if type(value) is str:  # pylint: disable=unidiomatic-typecheck
+        try:
+            return UUID(value)
+        except ValueError as err:
+            raise _Fallback from err
+    if type(value) is UUID:  # pylint: disable=unidiomatic-typecheck
+        return value
+    raise _Fallback
+
+
+def _float(value):
+    value_type = type(value)
+    if value_type is float:
+        return value
+    if value_type is int:
+        return float(value)
+    raise _Fallback
+
+
+def _exact(expected: type) -> Callable:
+    def convert(value):
+        if type(value) is not expected:  # pylint: disable=unidiomatic-typecheck
+            raise _Fallback
+        return value
+
+    return convert
+
+
+# Annotations whose pydantic validator returns exactly the same object when
+# the JSON value already has the right type
+_EXACT_TYPES = (str, int, bool, dict, list)
+
+_SCALAR_CONVERTERS = {
+    UUID: _uuid,
+    float: _float,
+    datetime: _parser(parse_datetime),
+    date: _parser(parse_date),
+}
+
+
+def _union_converter(members) -> Callable:
+    """Only unions of `str`/`UUID` are supported: a `str` that is not a
+    valid UUID is rejected by pydantic's UUID validator as well, so trying
+    the members in order gives the same result as pydantic.
+    """
+    kinds = []
+    for member in members:
+        if member.allow_none or member.shape != SHAPE_SINGLETON:
+            raise _Unsupported(member)
+        if member.type_ is str:
+            kinds.append(str)
+        elif member.type_ is UUID:
+            kinds.append(UUID)
+        else:
+            raise _Unsupported(member)
+    kinds = tuple(kinds)
+
+    def convert(value):
+        value_type = type(value)
+        if value_type is UUID and UUID in kinds:
+            return value
+        if value_type is not str:
+            raise _Fallback
+        for kind in kinds:
+            if kind is str:
+                return value
+            try:
+                return UUID(value)
+            except ValueError:
+                continue
+        raise _Fallback
+
+    return convert
+
+
+class ModelCodec:
+    """Fast decode/encode functions for one pydantic model class"""
+
+    model: Type[BaseModel]
+    compiled: bool
+    _decoder: Optional[Callable[[dict], BaseModel]]
+    _encoder: Optional[Callable[[BaseModel], dict]]
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.compiled = False
+        self._decoder = None
+        self._encoder = None
+        self._lock = threading.Lock()
+
+    # Compilation
+
+    def compile(self) -> "ModelCodec":
+        with self._lock:
+            if self.compiled:
+                return self
+            try:
+                self._decoder = self._build_decoder()
+            except _Unsupported:
+                self._decoder = None
+            try:
+                self._encoder = self._build_encoder()
+            except _Unsupported:
+                self._encoder = None
+            self.compiled = True
+        return self
+
+    @property
+    def decoder_supported(self) -> bool:
+        return self.compile()._decoder is not None
+
+    @property
+    def encoder_supported(self) -> bool:
+        return self.compile()._encoder is not None
+
+    def _check_model(self):
+        model = self.model
+        config = model.__config__
+        if model.__custom_root_type__:
+            raise _Unsupported("custom root type")
+        if model.__pre_root_validators__ or model.__post_root_validators__:
+            raise _Unsupported("root validators")
+        if config.validate_all or config.extra == Extra.allow:
+            raise _Unsupported("config")
+        init_owner = next(c for c in model.__mro__ if "__init__" in vars(c))
+        if init_owner is not BaseModel and not vars(init_owner).get(
+                "__fast_decode__", False
+        ):
+            raise _Unsupported("custom __init__")
+
+    def _field_converter(self, field: ModelField) -> Callable:
+        if field.class_validators or field.pre_validators or field.post_validators:
+            raise _Unsupported(field)
+
+        converter = self._shape_converter(field)
+        if not field.allow_none:
+            return converter
+
+        def convert(value):
+            if value is None:
+                return None
+            return converter(value)
+
+        return convert
+
+    def _shape_converter(self, field: ModelField) -> Callable:
+        if field.shape == SHAPE_LIST:
+            item = self._field_converter(field.sub_fields[0])
+
+            def convert_list(value):
+                if type(value) is not list:  # pylint: disable=unidiomatic-typecheck
+                    raise _Fallback
+                return [item(i) for i in value]
+
+            return convert_list
+
+        if field.shape == SHAPE_DICT:
+            if field.key_field.type_ is not str:
+                raise _Unsupported(field)
+            item = self._field_converter(field.sub_fields[0])
+
+            def convert_dict(value):
+                if type(value) is not dict:  # pylint: disable=unidiomatic-typecheck
+                    raise _Fallback
+                for key in value:
+                    if type(key) is not str:  # pylint: disable=unidiomatic-typecheck
+                        raise _Fallback
+                return {k: item(v) for k, v in value.items()}
+
+            return convert_dict
+
+        if field.shape != SHAPE_SINGLETON:
+            raise _Unsupported(field)
+
+        type_ = field.type_
+        config = self.model.__config__
+        if type_ is Any:
+            return _identity
+        if type_ is str and (
+                config.anystr_strip_whitespace
+                or config.anystr_upper
+                or config.anystr_lower
+                or config.min_anystr_length
+                or config.max_anystr_length is not None
+        ):
+            raise _Unsupported(field)
+        if type_ in _EXACT_TYPES:
+            return _exact(type_)
+        if type_ is float and not getattr(config, "allow_inf_nan", True):
+            raise _Unsupported(field)
+        if type_ in _SCALAR_CONVERTERS:
+            return _SCALAR_CONVERTERS[type_]
+        if getattr(type_, "__origin__", None) is Union and field.sub_fields:
+            if getattr(config, "smart_union", False):
+                raise _Unsupported(field)
+            return _union_converter(field.sub_fields)
+        if isinstance(type_, type) and issubclass(type_, BaseModel):
+            return get_codec(type_).decode_nested
+        raise _Unsupported(field)
+
+    def _build_decoder(self) -> Callable[[dict], BaseModel]:
+        self._check_model()
+        model = self.model
+        config = model.__config__
+        by_name = config.allow_population_by_field_name
+        # Models with their own __init__ may consume unknown keys
+        # (e.g. EventMeta.routing_keys), make sure there are none
+        check_keys = (
+                config.extra == Extra.forbid
+                or model.__init__ is not BaseModel.__init__
+        )
+
+        namespace = {
+            "_Fallback": _Fallback,
+            "_MISSING": _MISSING,
+            "_new": model.__new__,
+            "_set": _object_setattr,
+            "_model": model,
+        }
+        known_keys = set()
+        lines = [
+            "def decode(data):",
+            "    if type(data) is not dict:",
+            "        raise _Fallback",
+            "    values = {}",
+            "    fields_set = set()",
+        ]
+        for index, (name, field) in enumerate(model.__fields__.items()):
+            if field.validate_always:
+                raise _Unsupported(field)
+            converter = self._field_converter(field)
+            known_keys.add(field.alias)
+            lines.append(f"    value = data.get({field.alias!r}, _MISSING)")
+            if by_name and field.alt_alias:
+                known_keys.add(name)
+                lines.append("    if value is _MISSING:")
+                lines.append(f"        value = data.get({name!r}, _MISSING)")
+            lines.append("    if value is _MISSING:")
+            if field.required:
+                lines.append("        raise _Fallback")
+            else:
+                namespace[f"_default_{index}"] = field.get_default
+                lines.append(f"        values[{name!r}] = _default_{index}()")
+            lines.append("    else:")
+            lines.append(f"        fields_set.add({name!r})")
+            if converter is _identity:
+                lines.append(f"        values[{name!r}] = value")
+            else:
+                namespace[f"_convert_{index}"] = converter
+                lines.append(
+                    f"        values[{name!r}] = _convert_{index}(value)"
+                )
+        if check_keys:
+            namespace["_known_keys"] = frozenset(known_keys)
+            lines.append("    if not _known_keys.issuperset(data):")
+            lines.append("        raise _Fallback")
+        lines += [
+            "    instance = _new(_model)",
+            "    _set(instance, '__dict__', values)",
+            "    _set(instance, '__fields_set__', fields_set)",
+            "    instance._init_private_attributes()",
+            "    return instance",
+        ]
+        exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+        return namespace["decode"]
+
+    def _build_encoder(self) -> Callable[[BaseModel], dict]:
+        model = self.model
+        if model.__custom_root_type__ or model.__exclude_fields__:
+            raise _Unsupported("custom root type or excluded fields")
+        if model.__include_fields__ or getattr(
+                model.Config, "use_enum_values", False
+        ):
+            raise _Unsupported("config")
+
+        fields = list(model.__fields__.items())
+        namespace = {
+            "_get_value": _get_value,
+            "_generic": lambda instance: instance.dict(by_alias=True),
+        }
+        lines = [
+            "def encode(instance):",
+            "    data = instance.__dict__",
+            f"    if len(data) != {len(fields)}:",
+            "        return _generic(instance)",
+            "    return {",
+        ]
+        for name, field in fields:
+            lines.append(
+                f"        {field.alias!r}: _get_value(data[{name!r}]),"
+            )
+        lines.append("    }")
+        exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+        return namespace["encode"]
+
+    # Runtime
+
+    def decode_nested(self, data: Any) -> BaseModel:
+        """Decode a nested model value, used by the generated decoders"""
+        if not self.compiled:
+            self.compile()
+        if self._decoder is not None:
+            return self._decoder(data)
+        try:
+            return self.model.validate(data)
+        except ValidationError as err:
+            raise _Fallback from err
+
+    def decode_obj(self, data: Any) -> BaseModel:
+        if not self.compiled:
+            self.compile()
+        if self._decoder is not None:
+            try:
+                return self._decoder(data)
+            except _Fallback:
+                pass
+        return self.model.parse_obj(data)
+
+    def decode(self, raw: Union[str, bytes]) -> BaseModel:
+        """Drop-in replacement of `model.parse_raw(raw)`"""
+        try:
+            data = self.model.__config__.json_loads(raw)
+        except (TypeError, ValueError):
+            return self.model.parse_raw(raw)
+        return self.decode_obj(data)
+
+    def to_dict(self, instance: BaseModel) -> dict:
+        """Drop-in replacement of `instance.dict(by_alias=True)`"""
+        if not self.compiled:
+            self.compile()
+        if self._encoder is None or type(instance) is not self.model:
+            return instance.dict(by_alias=True)
+        return self._encoder(instance)
+
+    def encode(self, instance: BaseModel) -> str:
+        """Drop-in replacement of `instance.json(by_alias=True)`"""
+        if not self.compiled:
+            self.compile()
+        if self._encoder is None or type(instance) is not self.model:
+            return instance.json(by_alias=True)
+        return self.model.__config__.json_dumps(
+            self._encoder(instance), default=self.model.__json_encoder__
+        )
+
+
+def _get_value(value: Any) -> Any:
+    """`BaseModel._get_value` for `.dict(by_alias=True)` without options"""
+    if isinstance(value, BaseModel):
+        data = get_codec(type(value)).to_dict(value)
+        if ROOT_KEY in data:
+            return data[ROOT_KEY]
+        return data
+    if isinstance(value, dict):
+        return {k: _get_value(v) for k, v in value.items()}
+    if sequence_like(value):
+        items = (_get_value(i) for i in value)
+        if is_namedtuple(value.__class__):
+            return value.__class__(*items)
+        return value.__class__(items)
+    return value
+
+
+_codecs: Dict[type, ModelCodec] = {}
+_codecs_lock = threading.Lock()
+
+
+def get_codec(model: Type[BaseModel]) -> ModelCodec:
+    """Codec of `model`, created once and compiled on first use"""
+    try:
+        return _codecs[model]
+    except KeyError:
+        pass
+    with _codecs_lock:
+        codec = _codecs.get(model)
+        if codec is None:
+            codec = _codecs[model] = ModelCodec(model)
+    return codec
+
+
+def decode(model: Type[BaseModel], raw: Union[str, bytes]) -> BaseModel:
+    return get_codec(model).decode(raw)
+
+
+def encode(instance: BaseModel) -> str:
+    if not isinstance(instance, BaseModel):
+        # `LazyEvent`, re-published from its original message if unmodified
+        return instance.json(by_alias=True)
+    return get_codec(type(instance)).encode(instance)
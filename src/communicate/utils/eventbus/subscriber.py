@@ -1,9 +1,32 @@
+import contextlib
 import json
 import logging
 import socket
-from communicate.utils.eventbus.base import Event
+import threading
+from communicate.utils.eventbus import profiling
+from communicate.utils.eventbus.dedup import (
+    DeduplicationStore,
+    envelope_key,
+    event_key,
+)
+from communicate.utils.eventbus.envelope import EnvelopeDecodeError, LazyEvent
+from communicate.utils.eventbus.metrics import Stats
+from communicate.utils.eventbus.retry import (
+    Backoff,
+    DeadLetterDestination,
+    RetryPolicy,
+    receive_count,
+)
+from communicate.utils.eventbus.visibility import (
+    VisibilityHeartbeat,
+    sqs_target,
+)
+from communicate.utils.eventbus.wire import (
+    JsonCodec,
+    content_type_of,
+    get_wire_codec,
+)
 from kombu import Connection, Consumer, Exchange, Queue
-from pydantic import ValidationError
 
 logger = logging.getLogger(__package__)
 
@@ -18,6 +41,9 @@ class AmazonSNSSubscriber:
     queue: any
     conn: any
     channel: any
+    metrics: Stats
+    # seconds a single poll may block, bounds how long `stop()` takes
+    poll_timeout: float = 20
 
     def __init__(
             self,
@@ -25,9 +51,37 @@ class AmazonSNSSubscriber:
             queue_name: str,
             hook: callable = None,
             region="us-east-2",
+            dedup_store: DeduplicationStore = None,
+            visibility_heartbeat: VisibilityHeartbeat = None,
+            retry_policy: RetryPolicy = None,
+            dead_letter: DeadLetterDestination = None,
+            reconnect_backoff: Backoff = None,
+            lazy_events: bool = False,
     ):
+        """
+        :param dedup_store: acknowledge redelivered duplicates
+        :param visibility_heartbeat: keep messages invisible while the hook
+            runs
+        :param retry_policy: delay of redeliveries of failed messages and
+            the receive count after which they are dead-lettered
+        :param dead_letter: destination of poison messages, they are only
+            logged and removed without it
+        :param reconnect_backoff: delays between reconnection attempts
+        :param lazy_events: pass `LazyEvent`s to the hook, decoded on access
+            and re-published from the received message; events in another
+            wire format than JSON are decoded right away
+        """
         self.region = region
         self.hook = hook
+        self.dedup_store = dedup_store
+        self.visibility_heartbeat = visibility_heartbeat
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.dead_letter = dead_letter
+        self.lazy_events = lazy_events
+        self.reconnect_backoff = reconnect_backoff or Backoff(base=1.0, cap=60.0)
+        self.metrics = Stats()
+        self._reconnect_attempt = 0
+        self._stopping = threading.Event()
         self.conn = Connection(
             connection_url,
             heartbeat=10,
@@ -46,21 +100,121 @@ class AmazonSNSSubscriber:
             accept=["text/plain"],
         )
 
+    def _is_duplicate(self, key, message) -> bool:
+        if key is None or self.dedup_store.claim(key):
+            return False
+        logger.info(f"Acknowledge duplicated message {key}")
+        message.ack()
+        return True
+
     def process_message(self, body, message):
+        with profiling.section("subscriber.process_message"):
+            self._process_message(body, message)
+
+    def _process_message(self, body, message):
+        dedup_key = None
         try:
-            msg = json.loads(body)["Message"]
-            event = Event.parse_raw(msg)
-        except (ValidationError, KeyError) as err:
-            logger.warning(f"Remove Unknown message {message} {err}")
-            message.ack()
+            envelope = json.loads(body)
+            msg = envelope["Message"]
+            if self.dedup_store is not None:
+                dedup_key = envelope_key(envelope)
+                if self._is_duplicate(dedup_key, message):
+                    return
+            codec = get_wire_codec(content_type_of(envelope))
+            if self.lazy_events and codec.name == JsonCodec.name:
+                event = LazyEvent(msg)
+            else:
+                event = codec.decode(msg)
+        except (ValueError, KeyError, TypeError) as err:
+            # ValidationError and JSONDecodeError are ValueErrors
+            if dedup_key is not None:
+                self.dedup_store.release(dedup_key)
+            self._dead_letter(body, message, f"Unknown message: {err}")
             return
 
-        dict_meta = event.metadata.dict()
+        if self.dedup_store is not None and dedup_key is None:
+            try:
+                dedup_key = event_key(event)
+            except EnvelopeDecodeError as err:
+                self._dead_letter(body, message, f"Unknown message: {err}")
+                return
+            if self._is_duplicate(dedup_key, message):
+                return
+
         trace_ctx = None
-        if callable(self.hook):
-            self.hook(event, trace_ctx=trace_ctx)
+        try:
+            if callable(self.hook):
+                with self._keep_invisible(message):
+                    self.hook(event, trace_ctx=trace_ctx)
+        except Exception as err:  # noqa, pylint: disable=broad-except
+            if dedup_key is not None:
+                self.dedup_store.release(dedup_key)
+            if isinstance(err, EnvelopeDecodeError):
+                # decoding fails the same way on every delivery
+                self._dead_letter(body, message, f"Unknown message: {err}")
+            else:
+                self._retry(body, message, err)
+            return
+        if dedup_key is not None:
+            self.dedup_store.complete(dedup_key)
+        self.metrics.incr("processed")
         message.ack()
 
+    def _retry(self, body, message, err: Exception):
+        """Redeliver a failed message later, or dead-letter it"""
+        count = receive_count(message)
+        if self.retry_policy.exhausted(count):
+            self._dead_letter(
+                body, message, f"Failed {count} times, last error: {err!r}"
+            )
+            return
+
+        target = sqs_target(message)
+        if target is None:
+            # requeue() would publish a copy on the SQS transport, the
+            # message is redelivered after the queue's visibility timeout
+            logger.exception(f"Hook failed, retry after the visibility timeout: {err}")
+            self.metrics.incr("retried")
+            message.reject(requeue=False)
+            return
+
+        delay = self.retry_policy.visibility_timeout(count)
+        logger.warning(
+            f"Hook failed (receive count {count}), retry in {delay}s: {err!r}"
+        )
+        self.metrics.incr("retried")
+        try:
+            target.client.change_message_visibility(
+                QueueUrl=target.queue_url,
+                ReceiptHandle=target.receipt_handle,
+                VisibilityTimeout=delay,
+            )
+        finally:
+            # Do not delete it from SQS, it becomes visible after the delay
+            message.reject(requeue=False)
+
+    def _dead_letter(self, body, message, reason: str):
+        if self.dead_letter is None:
+            logger.warning(f"Remove message {message}: {reason}")
+            self.metrics.incr("dropped")
+            message.ack()
+            return
+
+        try:
+            self.dead_letter.send(body, reason=reason, message=message)
+        except Exception:  # noqa, pylint: disable=broad-except
+            logger.exception(f"Dead-lettering failed, keep message {message}")
+            message.reject(requeue=False)
+            return
+        logger.warning(f"Dead-lettered message {message}: {reason}")
+        self.metrics.incr("dead_lettered")
+        message.ack()
+
+    def _keep_invisible(self, message):
+        if self.visibility_heartbeat is None:
+            return contextlib.nullcontext()
+        return self.visibility_heartbeat.tracking(sqs_target(message))
+
     def establish_connection(self):
         revived_connection = self.conn.clone()
         revived_connection.ensure_connection(max_retries=3)
@@ -71,21 +225,37 @@ class AmazonSNSSubscriber:
 
     def consume(self):
         new_conn = self.establish_connection()
-        while True:
-            self.get_one(conn=new_conn, timeout=20)
+        self._reconnect_attempt = 0
+        while not self._stopping.is_set():
+            self.get_one(conn=new_conn, timeout=self.poll_timeout)
+        new_conn.release()
 
     def get_one(self, conn=None, timeout=20):
         conn = conn or self.establish_connection()
-        try:
-            conn.drain_events(timeout=timeout)
-        except socket.timeout as err:
-            logger.warning(f"timeout: {err}")
-            conn.heartbeat_check()
+        with profiling.section("subscriber.get_one"):
+            try:
+                conn.drain_events(timeout=timeout)
+            except socket.timeout as err:
+                logger.debug(f"timeout: {err}")
+                conn.heartbeat_check()
 
     def run(self):
-        while True:
+        self._stopping.clear()
+        while not self._stopping.is_set():
             try:
                 logger.info("Starting worker:")
                 self.consume()
-            except self.conn.connection_errors:
-                logger.info("Connection revived")
+            except self.conn.connection_errors as err:
+                delay = self.reconnect_backoff.delay(self._reconnect_attempt)
+                self._reconnect_attempt += 1
+                self.metrics.incr("reconnects")
+                logger.info(f"Connection lost ({err}), reconnect in {delay:.1f}s")
+                self._stopping.wait(delay)
+        logger.info("Worker stopped")
+
+    def stop(self):
+        """Leave `run()` once the message being processed is handled"""
+        self._stopping.set()
+
+    def stats(self) -> dict:
+        return self.metrics.snapshot()
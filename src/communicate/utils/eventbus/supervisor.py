@@ -0,0 +1,319 @@
+"""Run `AmazonSNSSubscriber` in several worker processes.
+
+Each worker has its own kombu connection. Crashed workers are restarted
+with a backoff, SIGTERM/SIGINT drain every worker: the message being
+processed is finished before the worker leaves. Workers report their
+counters periodically and the supervisor logs the per-worker throughput.
+
+Usage::
+
+    eventbus-consume myapp.handlers:on_event --queue orders --processes 4
+"""
+import argparse
+import importlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from communicate.utils.eventbus import profiling
+from communicate.utils.eventbus.retry import Backoff
+
+logger = logging.getLogger(__name__)
+
+__all__ = (
+    "Supervisor",
+    "WorkerOptions",
+    "import_string",
+    "main",
+)
+
+
+def import_string(path: str):
+    """Import `package.module:attr` or `package.module.attr`"""
+    if ":" in path:
+        module_path, _, attr = path.partition(":")
+    else:
+        module_path, _, attr = path.rpartition(".")
+    if not module_path or not attr:
+        raise ImportError(f"{path} is not a dotted path")
+    module = importlib.import_module(module_path)
+    obj = module
+    for name in attr.split("."):
+        try:
+            obj = getattr(obj, name)
+        except AttributeError as err:
+            raise ImportError(f"{module_path} has no {attr}") from err
+    return obj
+
+
+class WorkerOptions(NamedTuple):
+    hook: str
+    queue: str
+    url: str = "sqs://"
+    region: str = "us-east-2"
+    poll_timeout: float = 1.0
+    report_interval: float = 10.0
+
+
+def run_worker(index: int, options: WorkerOptions, reports):
+    """Entry point of a worker process"""
+    # pylint: disable=import-outside-toplevel
+    from communicate.utils.eventbus.subscriber import AmazonSNSSubscriber
+
+    # ctrl-c reaches the whole process group, the supervisor drains us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # SIGUSR2 forwarded by the supervisor toggles profiling
+    profiling.install_signal_handler()
+    subscriber = AmazonSNSSubscriber(
+        connection_url=options.url,
+        queue_name=options.queue,
+        hook=import_string(options.hook),
+        region=options.region,
+    )
+    subscriber.poll_timeout = options.poll_timeout
+    signal.signal(signal.SIGTERM, lambda *_: subscriber.stop())
+
+    def report():
+        reports.put((index, os.getpid(), subscriber.metrics.get("processed")))
+
+    stopped = threading.Event()
+
+    def reporter():
+        while not stopped.wait(options.report_interval):
+            report()
+
+    thread = threading.Thread(target=reporter, name="reporter", daemon=True)
+    thread.start()
+    report()
+    try:
+        subscriber.run()
+    finally:
+        stopped.set()
+        report()
+
+
+class _Slot:
+    __slots__ = (
+        "index", "process", "started", "attempt", "restart_at", "restarts",
+        "processed", "rate", "reported_at",
+    )
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.started = 0.0
+        self.attempt = 0
+        self.restart_at = 0.0
+        self.restarts = 0
+        self.processed = 0
+        self.rate = 0.0
+        self.reported_at = None
+
+
+class Supervisor:
+    """Keep `processes` workers running until `stop()`.
+
+    :param options: passed to every worker
+    :param restart_backoff: delay before restarting a crashed worker,
+        grows while the worker keeps crashing within `stable_after` seconds
+    :param shutdown_timeout: how long draining workers may take before
+        they are killed
+    :param target: worker entry point, `run_worker(index, options, reports)`
+    """
+
+    def __init__(
+            self,
+            options: WorkerOptions,
+            processes: int = None,
+            restart_backoff: Backoff = None,
+            stable_after: float = 60.0,
+            shutdown_timeout: float = 30.0,
+            start_method: str = None,
+            target: Callable = run_worker,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.options = options
+        self.processes = processes or os.cpu_count() or 1
+        self.restart_backoff = restart_backoff or Backoff(base=1.0, cap=30.0)
+        self.stable_after = stable_after
+        self.shutdown_timeout = shutdown_timeout
+        self.target = target
+        self._clock = clock
+        self._context = multiprocessing.get_context(start_method)
+        self._reports = self._context.Queue()
+        self._slots: List[_Slot] = [_Slot(i) for i in range(self.processes)]
+        self._stopping = threading.Event()
+
+    def _spawn(self, slot: _Slot):
+        process = self._context.Process(
+            target=self.target,
+            args=(slot.index, self.options, self._reports),
+            name=f"eventbus-worker-{slot.index}",
+            daemon=False,
+        )
+        process.start()
+        slot.process = process
+        slot.started = self._clock()
+        logger.info(f"Started worker {slot.index} (pid {process.pid})")
+
+    def start(self):
+        for slot in self._slots:
+            self._spawn(slot)
+
+    def check(self):
+        """Restart the workers which died"""
+        now = self._clock()
+        for slot in self._slots:
+            process = slot.process
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                process.join()
+                logger.warning(
+                    f"Worker {slot.index} (pid {process.pid}) exited with "
+                    f"code {process.exitcode}"
+                )
+                if now - slot.started >= self.stable_after:
+                    slot.attempt = 0
+                slot.restart_at = now + self.restart_backoff.delay(slot.attempt)
+                slot.attempt += 1
+                slot.process = None
+            if self._stopping.is_set() or now < slot.restart_at:
+                continue
+            slot.restarts += 1
+            self._spawn(slot)
+
+    def collect(self, timeout: float = 0.0):
+        """Read the counters reported by workers"""
+        while True:
+            try:
+                index, pid, processed = self._reports.get(timeout=timeout)
+            except queue.Empty:
+                return
+            timeout = 0.0
+            slot = self._slots[index]
+            now = self._clock()
+            if slot.process is None or slot.process.pid != pid:
+                continue
+            if slot.reported_at is not None and processed >= slot.processed:
+                elapsed = now - slot.reported_at
+                if elapsed > 0:
+                    slot.rate = (processed - slot.processed) / elapsed
+            slot.processed = processed
+            slot.reported_at = now
+
+    def stats(self) -> Dict[int, dict]:
+        return {
+            slot.index: {
+                "pid": slot.process.pid if slot.process else None,
+                "alive": bool(slot.process and slot.process.is_alive()),
+                "restarts": slot.restarts,
+                "processed": slot.processed,
+                "rate": slot.rate,
+            }
+            for slot in self._slots
+        }
+
+    def _log_stats(self):
+        for index, stats in self.stats().items():
+            logger.info(
+                f"Worker {index} (pid {stats['pid']}): "
+                f"{stats['processed']} processed, {stats['rate']:.1f} msg/s"
+            )
+
+    def stop(self, *_):
+        self._stopping.set()
+
+    def forward_signal(self, signum, *_):
+        """Pass `signum` on to the workers, e.g. to toggle profiling"""
+        for slot in self._slots:
+            if slot.process is not None and slot.process.is_alive():
+                os.kill(slot.process.pid, signum)
+
+    def shutdown(self):
+        """Drain the workers, kill the ones which do not stop in time"""
+        self._stopping.set()
+        processes = [s.process for s in self._slots if s.process is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = self._clock() + self.shutdown_timeout
+        for process in processes:
+            process.join(max(deadline - self._clock(), 0))
+            if process.is_alive():
+                logger.warning(f"Killing worker pid {process.pid}")
+                process.kill()
+                process.join()
+        self.collect()
+
+    def run(self, interval: float = 0.5):
+        """Supervise workers until SIGTERM/SIGINT"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if hasattr(signal, "SIGUSR2"):
+            signal.signal(signal.SIGUSR2, self.forward_signal)
+        self.start()
+        logged_at = self._clock()
+        try:
+            while not self._stopping.is_set():
+                self.collect(timeout=interval)
+                self.check()
+                if self._clock() - logged_at >= self.options.report_interval:
+                    logged_at = self._clock()
+                    self._log_stats()
+        finally:
+            self.shutdown()
+            self._log_stats()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="eventbus-consume",
+        description="Consume SNS events from an SQS queue in N processes",
+    )
+    parser.add_argument("hook", help="dotted path of the event handler")
+    parser.add_argument("--queue", required=True, help="SQS queue name")
+    parser.add_argument(
+        "--url",
+        default=os.environ.get("EVENTBUS_BROKER_URL", "sqs://"),
+        help="kombu connection url (default: $EVENTBUS_BROKER_URL or sqs://)",
+    )
+    parser.add_argument("--region", default="us-east-2")
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="worker processes (default: number of CPUs)",
+    )
+    parser.add_argument("--poll-timeout", type=float, default=1.0)
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s %(processName)s %(levelname)s %(message)s",
+    )
+    # fail early instead of in every worker
+    import_string(args.hook)
+    options = WorkerOptions(
+        hook=args.hook,
+        queue=args.queue,
+        url=args.url,
+        region=args.region,
+        poll_timeout=args.poll_timeout,
+        report_interval=args.report_interval,
+    )
+    Supervisor(
+        options,
+        processes=args.processes,
+        shutdown_timeout=args.shutdown_timeout,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
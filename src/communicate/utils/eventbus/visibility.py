@@ -0,0 +1,206 @@
+"""Visibility timeout heartbeat for long running message handlers.
+
+While a hook runs, SQS keeps the message invisible only for the queue's
+visibility timeout. `VisibilityHeartbeat` tracks in-flight messages and
+extends their visibility (ChangeMessageVisibilityBatch, grouped per queue)
+shortly before it expires, so slow handlers do not cause redeliveries.
+"""
+import contextlib
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional
+
+from .metrics import Stats
+
+logger = logging.getLogger(__package__)
+
+# SQS does not allow a message to stay in flight longer than 12 hours
+SQS_MAX_VISIBILITY = 43200
+SQS_MAX_BATCH = 10
+
+
+class SQSTarget(NamedTuple):
+    client: Any
+    queue_url: str
+    receipt_handle: str
+
+
+def sqs_target(message) -> Optional[SQSTarget]:
+    """SQS client/queue/receipt handle of a kombu message, if any"""
+    delivery_info = getattr(message, "delivery_info", None) or {}
+    sqs_message = delivery_info.get("sqs_message")
+    queue_url = delivery_info.get("sqs_queue")
+    if not sqs_message or not queue_url:
+        return None
+    channel = message.channel
+    queue = delivery_info.get("routing_key")
+    if queue is not None:
+        queue = channel.canonical_queue_name(queue)
+    return SQSTarget(
+        channel.sqs(queue=queue), queue_url, sqs_message["ReceiptHandle"]
+    )
+
+
+class _InFlight:
+    __slots__ = ("target", "received", "deadline", "capped")
+
+    def __init__(self, target: SQSTarget, received: float, deadline: float):
+        self.target = target
+        self.received = received
+        self.deadline = deadline
+        self.capped = False
+
+
+class VisibilityHeartbeat:
+    """Background thread extending the visibility of in-flight messages.
+
+    :param visibility_timeout: visibility granted when the message was
+        received (the queue's VisibilityTimeout)
+    :param extension: visibility requested by each extension
+    :param margin: extend once less than `margin` seconds are left
+    :param max_visibility: cap of the total time a message is kept in
+        flight, counted from its reception
+    :param interval: how often the thread checks in-flight messages
+    """
+
+    def __init__(
+            self,
+            visibility_timeout: float = 30,
+            extension: float = None,
+            margin: float = None,
+            max_visibility: float = SQS_MAX_VISIBILITY,
+            interval: float = None,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.visibility_timeout = visibility_timeout
+        self.extension = extension or visibility_timeout
+        self.margin = margin if margin is not None else visibility_timeout / 3
+        self.max_visibility = max_visibility
+        self.interval = interval or max(self.margin / 2, 0.1)
+        self.metrics = Stats()
+        self._clock = clock
+        self._inflight: Dict[int, _InFlight] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, target: SQSTarget) -> int:
+        now = self._clock()
+        token = next(self._ids)
+        with self._lock:
+            self._inflight[token] = _InFlight(
+                target, now, now + self.visibility_timeout
+            )
+        self.start()
+        return token
+
+    def untrack(self, token: int):
+        with self._lock:
+            self._inflight.pop(token, None)
+
+    @contextlib.contextmanager
+    def tracking(self, target: Optional[SQSTarget]) -> Iterator[None]:
+        if target is None:
+            yield
+            return
+        token = self.track(target)
+        try:
+            yield
+        finally:
+            self.untrack(token)
+
+    def _due(self, now: float) -> list:
+        due = []
+        with self._lock:
+            for entry in self._inflight.values():
+                left = entry.deadline - now
+                if left > self.margin:
+                    continue
+                allowed = self.max_visibility - (now - entry.received)
+                timeout = int(min(self.extension, allowed))
+                if timeout < 1 or timeout <= left:
+                    if not entry.capped:
+                        entry.capped = True
+                        self.metrics.incr("capped")
+                    continue
+                due.append((entry, timeout))
+        return due
+
+    def beat(self, now: float = None):
+        """Extend every message which is about to become visible again"""
+        now = self._clock() if now is None else now
+        batches: Dict[tuple, list] = {}
+        for entry, timeout in self._due(now):
+            target = entry.target
+            key = (id(target.client), target.queue_url)
+            batches.setdefault(key, []).append((entry, timeout))
+
+        for items in batches.values():
+            for start in range(0, len(items), SQS_MAX_BATCH):
+                self._extend(items[start:start + SQS_MAX_BATCH], now)
+
+    def _extend(self, items: list, now: float):
+        target = items[0][0].target
+        entries = [
+            {
+                "Id": str(index),
+                "ReceiptHandle": entry.target.receipt_handle,
+                "VisibilityTimeout": timeout,
+            }
+            for index, (entry, timeout) in enumerate(items)
+        ]
+        try:
+            response = target.client.change_message_visibility_batch(
+                QueueUrl=target.queue_url, Entries=entries
+            )
+        except Exception as err:  # noqa, pylint: disable=broad-except
+            logger.warning(f"Visibility extension failed: {err}")
+            self.metrics.incr("failures", len(items))
+            return
+
+        failed = {item["Id"] for item in response.get("Failed", ())}
+        self.metrics.incr("batches")
+        for index, (entry, timeout) in enumerate(items):
+            if str(index) in failed:
+                self.metrics.incr("failures")
+                continue
+            entry.deadline = now + timeout
+            self.metrics.incr("extensions")
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.beat()
+            except Exception:  # noqa, pylint: disable=broad-except
+                logger.exception("Visibility heartbeat failed")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="visibility-heartbeat", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        counters = self.metrics.snapshot()["counters"]
+        return {
+            "in_flight": len(self._inflight),
+            "extensions": counters.get("extensions", 0),
+            "batches": counters.get("batches", 0),
+            "capped": counters.get("capped", 0),
+            "failures": counters.get("failures", 0),
+        }
@@ -0,0 +1,179 @@
+"""Wire formats of published events.
+
+A `WireCodec` turns an `Event` into the SNS message body and back. The
+codec of a route is chosen with the `codec` key of its `targets` config
+(or of the `AmazonSNSPublisher` config) and advertised in the `contentType`
+message attribute; subscribers pick the decoder from that attribute.
+Messages without it are JSON, so publishers and subscribers which do not
+know about codecs keep working with each other.
+
+Example route::
+
+    "orders": {
+        "route": "Orders.*",
+        "provider": "sns",
+        "topic": "arn:aws:sns:us-east-1:123456789012:orders",
+        "codec": "msgpack"
+    }
+
+MessagePack requires the `msgpack` package (`pip install
+communicate-utils-eventbus[msgpack]`). SNS messages are text, the packed
+event is sent base64 encoded.
+"""
+import abc
+import base64
+import binascii
+import threading
+from typing import Dict, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from communicate.utils.eventbus.base import Event
+from communicate.utils.eventbus.serialization import encode, get_codec
+
+__all__ = (
+    "CONTENT_TYPE_ATTRIBUTE",
+    "JsonCodec",
+    "MsgPackCodec",
+    "UnknownContentType",
+    "WireCodec",
+    "content_type_of",
+    "get_wire_codec",
+    "register_wire_codec",
+)
+
+CONTENT_TYPE_ATTRIBUTE = "contentType"
+
+
+class UnknownContentType(ValueError):
+    """No codec is registered for a content type or codec name"""
+
+
+class WireCodec(abc.ABC):
+    """Encode events as SNS message bodies and decode them back"""
+
+    # short name used in the routes config
+    name: str
+    # value of the `contentType` message attribute
+    content_type: str
+
+    @abc.abstractmethod
+    def encode(self, event: Event) -> str:
+        pass
+
+    @abc.abstractmethod
+    def decode(self, raw: Union[str, bytes], model: Type[Event] = Event) -> Event:
+        pass
+
+
+class JsonCodec(WireCodec):
+    """`event.json(by_alias=True)`, the default"""
+
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, event: Event) -> str:
+        return encode(event)
+
+    def decode(self, raw: Union[str, bytes], model: Type[Event] = Event) -> Event:
+        return get_codec(model).decode(raw)
+
+
+class MsgPackCodec(WireCodec):
+    """The aliased event dict packed with MessagePack, base64 encoded.
+
+    Values MessagePack has no type for (UUID, datetime, ...) are packed the
+    way they are written to JSON, and decoded by the same pydantic
+    validation.
+    """
+
+    name = "msgpack"
+    content_type = "application/x-msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack  # pylint: disable=import-outside-toplevel
+        except ImportError as err:
+            raise ImportError(
+                "MessagePack wire format requires the msgpack package"
+            ) from err
+        self._msgpack = msgpack
+
+    def encode(self, event: Event) -> str:
+        if not isinstance(event, BaseModel):
+            # `LazyEvent`
+            event = event.to_event()
+        model = type(event)
+        packed = self._msgpack.packb(
+            get_codec(model).to_dict(event),
+            default=model.__json_encoder__,
+            use_bin_type=True,
+        )
+        return base64.b64encode(packed).decode("ascii")
+
+    def decode(self, raw: Union[str, bytes], model: Type[Event] = Event) -> Event:
+        try:
+            data = self._msgpack.unpackb(
+                base64.b64decode(raw, validate=True),
+                raw=False,
+                strict_map_key=False,
+            )
+        except (binascii.Error, self._msgpack.UnpackException) as err:
+            raise ValueError(f"Invalid MessagePack event: {err}") from err
+        return get_codec(model).decode_obj(data)
+
+
+_codec_classes: Dict[str, Type[WireCodec]] = {}
+_codecs: Dict[str, WireCodec] = {}
+_codecs_lock = threading.Lock()
+
+
+def register_wire_codec(codec_cls: Type[WireCodec]) -> Type[WireCodec]:
+    """Make `codec_cls` available by its name and content type"""
+    with _codecs_lock:
+        for key in (codec_cls.name, codec_cls.content_type):
+            _codec_classes[key] = codec_cls
+            _codecs.pop(key, None)
+    return codec_cls
+
+
+register_wire_codec(JsonCodec)
+register_wire_codec(MsgPackCodec)
+
+
+def get_wire_codec(name: Optional[str] = None) -> WireCodec:
+    """Codec by name or content type, JSON when `name` is empty.
+
+    Raises `UnknownContentType` for unknown names and for codecs whose
+    optional dependency is not installed.
+    """
+    key = name or JsonCodec.name
+    try:
+        return _codecs[key]
+    except KeyError:
+        pass
+    with _codecs_lock:
+        try:
+            codec_cls = _codec_classes[key]
+        except KeyError:
+            raise UnknownContentType(f"Unknown wire format {key!r}") from None
+        codec = _codecs.get(key)
+        if codec is None:
+            try:
+                codec = codec_cls()
+            except ImportError as err:
+                # a message in a format this install cannot read is as
+                # undecodable as one in an unknown format
+                raise UnknownContentType(
+                    f"Wire format {key!r} is not available: {err}"
+                ) from err
+            _codecs[key] = codec
+    return codec
+
+
+def content_type_of(envelope: dict) -> Optional[str]:
+    """`contentType` attribute of a received SNS notification"""
+    attribute = envelope.get("MessageAttributes", {}).get(CONTENT_TYPE_ATTRIBUTE)
+    if attribute is None:
+        return None
+    return attribute.get("Value")
@@ -1,6 +1,8 @@
-from .case import camelize, decamelize
+from .case import camelize, camelize_keys, decamelize, decamelize_keys
 
 __all__ = [
     "camelize",
+    "camelize_keys",
     "decamelize",
+    "decamelize_keys",
 ]
@@ -1,6 +1,8 @@
-from .base import camelize, decamelize
+from .base import camelize, camelize_keys, decamelize, decamelize_keys
 
 __all__ = [
     "camelize",
+    "camelize_keys",
     "decamelize",
+    "decamelize_keys",
 ]
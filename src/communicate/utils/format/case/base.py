@@ -1,4 +1,6 @@
+import functools
 import re
+from typing import Any, Callable
 
 TO_SNAKE_RE = re.compile(
     r"((?<=[a-z0-9])[A-Z]|(?!^|(?<=[./]))[A-Z_](?=[a-z]))"
@@ -6,21 +8,28 @@ TO_SNAKE_RE = re.compile(
 EXTRA_UNDERSCORE_RE = re.compile(r"__+")
 SPLIT_RE = re.compile(r"(?=[./])|(?<=[./])")
 
+# field, class and event names form a small fixed vocabulary, the bound only
+# protects against converting arbitrary data keys
+CACHE_SIZE = 4096
+
 
 def decapitalize(word: str) -> str:
     return word[0].lower() + word[1:] if word else word
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def _camel_to_snake(word: str) -> str:
     return TO_SNAKE_RE.sub(r"_\1", word).lower()
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def _snake_to_camel(word: str) -> str:
     return word[0] + decapitalize(
         "".join([x for x in word.title()[1:] if x.isalnum()])
     )
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def camelize(string: str) -> str:
     """
     Convert string to camel case.
@@ -34,6 +43,50 @@ def camelize(string: str) -> str:
     return "".join(word.capitalize() for word in string.split("_"))
 
 
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def decamelize(word: str) -> str:
     _word = _camel_to_snake(word)
     return EXTRA_UNDERSCORE_RE.sub(r"_", _word)
+
+
+def _convert_keys(data: Any, convert: Callable[[str], str]) -> Any:
+    if isinstance(data, dict):
+        return {
+            convert(key) if isinstance(key, str) else key: _convert_keys(
+                value, convert
+            )
+            for key, value in data.items()
+        }
+    if isinstance(data, (list, tuple)):
+        return [_convert_keys(item, convert) for item in data]
+    return data
+
+
+def camelize_keys(data: Any) -> Any:
+    """
+    Camelize the keys of dicts, nested ones and ones in lists included.
+
+    Example:
+        >>> camelize_keys({"order_id": 1, "lines": [{"unit_price": 2}]})
+        {"OrderId": 1, "Lines": [{"UnitPrice": 2}]}
+    """
+    return _convert_keys(data, camelize)
+
+
+def decamelize_keys(data: Any) -> Any:
+    """
+    Decamelize the keys of dicts, nested ones and ones in lists included.
+
+    Example:
+        >>> decamelize_keys({"OrderId": 1, "Lines": [{"UnitPrice": 2}]})
+        {"order_id": 1, "lines": [{"unit_price": 2}]}
+    """
+    return _convert_keys(data, decamelize)
+
+
+def cache_info() -> dict:
+    """Hits/misses of the conversion caches"""
+    return {
+        func.__name__: func.cache_info()._asdict()
+        for func in (camelize, decamelize, _camel_to_snake, _snake_to_camel)
+    }
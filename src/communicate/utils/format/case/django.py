@@ -1,5 +1,3 @@
-import re
-from collections import OrderedDict
 from django.utils.encoding import force_str
 from django.utils.functional import Promise
 from djangorestframework_camel_case.util import (
@@ -14,27 +12,59 @@ from typing import Dict, Iterable, Type, Union
 def camelize_object(
         data: Union[Type[Promise], Dict, Iterable, str], **options
 ):
-    # Handle lazy translated strings.
+    """Camelize the keys of `data`, nested dicts and iterables included.
+
+    Walks the data with an explicit stack (deeply nested data does not hit
+    the recursion limit) and translates each distinct key once per call.
+    Values of keys listed in `ignore_fields` are copied as is.
+    """
     ignore_fields = options.get("ignore_fields") or ()
-    if isinstance(data, Promise):
-        data = force_str(data)
-    if isinstance(data, dict):
-        if isinstance(data, ReturnDict):
-            new_dict = ReturnDict(serializer=data.serializer)
-        else:
-            new_dict = OrderedDict()
-        for key, value in data.items():
-            if isinstance(key, Promise):
-                key = force_str(key)
-            if isinstance(key, str) and "_" in key:
-                new_key = re.sub(camelize_re, underscore_to_camel, key)
+    keys = {}
+    root = [None]
+    # (value, container of the converted value, key/index in the container,
+    # whether to convert the value)
+    stack = [(data, root, 0, True)]
+    while stack:
+        value, parent, slot, convert = stack.pop()
+        if not convert:
+            parent[slot] = value
+            continue
+        # Handle lazy translated strings.
+        if isinstance(value, Promise):
+            value = force_str(value)
+        if isinstance(value, dict):
+            if isinstance(value, ReturnDict):
+                new_dict = ReturnDict(serializer=value.serializer)
             else:
-                new_key = key
-            if key not in ignore_fields and new_key not in ignore_fields:
-                new_dict[new_key] = camelize_object(value, **options)
-            else:
-                new_dict[key] = value
-        return new_dict
-    if is_iterable(data) and not isinstance(data, str):
-        return [camelize_object(item, **options) for item in data]
-    return data
+                new_dict = {}
+            parent[slot] = new_dict
+            pending = []
+            for key, item in value.items():
+                if isinstance(key, Promise):
+                    key = force_str(key)
+                try:
+                    new_key = keys[key]
+                except KeyError:
+                    if isinstance(key, str) and "_" in key:
+                        new_key = camelize_re.sub(underscore_to_camel, key)
+                    else:
+                        new_key = key
+                    keys[key] = new_key
+                # reserve the position, the value is set when popped
+                if key not in ignore_fields and new_key not in ignore_fields:
+                    new_dict[new_key] = None
+                    pending.append((item, new_dict, new_key, True))
+                else:
+                    new_dict[key] = None
+                    pending.append((item, new_dict, key, False))
+            stack.extend(reversed(pending))
+        elif is_iterable(value) and not isinstance(value, str):
+            new_list = list(value)
+            parent[slot] = new_list
+            stack.extend(
+                (item, new_list, index, True)
+                for index, item in reversed(list(enumerate(new_list)))
+            )
+        else:
+            parent[slot] = value
+    return root[0]
@@ -0,0 +1,74 @@
+import django
+import pytest
+import time
+from django.conf import settings
+
+
+def pytest_configure(config):
+    if not settings.configured:
+        settings.configure(
+            DATABASES={
+                "default": {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": ":memory:",
+                }
+            },
+            # models of the tests live in tests/testapp
+            INSTALLED_APPS=["django.contrib.contenttypes", "testapp"],
+            USE_TZ=True,
+        )
+        django.setup()
+
+
+class FakeClock:
+    """Clock of the components under test, moved by setting `now`"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def wait_for():
+    """Poll `condition` until it holds, fail after `timeout` seconds"""
+
+    def wait_for(condition, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out"
+            time.sleep(0.01)
+
+    return wait_for
+
+
+@pytest.fixture
+def drain():
+    """Receive and delete every message of an SQS queue"""
+
+    def drain(sqs, queue_url) -> list:
+        received = []
+        while True:
+            messages = sqs.receive_message(
+                QueueUrl=queue_url,
+                MaxNumberOfMessages=10,
+                MessageAttributeNames=["All"],
+            ).get("Messages", [])
+            if not messages:
+                return received
+            received.extend(messages)
+            for message in messages:
+                sqs.delete_message(
+                    QueueUrl=queue_url, ReceiptHandle=message["ReceiptHandle"]
+                )
+
+    return drain
@@ -0,0 +1,124 @@
+import queue
+import time
+from unittest.mock import Mock, patch
+from uuid import UUID, uuid4
+
+from communicate.utils.eventbus import (
+    AmazonSNSPublisher,
+    EventFailPayload,
+    EventPayload,
+)
+from communicate.utils.eventbus.celery.tasks import DjangoCeleryTaskWithCallback
+from communicate.utils.eventbus.publisher.background import BackgroundPublisher
+
+
+class Parcel:
+    def __init__(self):
+        self.id = uuid4()
+        self.pk = self.id
+
+
+class ParcelSortedPayload(EventPayload):
+    id: UUID
+
+    class Config:
+        orm_mode = True
+
+
+class ParcelSortingFailedPayload(EventFailPayload):
+    pass
+
+
+class SortParcelTask(DjangoCeleryTaskWithCallback):
+    model = Parcel
+    payload_cls = ParcelSortedPayload
+    exception_payload_cls = ParcelSortingFailedPayload
+
+
+def _slow_sns_publisher(delay=0.2):
+    with patch("boto3.session.Session"):
+        publisher = AmazonSNSPublisher(
+            "Sorting", {"topic_arn": "arn:aws:sns:us-east-1:000000000000:t"}
+        )
+
+    def publish_batch(TopicArn, PublishBatchRequestEntries):
+        time.sleep(delay)
+        return {
+            "Successful": [{"Id": e["Id"]} for e in PublishBatchRequestEntries]
+        }
+
+    def publish(**kwargs):
+        time.sleep(delay)
+        return {"MessageId": "1"}
+
+    publisher.conn = Mock(
+        publish_batch=Mock(side_effect=publish_batch),
+        publish=Mock(side_effect=publish),
+    )
+    return publisher
+
+
+def test_events_are_published_in_background_batches():
+    sns = _slow_sns_publisher()
+    background = BackgroundPublisher(sns, batch_size=10, linger=0.1)
+
+    started = time.monotonic()
+    for _ in range(20):
+        assert background.publish(
+            "ParcelSorted", ParcelSortedPayload(id=uuid4())
+        ) == {"Queued": True}
+    assert time.monotonic() - started < 0.2
+
+    background.flush()
+    calls = sns.conn.publish_batch.call_args_list
+    assert sum(len(c.kwargs["PublishBatchRequestEntries"]) for c in calls) == 20
+    assert len(calls) <= 3
+    assert background.stats()["counters"]["published"] == 20
+    background.close()
+
+
+def test_full_queue_publishes_synchronously():
+    sns = _slow_sns_publisher(delay=0)
+    background = BackgroundPublisher(sns, max_queue=1)
+    full = queue.Queue(1)
+    full.put_nowait(object())
+    with patch.object(background, "_ensure_started", return_value=full):
+        background.publish("ParcelSorted", ParcelSortedPayload(id=uuid4()))
+    sns.conn.publish.assert_called_once()
+    assert background.stats()["counters"]["overflow"] == 1
+
+
+def test_task_callback_does_not_wait_for_publish():
+    task = SortParcelTask()
+    task.publisher = BackgroundPublisher(_slow_sns_publisher(delay=0.5))
+    task._instance = Parcel()
+
+    started = time.monotonic()
+    task.on_success(None, "task-id", [], {})
+    assert time.monotonic() - started < 0.5
+
+    task.publisher.flush()
+    assert task.publisher.stats()["counters"]["published"] == 1
+    assert task.metrics.get("payloads_built") == 1
+    assert task.metrics.snapshot()["timings"]["payload_seconds"]["count"] == 1
+    task.publisher.close()
+
+
+def test_fail_event_reuses_success_payload():
+    task = SortParcelTask()
+    task.publisher = Mock()
+    parcel = task._instance = Parcel()
+    task._get_success_event_payload(None)
+
+    with patch.object(
+            ParcelSortedPayload, "from_orm", wraps=ParcelSortedPayload.from_orm
+    ) as from_orm:
+        task.on_failure(ValueError("jammed"), "task-id", [], {}, None)
+    from_orm.assert_not_called()
+
+    name, payload = task.publisher.publish.call_args.args
+    assert isinstance(payload, ParcelSortingFailedPayload)
+    assert payload.data["id"] == parcel.id
+    assert task.metrics.get("payloads_built") == 1
+    # the cached payload does not leak into the next run
+    assert task._success_payload is None
@@ -0,0 +1,210 @@
+import pytest
+from unittest.mock import Mock, patch
+from uuid import UUID, uuid4
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from communicate.utils.eventbus import (
+    AmazonSNSPublisher,
+    EventFailPayload,
+    EventPayload,
+)
+from communicate.utils.eventbus.celery.tasks import (
+    DjangoBatchCeleryTaskWithCallback,
+)
+from communicate.utils.eventbus.publisher.background import (
+    BackgroundPublisher,
+)
+from testapp.models import Voucher
+
+
+class VoucherRedeemedPayload(EventPayload):
+    id: UUID
+    code: str
+
+    class Config:
+        orm_mode = True
+
+
+class VoucherRedemptionFailedPayload(EventFailPayload):
+    pass
+
+
+class RedeemVoucherTask(DjangoBatchCeleryTaskWithCallback):
+    model = Voucher
+    payload_cls = VoucherRedeemedPayload
+    exception_payload_cls = VoucherRedemptionFailedPayload
+    delete_on_success = True
+    unlucky = None
+
+    def run(self, voucher):
+        voucher.redeemed = True
+        voucher.save(update_fields=["redeemed"])
+        if voucher.code == self.unlucky:
+            raise ValueError("unlucky voucher")
+
+
+@pytest.fixture
+def vouchers():
+    with connection.schema_editor() as editor:
+        editor.create_model(Voucher)
+    yield [
+        voucher.id for voucher in Voucher.objects.bulk_create(
+            Voucher(code=f"V{index}") for index in range(20)
+        )
+    ]
+    with connection.schema_editor() as editor:
+        editor.delete_model(Voucher)
+
+
+def _sns_publisher():
+    with patch("boto3.session.Session"):
+        publisher = AmazonSNSPublisher(
+            "Vouchers", {"topic_arn": "arn:aws:sns:us-east-1:000000000000:t"}
+        )
+    publisher.conn = Mock()
+    publisher.conn.publish_batch.side_effect = lambda **kw: {
+        "Successful": [{"Id": e["Id"]} for e in kw["PublishBatchRequestEntries"]]
+    }
+    return publisher
+
+
+def test_batch_loads_and_deletes_with_constant_queries(vouchers):
+    task = RedeemVoucherTask()
+    task.publisher = _sns_publisher()
+
+    with CaptureQueriesContext(connection) as queries:
+        result = task.run_batch([str(i) for i in vouchers])
+
+    assert result == {
+        "succeeded": [str(i) for i in vouchers], "failed": {}, "unpublished": 0,
+    }
+    sql = [q["sql"] for q in queries.captured_queries]
+    # one projected in_bulk select and one delete, the rest are the updates
+    # of the task function
+    (select,) = [q for q in sql if q.startswith("SELECT")]
+    assert "terms" not in select
+    assert len([q for q in sql if q.startswith("DELETE")]) == 1
+    assert not Voucher.objects.exists()
+    entries = [
+        entry
+        for call in task.publisher.conn.publish_batch.call_args_list
+        for entry in call.kwargs["PublishBatchRequestEntries"]
+    ]
+    assert len(entries) == 20
+    assert task.publisher.conn.publish_batch.call_count == 2
+    task.publisher.conn.publish.assert_not_called()
+
+
+def test_failing_instance_is_rolled_back_and_isolated(vouchers):
+    task = RedeemVoucherTask()
+    task.unlucky = "V13"
+    task.publisher = Mock(spec=["publish"])
+    missing = uuid4()
+
+    result = task.run_batch([*vouchers, missing])
+
+    unlucky = Voucher.objects.get(code="V13")
+    assert result["failed"] == {
+        unlucky.id: "unlucky voucher",
+        missing: f"Voucher {missing} does not exist",
+    }
+    assert len(result["succeeded"]) == 19
+    assert unlucky.redeemed is False
+    assert list(Voucher.objects.all()) == [unlucky]
+
+    payloads = [c.args[1] for c in task.publisher.publish.call_args_list]
+    failed = [p for p in payloads if isinstance(p, VoucherRedemptionFailedPayload)]
+    assert len(payloads) == 21
+    assert [p.data["id"] for p in failed] == [unlucky.id, missing]
+    assert task._instance is None
+
+
+def test_failed_publishes_are_retried_and_reported(vouchers, caplog):
+    task = RedeemVoucherTask()
+    task.publish_retry_delay = 0
+    task.publisher = _sns_publisher()
+    responses = iter([
+        # V1 throttled once, V2 rejected as invalid
+        {
+            "Successful": [{"Id": str(i)} for i in range(10) if i not in (1, 2)],
+            "Failed": [
+                {"Id": "1", "Code": "Throttled", "SenderFault": False},
+                {"Id": "2", "Code": "InvalidParameter", "SenderFault": True},
+            ],
+        },
+        {"Successful": [{"Id": "0"}], "Failed": []},
+    ])
+    task.publisher.conn.publish_batch.side_effect = (
+        lambda **kw: next(responses)
+    )
+
+    with caplog.at_level("ERROR", logger="celery"):
+        result = task.run_batch(vouchers[:10])
+
+    assert len(result["succeeded"]) == 10
+    assert result["unpublished"] == 1
+    retried = task.publisher.conn.publish_batch.call_args_list[1]
+    (entry,) = retried.kwargs["PublishBatchRequestEntries"]
+    assert '"V1"' in entry["Message"]
+    assert "Throttled" in caplog.text and "InvalidParameter" in caplog.text
+    assert task.metrics.get("publish_retries") == 1
+
+
+def test_raised_publish_errors_are_retried_and_counted(vouchers):
+    task = RedeemVoucherTask()
+    task.publish_retry_delay = 0
+    task.publisher = _sns_publisher()
+    publish_batch = task.publisher.conn.publish_batch.side_effect
+    errors = [ConnectionError("reset by peer")]
+
+    def flaky_publish_batch(**kwargs):
+        if errors:
+            raise errors.pop()
+        return publish_batch(**kwargs)
+
+    task.publisher.conn.publish_batch.side_effect = flaky_publish_batch
+
+    result = task.run_batch(vouchers[:3])
+    assert result["unpublished"] == 0
+    # the instances were deleted even though the first publish raised
+    assert not Voucher.objects.filter(id__in=vouchers[:3]).exists()
+
+    task.publisher.conn.publish_batch.side_effect = ConnectionError("down")
+    result = task.run_batch(vouchers[3:6])
+    assert len(result["succeeded"]) == 3
+    assert result["unpublished"] == 3
+    assert task.publisher.conn.publish_batch.call_count == 2 + 4
+
+
+def test_events_published_one_by_one_are_counted(vouchers):
+    task = RedeemVoucherTask()
+    task.publisher = Mock(spec=["publish"])
+    task.publisher.publish.side_effect = [None, ConnectionError("down"), None]
+
+    result = task.run_batch(vouchers[:3])
+    assert result["unpublished"] == 1
+    assert task.publisher.publish.call_count == 3
+
+
+def test_batch_through_background_publisher(vouchers):
+    task = RedeemVoucherTask()
+    sns = _sns_publisher()
+    task.publisher = BackgroundPublisher(sns, batch_size=10)
+
+    task.run_batch(vouchers[:5])
+    task.publisher.flush()
+
+    assert task.publisher.stats()["counters"]["published"] == 5
+    task.publisher.close()
+
+
+def test_delay_in_batches():
+    task = RedeemVoucherTask()
+    task.batch_size = 4
+    with patch.object(RedeemVoucherTask, "delay") as delay:
+        task.delay_in_batches(range(10))
+    assert [c.args[0] for c in delay.call_args_list] == [
+        [0, 1, 2, 3], [4, 5, 6, 7], [8, 9],
+    ]
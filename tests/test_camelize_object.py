@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("rest_framework")
+pytest.importorskip("djangorestframework_camel_case")
+
+from django.utils.functional import lazy  # noqa: E402
+from rest_framework.utils.serializer_helpers import ReturnDict  # noqa: E402
+
+from communicate.utils.format.case.django import camelize_object  # noqa: E402
+
+
+def test_nested_keys_are_camelized():
+    lazy_str = lazy(lambda: "line_items", str)()
+    data = {
+        "order_id": 1,
+        lazy_str: ({"unit_price": 2}, "sku_code"),
+        "raw_data": {"keep_me": 1},
+        3: None,
+    }
+    converted = camelize_object(data, ignore_fields=("rawData",))
+    assert converted == {
+        "orderId": 1,
+        "lineItems": [{"unitPrice": 2}, "sku_code"],
+        "raw_data": {"keep_me": 1},
+        3: None,
+    }
+    assert type(converted) is dict
+    assert list(converted) == ["orderId", "lineItems", "raw_data", 3]
+
+
+def test_return_dict_keeps_serializer():
+    data = ReturnDict({"first_name": "a"}, serializer="serializer")
+    converted = camelize_object(data)
+    assert isinstance(converted, ReturnDict)
+    assert converted.serializer == "serializer"
+    assert converted == {"firstName": "a"}
+
+
+def test_colliding_keys_keep_the_last_value():
+    assert camelize_object({"a_b": 1, "aB": 2}) == {"aB": 2}
+    # ignored through its camelized name, the key is kept as is
+    assert camelize_object({"a_b": 1, "aB": 2}, ignore_fields=("aB",)) == {
+        "a_b": 1, "aB": 2
+    }
+
+
+def test_deep_data_does_not_hit_the_recursion_limit():
+    data = {"leaf": 1}
+    for _ in range(5000):
+        data = {"child_node": data}
+    converted = camelize_object(data)
+    for _ in range(5000):
+        converted = converted["childNode"]
+    assert converted == {"leaf": 1}
@@ -0,0 +1,33 @@
+from communicate.utils.format import (
+    camelize,
+    camelize_keys,
+    decamelize,
+    decamelize_keys,
+)
+from communicate.utils.format.case.base import cache_info
+
+
+def test_conversions_are_cached():
+    assert camelize("order_placed_payload") == "OrderPlacedPayload"
+    hits = cache_info()["camelize"]["hits"]
+    assert camelize("order_placed_payload") == "OrderPlacedPayload"
+    assert cache_info()["camelize"]["hits"] == hits + 1
+    assert decamelize("OrderPlaced__Payload") == "order_placed_payload"
+    assert decamelize("OrderPlaced__Payload") == "order_placed_payload"
+
+
+def test_bulk_key_conversion():
+    data = {
+        "order_id": 1,
+        "customer": {"billing_address": "x"},
+        "line_items": [{"unit_price": 2}, "sku"],
+        3: "three",
+    }
+    camelized = camelize_keys(data)
+    assert camelized == {
+        "OrderId": 1,
+        "Customer": {"BillingAddress": "x"},
+        "LineItems": [{"UnitPrice": 2}, "sku"],
+        3: "three",
+    }
+    assert decamelize_keys(camelized) == data
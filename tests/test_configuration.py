@@ -0,0 +1,93 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from communicate.utils.eventbus.configuration import (
+    ConfigBuilder,
+    ConfigInjector,
+    InterpolationCycleError,
+)
+
+
+@pytest.fixture
+def builder():
+    builder = ConfigBuilder()
+    yield builder
+    for key in ("cfgTest", "cfgCycle"):
+        builder.config.pop(key, None)
+    builder.invalidate()
+
+
+def test_read_value_cache_is_invalidated_on_mutation(builder):
+    builder.add_in_memory_collection({"cfgTest": {"a": {"b": 1}}})
+    assert builder.read_value("cfgTest.a.b") == 1
+
+    builder.add_in_memory_collection({"cfgTest": {"a": {"b": 2}}})
+    assert builder.read_value("cfgTest.a.b") == 2
+    assert builder.read_value("cfgTest.a.missing", default=3) == 3
+    assert builder.read_value("cfgTest.a.b.deeper", default=4) == 4
+
+
+def test_read_value_lookup_prefixes(builder):
+    builder.add_in_memory_collection(
+        {"cfgTest": {"region": "eu", "profile": {"region": "us"}}}
+    )
+    assert (
+        builder.read_value("region", lookup_prefixes=["cfgTest.profile"])
+        == "us"
+    )
+    assert (
+        builder.read_value("region", lookup_prefixes=["cfgTest.none", "cfgTest"])
+        == "eu"
+    )
+
+
+def test_interpolation_is_applied_to_merged_subtrees(builder):
+    builder.add_in_memory_collection(
+        {
+            "cfgTest": {
+                "host": "localhost",
+                "url": "http://{{ cfgTest.host }}:{{cfgTest.port}}",
+                "alias": "{{cfgTest.url}}",
+                "port": 4566,
+            }
+        }
+    )
+    assert builder.read_value("cfgTest.url") == "http://localhost:4566"
+    assert builder.read_value("cfgTest.alias") == "http://localhost:4566"
+
+    builder.add_in_memory_collection({"cfgTest": {"copy": "{{cfgTest.port}}"}})
+    assert builder.read_value("cfgTest.copy") == 4566
+
+
+def test_interpolation_cycle_is_detected(builder):
+    with pytest.raises(InterpolationCycleError):
+        builder.add_in_memory_collection(
+            {"cfgCycle": {"a": "{{cfgCycle.b}}", "b": "{{cfgCycle.a}}"}}
+        )
+
+
+def test_frozen_snapshot(builder):
+    builder.add_in_memory_collection({"cfgTest": {"items": [1, 2], "x": 1}})
+    snapshot = builder.freeze()
+    builder.add_in_memory_collection({"cfgTest": {"x": 2}})
+
+    assert snapshot.read_value("cfgTest.x") == 1
+    assert snapshot.read_value("cfgTest.items") == (1, 2)
+    assert snapshot.read_value("x", lookup_prefixes=["cfgTest"]) == 1
+    assert snapshot.read_value("cfgTest__x", delimiter="__") == 1
+    assert snapshot.read_value("cfgTest.nope", default="d") == "d"
+    with pytest.raises(TypeError):
+        snapshot.config["cfgTest"]["x"] = 3
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        values = set(
+            pool.map(lambda _: snapshot.read_value("cfgTest.x"), range(1000))
+        )
+    assert values == {1}
+
+
+def test_injector_reads_the_bootstrapped_builder():
+    injector = ConfigInjector()
+    injector.setup_configuration()
+    assert injector.config is ConfigBuilder.instance.config
+    assert "allEventsTarget" in injector.config["eventBus"]["publisher"]["targets"]
@@ -0,0 +1,159 @@
+import json
+import pytest
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+from communicate.utils.eventbus import AmazonSNSSubscriber, Event, EventPayload
+from communicate.utils.eventbus.celery.consumers import SQSConsumer
+from communicate.utils.eventbus.dedup import (
+    MemoryDeduplicationStore,
+    SQLiteDeduplicationStore,
+)
+from communicate.utils.eventbus.wire import get_wire_codec
+
+
+class ParcelShippedPayload(EventPayload):
+    id: str
+
+
+def _notification(message_id=None):
+    event = Event.create("ParcelShipped", "shop", ParcelShippedPayload(id="1"))
+    envelope = {"Message": event.json(by_alias=True)}
+    if message_id:
+        envelope["MessageId"] = message_id
+    return json.dumps(envelope)
+
+
+def test_memory_store_ttl_and_size(clock):
+    store = MemoryDeduplicationStore(max_size=2, ttl=10, lease=5, clock=clock)
+
+    assert store.claim("a")
+    assert not store.claim("a")
+    clock.now += 6
+    # the lease expired, e.g. the worker was killed during the handler
+    assert store.claim("a")
+    store.complete("a")
+    clock.now += 9
+    assert not store.claim("a")
+    clock.now += 2
+    assert store.claim("a")
+
+    assert store.claim("b")
+    assert store.claim("c")
+    assert len(store) == 2
+    assert store.claim("a")  # evicted as the oldest claim
+
+    store.release("c")
+    assert store.claim("c")
+    stats = store.stats()
+    assert stats["hits"] == 2
+    assert stats["hit_rate"] == pytest.approx(2 / 9)
+    assert stats["memory_bytes"] > 0
+
+
+def test_sqlite_store_is_shared(tmp_path, clock):
+    path = str(tmp_path / "dedup.sqlite")
+    worker_1 = SQLiteDeduplicationStore(path, ttl=10, clock=clock)
+    worker_2 = SQLiteDeduplicationStore(path, ttl=10, clock=clock)
+
+    assert worker_1.claim("msg")
+    assert not worker_2.claim("msg")
+    worker_1.complete("msg")
+    clock.now += 11
+    assert worker_2.claim("msg")
+    worker_2.release("msg")
+    assert worker_1.claim("msg")
+    assert worker_1.stats()["size"] == 1
+    assert worker_2.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("message_id", ["sns-message-id", None])
+def test_subscriber_acks_duplicates(message_id):
+    hook = Mock()
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://",
+        queue_name="test_queue",
+        hook=hook,
+        dedup_store=MemoryDeduplicationStore(),
+    )
+    body = _notification(message_id)
+    first, second = Mock(), Mock()
+
+    subscriber.process_message(body, first)
+    with patch(
+            "communicate.utils.eventbus.subscriber.get_wire_codec",
+            wraps=get_wire_codec,
+    ) as codec:
+        subscriber.process_message(body, second)
+    # SNS duplicates are detected from the envelope, the event is not decoded
+    assert codec.called is (message_id is None)
+
+    hook.assert_called_once()
+    first.ack.assert_called_once()
+    second.ack.assert_called_once()
+    assert subscriber.dedup_store.stats()["hits"] == 1
+
+
+def test_subscriber_releases_key_on_hook_failure():
+    hook = Mock(side_effect=[RuntimeError("db down"), None])
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://",
+        queue_name="test_queue",
+        hook=hook,
+        dedup_store=MemoryDeduplicationStore(),
+    )
+    body = _notification(str(uuid4()))
+    failed = Mock(delivery_info={})
+    subscriber.process_message(body, failed)
+    failed.reject.assert_called_once_with(requeue=False)
+    failed.requeue.assert_not_called()
+    subscriber.process_message(body, Mock())
+    assert hook.call_count == 2
+
+
+def test_subscriber_processes_redelivery_after_lease_expired(clock):
+    hook = Mock()
+    store = MemoryDeduplicationStore(lease=20, clock=clock)
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://",
+        queue_name="test_queue",
+        hook=hook,
+        dedup_store=store,
+    )
+    message_id = str(uuid4())
+    # a worker claimed the message and was killed before completing it
+    assert store.claim(f"sns:{message_id}")
+
+    clock.now += 30  # redelivered after the visibility timeout
+    subscriber.process_message(_notification(message_id), Mock())
+    hook.assert_called_once()
+    # processed now, later copies are duplicates
+    subscriber.process_message(_notification(message_id), Mock())
+    hook.assert_called_once()
+
+
+def test_celery_consumer_releases_rejected_tasks():
+    store = MemoryDeduplicationStore()
+    strategy = Mock()
+    consumer = Mock(
+        dedup_store=store,
+        strategies={"ParcelShipped": strategy},
+        call_soon=lambda func, *args: func(*args),
+    )
+    on_task_received = SQSConsumer.create_task_handler(consumer)
+    body = _notification(str(uuid4()))
+
+    on_task_received(Mock(decode=Mock(return_value=body)))
+    on_reject = strategy.call_args.args[3]
+    on_reject()  # the task failed
+
+    redelivered = Mock(decode=Mock(return_value=body))
+    on_task_received(redelivered)
+    assert strategy.call_count == 2
+    strategy.call_args.args[2]()  # the retry succeeded
+    redelivered.ack_log_error.assert_called_once_with()
+
+    duplicate = Mock(decode=Mock(return_value=body))
+    on_task_received(duplicate)
+    assert strategy.call_count == 2
+    duplicate.ack.assert_called_once_with()
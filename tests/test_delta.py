@@ -0,0 +1,121 @@
+import pytest
+from unittest.mock import Mock
+from uuid import UUID
+
+from django.db import connection
+
+from communicate.utils.eventbus import (
+    Event,
+    EventDeltaPayload,
+    EventFailPayload,
+    EventPayload,
+)
+from communicate.utils.eventbus.celery.tasks import (
+    DjangoCeleryTaskWithCallback,
+)
+from testapp.models import Account
+
+
+class AccountUpdatedPayload(EventPayload):
+    id: UUID
+    email: str
+    plan: str
+    bio: str
+    billing_cycle: str
+
+    class Config:
+        orm_mode = True
+
+
+class AccountChangedPayload(EventDeltaPayload):
+    pass
+
+
+class AccountUpdateFailedPayload(EventFailPayload):
+    pass
+
+
+class UpgradeAccountTask(DjangoCeleryTaskWithCallback):
+    model = Account
+    payload_cls = AccountUpdatedPayload
+    exception_payload_cls = AccountUpdateFailedPayload
+    delta_payload_cls = AccountChangedPayload
+    version_field = "version"
+
+
+@pytest.fixture
+def account():
+    with connection.schema_editor() as editor:
+        editor.create_model(Account)
+    yield Account.objects.create(email="a@example.com", plan="free")
+    with connection.schema_editor() as editor:
+        editor.delete_model(Account)
+
+
+def _upgrade(task, account_id):
+    account = task.get_instance(id=account_id)
+    account.plan = "pro"
+    account.billing_cycle = "yearly"
+    account.version += 1
+    account.save()
+
+
+def test_delta_event_carries_changed_fields(account):
+    task = UpgradeAccountTask()
+    task.publisher = Mock()
+    _upgrade(task, account.id)
+    task.on_success(None, "task-id", [], {})
+
+    name, payload = task.publisher.publish.call_args.args
+    assert name == AccountChangedPayload.get_event_name()
+    assert payload == AccountChangedPayload(
+        id=account.id,
+        version=2,
+        changes={"Plan": "pro", "BillingCycle": "yearly"},
+        complete=False,
+    )
+    full = Event.create(
+        "AccountUpdated", publisher_name="Accounts",
+        payload=AccountUpdatedPayload.from_orm(Account.objects.get()),
+    )
+    delta = Event.create("AccountChanged", publisher_name="Accounts", payload=payload)
+    assert len(delta.json()) * 5 < len(full.json())
+    assert task._snapshot is None
+
+
+def test_delta_without_snapshot_is_complete(account):
+    task = UpgradeAccountTask()
+    task.publisher = Mock()
+    task._instance = account
+
+    payload = task.get_event_payload()
+    assert payload.complete is True
+    assert set(payload.changes) == {"Id", "Email", "Plan", "Bio", "BillingCycle"}
+
+
+def test_failure_still_sends_fail_event(account):
+    task = UpgradeAccountTask()
+    task.publisher = Mock()
+    task.get_instance(id=account.id)
+    task.on_failure(ValueError("declined"), "task-id", [], {}, None)
+
+    _, payload = task.publisher.publish.call_args.args
+    assert isinstance(payload, AccountUpdateFailedPayload)
+    assert payload.data["id"] == account.id
+
+
+def test_failed_publish_does_not_leak_into_the_next_run(account):
+    other = Account.objects.create(email="b@example.com", plan="free")
+    task = UpgradeAccountTask()
+    task.publisher = Mock()
+    task.publisher.publish.side_effect = ConnectionError("SNS unavailable")
+    _upgrade(task, account.id)
+    with pytest.raises(ConnectionError):
+        task.on_success(None, "task-1", [], {})
+    assert task._success_payload is None and task._instance is None
+
+    task.publisher.publish.side_effect = None
+    _upgrade(task, other.id)
+    task.on_success(None, "task-2", [], {})
+    _, payload = task.publisher.publish.call_args.args
+    assert payload.id == other.id
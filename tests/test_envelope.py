@@ -0,0 +1,116 @@
+import json
+import pytest
+import tracemalloc
+from unittest.mock import Mock, patch
+
+from communicate.utils.eventbus import (
+    AmazonSNSPublisher,
+    AmazonSNSSubscriber,
+    Event,
+    EventPayload,
+)
+from communicate.utils.eventbus import envelope
+from communicate.utils.eventbus.envelope import EnvelopeDecodeError, LazyEvent
+
+
+class StockMovedPayload(EventPayload):
+    id: str
+    items: list
+
+
+def _message(items=100) -> str:
+    event = Event.create(
+        "StockMoved",
+        "warehouse",
+        StockMovedPayload(id="1", items=[{"sku": f"s{i}"} for i in range(items)]),
+    )
+    event.metadata.add_routing_key("region", "eu")
+    return event.json(by_alias=True)
+
+
+def _publisher():
+    with patch("boto3.session.Session"):
+        publisher = AmazonSNSPublisher(
+            "Relay", {"topic_arn": "arn:aws:sns:us-east-1:000000000000:t"}
+        )
+    publisher.conn = Mock()
+    return publisher
+
+
+def test_metadata_is_decoded_without_payload():
+    raw = _message()
+    event = LazyEvent(raw)
+    assert event.metadata.event_name == "StockMoved"
+    assert event._payload is envelope._UNSET
+    assert event.routing_keys == Event.parse_raw(raw).routing_keys
+    assert event.payload == Event.parse_raw(raw).payload
+    assert event.to_event() == Event.parse_raw(raw)
+
+
+def test_unmodified_event_is_republished_verbatim():
+    raw = _message()
+    publisher = _publisher()
+    event = LazyEvent(raw)
+    event.payload  # read only
+
+    publisher.publish_event(event)
+    sent = publisher.conn.publish.call_args.kwargs
+    assert sent["Message"] is raw
+    assert sent["MessageAttributes"]["eventName"] == {
+        "DataType": "String", "StringValue": "StockMoved"
+    }
+
+
+def test_modified_event_is_encoded_again():
+    publisher = _publisher()
+    event = LazyEvent(_message())
+    event.payload["id"] = "2"
+    event.metadata.publisher_name = "relay"
+
+    publisher.publish_event(event)
+    sent = Event.parse_raw(publisher.conn.publish.call_args.kwargs["Message"])
+    assert sent.payload["id"] == "2"
+    assert sent.metadata.publisher_name == "relay"
+
+
+def test_subscriber_passes_lazy_events_and_dead_letters_bad_ones():
+    hook = Mock(side_effect=lambda event, trace_ctx: event.metadata)
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://",
+        queue_name="test_queue",
+        hook=hook,
+        lazy_events=True,
+    )
+    message = Mock()
+    subscriber.process_message(json.dumps({"Message": _message()}), message)
+    assert isinstance(hook.call_args.args[0], LazyEvent)
+    message.ack.assert_called_once()
+
+    message = Mock()
+    subscriber.process_message(json.dumps({"Message": "{}"}), message)
+    assert isinstance(hook.call_args.args[0], LazyEvent)
+    assert subscriber.stats()["counters"]["dropped"] == 1
+    message.requeue.assert_not_called()
+
+
+def test_invalid_message_raises_on_access():
+    event = LazyEvent("not json")
+    with pytest.raises(EnvelopeDecodeError):
+        event.metadata
+
+
+def _retained(factory, raws) -> int:
+    tracemalloc.start()
+    events = [factory(raw) for raw in raws]
+    for event in events:
+        event.metadata
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+def test_lazy_events_retain_less_memory():
+    raws = [_message() for _ in range(100)]
+    eager = _retained(Event.parse_raw, raws)
+    lazy = _retained(LazyEvent, raws)
+    assert lazy * 2 < eager
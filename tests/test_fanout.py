@@ -0,0 +1,159 @@
+import concurrent.futures
+import pytest
+import threading
+import time
+
+from communicate.utils.eventbus import Event, EventPayload
+from communicate.utils.eventbus.exceptions import FanOutError
+from communicate.utils.eventbus.publisher import PublisherWithRouting
+from communicate.utils.eventbus.publisher.fanout import FanOutProvider
+from communicate.utils.eventbus.publisher.providers import Provider
+from communicate.utils.eventbus.publisher.routing import Router
+
+
+class ParcelSentPayload(EventPayload):
+    id: str
+
+
+class SlowProvider(Provider):
+    def __init__(self, *args, delay: float = 0.0, fail: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.fail = fail
+
+    def publish(self, event) -> dict:
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(self.topic)
+        return {"MessageId": self.topic}
+
+
+def _config(ack: str, *targets: dict) -> dict:
+    return {
+        "awsAuth": {"profiles": {"default": {"accountId": "1"}}},
+        "eventBus": {
+            "publisher": {
+                "targets": {
+                    "parcels": {
+                        "route": "Parcels.*",
+                        "ack": ack,
+                        "targets": [
+                            {"provider": "slow", **target} for target in targets
+                        ],
+                    }
+                }
+            }
+        },
+    }
+
+
+@pytest.fixture
+def router():
+    router = Router()
+    snapshot = router.snapshot
+    router.providers["slow"] = SlowProvider
+    yield router
+    router.providers.pop("slow")
+    router._snapshot = snapshot
+
+
+def _publish(router) -> dict:
+    publisher = PublisherWithRouting(router=router, name="Parcels")
+    return publisher.publish("ParcelSent", ParcelSentPayload(id="1"))
+
+
+def test_targets_are_published_concurrently(router):
+    router.reload(_config(
+        "all",
+        {"name": "sns", "topic": "a", "delay": 0.2},
+        {"name": "archive", "topic": "b", "delay": 0.2},
+        {"name": "eu", "topic": "c", "delay": 0.2},
+    ))
+    started = time.monotonic()
+    assert _publish(router) == {"MessageId": "a"}
+    assert time.monotonic() - started < 0.5
+
+    provider = router.resolve("Parcels", "ParcelSent")
+    assert isinstance(provider, FanOutProvider)
+    timings = provider.stats()["timings"]
+    assert {name: timing["count"] for name, timing in timings.items()} == {
+        "sns.latency_seconds": 1,
+        "archive.latency_seconds": 1,
+        "eu.latency_seconds": 1,
+    }
+
+
+def test_ack_all_reports_failed_targets(router):
+    router.reload(_config(
+        "all", {"name": "sns", "topic": "a"}, {"topic": "b", "fail": True}
+    ))
+    with pytest.raises(FanOutError) as error:
+        _publish(router)
+    assert list(error.value.errors) == ["1:slow"]
+    counters = router.resolve("Parcels", "ParcelSent").stats()["counters"]
+    assert counters == {"published": 1, "1:slow.errors": 1}
+
+
+def test_ack_any_returns_on_first_success(router):
+    router.reload(_config(
+        "any",
+        {"topic": "a", "fail": True},
+        {"topic": "b", "delay": 0.01},
+        {"topic": "c", "delay": 0.5},
+    ))
+    started = time.monotonic()
+    assert _publish(router) == {"MessageId": "b"}
+    assert time.monotonic() - started < 0.4
+
+    router.reload(_config("any", {"topic": "a", "fail": True}))
+    with pytest.raises(FanOutError):
+        _publish(router)
+
+
+def test_ack_primary_ignores_other_targets(router):
+    router.reload(_config(
+        "primary", {"topic": "a"}, {"topic": "b", "fail": True}
+    ))
+    assert _publish(router) == {"MessageId": "a"}
+
+    router.reload(_config(
+        "primary", {"topic": "a", "fail": True}, {"topic": "b"}
+    ))
+    with pytest.raises(FanOutError) as error:
+        _publish(router)
+    assert isinstance(error.value.__cause__, ConnectionError)
+
+
+def test_single_event_hooks_run_once(router):
+    router.reload(_config("all", {"topic": "a"}, {"topic": "b"}))
+    seen = []
+
+    def hook(event):
+        seen.append(event)
+        return event
+
+    Provider.hook.register_pre("ParcelSent", hook)
+    try:
+        _publish(router)
+    finally:
+        Provider.hook.unregister("ParcelSent", hook)
+    assert len(seen) == 1 and isinstance(seen[0], Event)
+
+
+def test_nested_fan_out_does_not_wait_for_the_executor():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    inner = FanOutProvider(
+        [SlowProvider(topic="b"), SlowProvider(topic="c")], executor=executor
+    )
+    outer = FanOutProvider([inner, SlowProvider(topic="a")], executor=executor)
+    event = Event.create("ParcelSent", "Parcels", ParcelSentPayload(id="1"))
+    publishing = threading.Thread(
+        target=outer.publish, args=(event,), daemon=True
+    )
+    publishing.start()
+    # the only executor thread runs `inner`, its targets run inline
+    publishing.join(timeout=5)
+    executor.shutdown(wait=False)
+    assert not publishing.is_alive()
+    assert inner.stats()["counters"] == {"published": 1}
+    assert outer.stats()["counters"] == {"published": 1}
@@ -0,0 +1,110 @@
+import pytest
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from communicate.utils.eventbus import Event, EventPayload
+from communicate.utils.eventbus.publisher.hedge import Hedger, deduplication_id
+from communicate.utils.eventbus.publisher.providers import ProviderSNS
+
+
+class InvoiceIssuedPayload(EventPayload):
+    id: str
+
+
+def _slow_first(delay: float = 0.5):
+    """Callable whose first call hangs on a slow connection"""
+    calls = []
+    lock = threading.Lock()
+
+    def call(*args, **kwargs):
+        with lock:
+            calls.append(kwargs)
+            index = len(calls)
+        if index == 1:
+            time.sleep(delay)
+        return {"MessageId": str(index)}
+
+    return call, calls
+
+
+def test_slow_attempt_is_hedged():
+    call, calls = _slow_first(0.2)
+    hedger = Hedger(initial_delay=0.02)
+    assert hedger.call(call) == {"MessageId": "2"}
+    assert len(calls) == 2
+
+    stats = hedger.stats()
+    assert stats["counters"] == {"calls": 1, "hedged": 1, "hedge_wins": 1}
+    assert stats["extra_requests"] == 1.0
+
+
+def test_first_attempt_runs_on_the_caller_thread():
+    threads = []
+
+    def call():
+        threads.append(threading.current_thread())
+        time.sleep(0.1 if len(threads) == 1 else 0)
+        return len(threads)
+
+    hedger = Hedger(initial_delay=0.02)
+    hedger.call(call)
+    assert threads[0] is threading.current_thread()
+    assert threads[1] is not threading.current_thread()
+
+
+def test_hedge_covers_a_failed_first_attempt():
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.1)
+            raise TimeoutError("stuck connection")
+        return {"MessageId": "2"}
+
+    hedger = Hedger(initial_delay=0.02)
+    started = time.monotonic()
+    assert hedger.call(call) == {"MessageId": "2"}
+    # the hedge was sent long before the first attempt timed out
+    assert time.monotonic() - started < 0.2
+    assert hedger.stats()["counters"]["hedge_wins"] == 1
+    assert hedger.stats()["p99_saved_seconds"] > 0
+
+
+def test_hedges_are_capped():
+    hedger = Hedger(initial_delay=0.01, max_ratio=0.0, burst=1)
+    for _ in range(2):
+        call, calls = _slow_first(0.05)
+        hedger.call(call)
+    # the budget allows one hedge, calls do not earn more
+    assert hedger.stats()["counters"]["hedged"] == 1
+
+
+def test_delay_follows_observed_latency():
+    hedger = Hedger(percentile=90, initial_delay=1.0, min_samples=5)
+    assert hedger.delay() == 1.0
+    for _ in range(5):
+        hedger.call(lambda: time.sleep(0.01))
+    assert 0.01 <= hedger.delay() < 0.5
+
+    with pytest.raises(ZeroDivisionError):
+        hedger.call(lambda: 1 / 0)
+
+
+def test_fifo_publishes_carry_a_deduplication_id():
+    with patch("boto3.session.Session"):
+        provider = ProviderSNS(
+            accountId="1",
+            topic="arn:aws:sns:us-east-1:000000000000:invoices.fifo",
+            hedge={"initial_delay": 0.02},
+        )
+    provider.conn = Mock()
+    provider.conn.publish.side_effect, calls = _slow_first()
+    event = Event.create("InvoiceIssued", "billing", InvoiceIssuedPayload(id="1"))
+
+    assert provider.publish(event) == {"MessageId": "2"}
+    first, second = calls
+    assert first["MessageDeduplicationId"] == deduplication_id(event)
+    assert first == second
+    assert provider.hedger.stats()["counters"]["hedge_wins"] == 1
@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+CHECK_LAZY = """
+import sys
+import communicate.utils.eventbus
+import communicate.utils.eventbus.configuration as configuration
+
+heavy = [m for m in ("boto3", "botocore", "kombu") if m in sys.modules]
+assert not heavy, heavy
+assert not configuration._bootstrapped
+
+from communicate.utils.eventbus import AmazonSNSSubscriber, PublisherWithRouting
+assert "kombu" in sys.modules
+assert "boto3" not in sys.modules
+assert configuration.config_builder.read_value("eventBus.publisher.targets")
+assert configuration._bootstrapped
+"""
+
+
+def test_package_import_is_lazy():
+    subprocess.run([sys.executable, "-c", CHECK_LAZY], check=True)
@@ -0,0 +1,263 @@
+import boto3
+import os
+import pytest
+from moto import mock_aws
+from unittest.mock import Mock
+
+from communicate.utils.eventbus import Event, EventPayload
+from communicate.utils.eventbus.publisher import (
+    AmazonSNSPublisher,
+    CircuitBreaker,
+    Journal,
+    SpillingPublisher,
+)
+from communicate.utils.eventbus.publisher.journal import FSYNC_ALWAYS
+
+
+class OrderShippedPayload(EventPayload):
+    id: str
+
+
+def _event(index=0):
+    return Event.create(
+        "OrderShipped", "orders", OrderShippedPayload(id=str(index))
+    )
+
+
+@pytest.fixture
+def sns():
+    with mock_aws():
+        client = boto3.client("sns", region_name="us-east-1")
+        topic_arn = client.create_topic(Name="events")["TopicArn"]
+        sqs = boto3.client("sqs", region_name="us-east-1")
+        queue_url = sqs.create_queue(QueueName="events")["QueueUrl"]
+        queue_arn = sqs.get_queue_attributes(
+            QueueUrl=queue_url, AttributeNames=["QueueArn"]
+        )["Attributes"]["QueueArn"]
+        client.subscribe(TopicArn=topic_arn, Protocol="sqs", Endpoint=queue_arn)
+        publisher = AmazonSNSPublisher(
+            "orders",
+            {"topic_arn": topic_arn, "endpoint_url": None, "region": "us-east-1"},
+        )
+        publisher.conn = client
+        yield publisher, sqs, queue_url
+
+
+def test_journal_roundtrip_across_segments(tmp_path):
+    journal = Journal(str(tmp_path), segment_bytes=64, fsync=FSYNC_ALWAYS)
+    for index in range(10):
+        journal.append(f"record-{index}".encode())
+    assert len(journal.segments()) > 1
+
+    records, position = journal.read(4)
+    assert records == [f"record-{i}".encode() for i in range(4)]
+    journal.commit(position)
+
+    records, position = journal.read(100)
+    assert records == [f"record-{i}".encode() for i in range(4, 10)]
+    journal.commit(position)
+    assert journal.pending_bytes() == 0
+    assert len(journal.segments()) == 1
+
+
+def test_journal_survives_restart_and_torn_write(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.append(b"first")
+    journal.append(b"second")
+    records, position = journal.read(1)
+    journal.commit(position)
+    journal.close()
+
+    (segment,) = [
+        name for name in os.listdir(tmp_path) if name.endswith(".seg")
+    ]
+    with open(tmp_path / segment, "ab") as file:
+        file.write(b"\x10\x00\x00\x00garbage")
+
+    journal = Journal(str(tmp_path))
+    journal.append(b"third")
+    records, _ = journal.read(10)
+    assert records == [b"second", b"third"]
+
+
+def test_circuit_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()
+    # only one trial call while half-open
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_spills_during_outage_and_replays(sns, tmp_path, clock, drain):
+    publisher, sqs, queue_url = sns
+    conn = publisher.conn
+    publisher.conn = Mock(publish=Mock(side_effect=ConnectionError("down")))
+    spilling = SpillingPublisher(
+        publisher,
+        Journal(str(tmp_path)),
+        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock),
+    )
+    spilling.start = Mock()
+
+    for index in range(15):
+        assert spilling.publish_event(_event(index)) == {"Journaled": True}
+    # the target is called once, then the open circuit short-cuts publishes
+    assert publisher.conn.publish.call_count == 1
+    assert spilling.replay() == 0
+
+    publisher.conn = conn
+    clock.now = 5
+    assert spilling.replay() == 15
+    assert spilling.stats()["state"] == CircuitBreaker.CLOSED
+    assert spilling.stats()["pending_bytes"] == 0
+    assert len(drain(sqs, queue_url)) == 15
+
+    assert "MessageId" in spilling.publish_event(_event())
+    assert spilling.stats()["counters"]["published"] == 1
+
+
+def test_replay_requeues_throttled_entries(tmp_path):
+    target = Mock()
+    target.build_entry.side_effect = lambda event: {"Message": "m"}
+    target.publish_event.side_effect = ConnectionError
+    spilling = SpillingPublisher(
+        target,
+        Journal(str(tmp_path)),
+        breaker=CircuitBreaker(failure_threshold=1),
+    )
+    spilling.start = Mock()
+    for index in range(3):
+        spilling.publish_event(_event(index))
+    spilling.breaker.record_success()
+
+    target.publish_entries.return_value = {
+        "Successful": [{"Id": "0"}],
+        "Failed": [
+            {"Id": "1", "SenderFault": False, "Code": "Throttled"},
+            {"Id": "2", "SenderFault": True, "Code": "InvalidParameter"},
+        ],
+    }
+    assert spilling.replay() == 1
+    records, _ = spilling.journal.read(10)
+    assert len(records) == 1
+    assert spilling.stats()["counters"]["rejected"] == 1
+
+
+def test_interval_fsync_without_further_appends(tmp_path, monkeypatch, clock):
+    journal = Journal(str(tmp_path), fsync_interval=1.0, clock=clock)
+    synced = []
+    monkeypatch.setattr(os, "fsync", synced.append)
+
+    clock.now = 5
+    journal.append(b"a")
+    journal.append(b"b")
+    assert len(synced) == 1
+    journal.sync_if_due()
+    assert len(synced) == 1
+    # no more appends, the replayer tick syncs the last record
+    clock.now = 6.5
+    journal.sync_if_due()
+    assert len(synced) == 2
+    journal.sync_if_due()
+    assert len(synced) == 2
+
+
+def test_publishes_wait_behind_the_journal(tmp_path, clock):
+    target = Mock()
+    target.build_entry.side_effect = lambda event: {
+        "Message": event.payload.id
+    }
+    target.publish_event.side_effect = ConnectionError
+    spilling = SpillingPublisher(
+        target,
+        Journal(str(tmp_path)),
+        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock),
+    )
+    spilling.start = Mock()
+    spilling.publish_event(_event(0))
+    spilling.publish_event(_event(1))
+
+    # the target recovered, the journal was not replayed yet
+    target.publish_event.side_effect = None
+    clock.now = 5
+    assert spilling.publish_event(_event(2)) == {"Journaled": True}
+    target.publish_event.assert_called_once()
+
+    target.publish_entries.return_value = {"Successful": [], "Failed": []}
+    assert spilling.replay() == 3
+    (entries,) = target.publish_entries.call_args.args
+    assert [entry["Message"] for entry in entries] == ["0", "1", "2"]
+
+    spilling.publish_event(_event(3))
+    assert target.publish_event.call_count == 2
+
+
+def test_binary_attributes_are_journaled(tmp_path):
+    target = Mock()
+    target.build_entry.side_effect = lambda event: {
+        "Message": event.payload.id,
+        "MessageAttributes": {
+            "signature": {"DataType": "Binary", "BinaryValue": b"\x00\xff"},
+        },
+    }
+    target.publish_event.side_effect = ConnectionError
+    spilling = SpillingPublisher(
+        target,
+        Journal(str(tmp_path)),
+        breaker=CircuitBreaker(failure_threshold=1),
+    )
+    spilling.start = Mock()
+    assert spilling.publish_event(_event()) == {"Journaled": True}
+
+    spilling.breaker.record_success()
+    target.publish_entries.return_value = {"Successful": [], "Failed": []}
+    assert spilling.replay() == 1
+    ((entry,),) = target.publish_entries.call_args.args
+    assert entry["MessageAttributes"]["signature"]["BinaryValue"] == b"\x00\xff"
+
+
+def test_replay_skips_a_corrupted_record(tmp_path):
+    target = Mock()
+    target.build_entry.side_effect = lambda event: {"Message": event.payload.id}
+    target.publish_event.side_effect = ConnectionError
+    spilling = SpillingPublisher(
+        target,
+        Journal(str(tmp_path)),
+        breaker=CircuitBreaker(failure_threshold=1),
+    )
+    spilling.start = Mock()
+    spilling.publish_event(_event(0))
+    spilling.publish_event(_event(1))
+    (segment,) = [
+        name for name in os.listdir(tmp_path) if name.endswith(".seg")
+    ]
+    # flip a byte of the first record, the checksum no longer matches
+    with open(tmp_path / segment, "r+b") as file:
+        file.seek(10)
+        byte = file.read(1)
+        file.seek(10)
+        file.write(bytes([byte[0] ^ 0xFF]))
+
+    spilling.breaker.record_success()
+    assert spilling.replay() == 0
+    target.publish_entries.assert_not_called()
+    assert spilling.journal.pending_bytes() == 0
+    assert spilling.stats()["counters"]["skipped_segments"] == 1
+
+    # the backlog is over, publishes go to the target again
+    target.publish_event.side_effect = None
+    assert spilling.publish_event(_event(2)) != {"Journaled": True}
+    assert target.publish_event.call_args.args[0].payload.id == "2"
@@ -0,0 +1,76 @@
+import enum
+import json
+import random
+from datetime import datetime
+from pydantic import BaseModel, conint, constr
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from communicate.utils.eventbus import EventPayload, EventRegistry
+from communicate.utils.eventbus.loadgen import (
+    LoadGenerator,
+    SchemaSampler,
+    _moto_environment,
+)
+
+
+class Channel(str, enum.Enum):
+    EMAIL = "email"
+    SMS = "sms"
+
+
+class Recipient(BaseModel):
+    address: constr(min_length=3, max_length=20)
+    channel: Channel
+
+
+class NotificationQueuedPayload(EventPayload):
+    id: UUID
+    queued_at: datetime
+    priority: conint(ge=1, le=5)
+    recipients: List[Recipient]
+    tags: Dict[str, float]
+    note: Optional[str]
+
+
+EventRegistry.register(NotificationQueuedPayload)
+
+
+def test_samples_validate_against_payload_models():
+    document = EventRegistry().generate_schema()
+    definitions = document["definitions"]
+    event = EventRegistry().get_event_by_name(
+        NotificationQueuedPayload.get_event_name()
+    )
+    payload_schema = definitions[event.__name__]["properties"]["Payload"]
+    sampler = SchemaSampler(definitions, random.Random(1))
+    for _ in range(200):
+        payload = NotificationQueuedPayload.parse_obj(
+            sampler.sample(payload_schema)
+        )
+        assert 1 <= payload.priority <= 5
+
+
+def test_load_generator_end_to_end():
+    mock, publisher, subscriber = _moto_environment("us-east-1", "loadgen")
+    try:
+        report = LoadGenerator(
+            publisher,
+            subscriber=subscriber,
+            concurrency=3,
+            duration=30,
+            total=30,
+            drain_timeout=10,
+            seed=7,
+        ).run()
+    finally:
+        mock.stop()
+
+    assert report["published"] == 30
+    assert report["publish_errors"] == 0
+    assert report["received"] == 30
+    assert report["lost"] == 0
+    assert sum(report["events"].values()) == 30
+    assert report["end_to_end_latency"]["p99"] is not None
+    assert report["publish_latency"]["p50"] is not None
+    json.dumps(report)
@@ -0,0 +1,102 @@
+import boto3
+import pytest
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from moto import mock_aws
+
+from communicate.utils.eventbus import AmazonSNSPublisher, EventPayload
+from communicate.utils.eventbus.publisher.pool import ClientPool, PoolExhausted
+
+
+class SampleTakenPayload(EventPayload):
+    id: str
+
+
+class SlowClient:
+    """Fails when two callers use it at once"""
+
+    in_use = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.busy = False
+
+    def publish(self, **kwargs):
+        assert not self.busy, "client shared by two callers"
+        self.busy = True
+        with self.lock:
+            SlowClient.in_use += 1
+            SlowClient.peak = max(SlowClient.peak, SlowClient.in_use)
+        time.sleep(0.005)
+        with self.lock:
+            SlowClient.in_use -= 1
+        self.busy = False
+
+
+def test_pool_bounds_clients_and_keeps_throughput():
+    pool = ClientPool(SlowClient, size=8)
+
+    def work(_):
+        for _ in range(20):
+            with pool.client() as client:
+                client.publish()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(32) as executor:
+        list(executor.map(work, range(32)))
+    elapsed = time.monotonic() - started
+
+    stats = pool.stats()
+    assert stats["created"] == stats["idle"] == 8
+    assert SlowClient.peak <= 8
+    # 640 calls of 5ms: ~0.4s on 8 clients, 3.2s on a single one
+    assert elapsed < 1.6
+
+
+def test_pool_timeout():
+    pool = ClientPool(object, size=1, timeout=0.01)
+    with pool.client():
+        with pytest.raises(PoolExhausted):
+            with pool.client():
+                pass
+
+
+def test_shared_publisher_from_many_threads():
+    config = {
+        "region": "us-east-1",
+        "endpoint_url": "https://sns.us-east-1.amazonaws.com",
+        "pool_size": 4,
+        "aws": {"retries": {"max_attempts": 1}},
+    }
+    with mock_aws():
+        sns = boto3.client("sns", region_name="us-east-1")
+        sqs = boto3.client("sqs", region_name="us-east-1")
+        config["topic_arn"] = sns.create_topic(Name="samples")["TopicArn"]
+        queue_url = sqs.create_queue(QueueName="samples")["QueueUrl"]
+        queue_arn = sqs.get_queue_attributes(
+            QueueUrl=queue_url, AttributeNames=["QueueArn"]
+        )["Attributes"]["QueueArn"]
+        sns.subscribe(
+            TopicArn=config["topic_arn"], Protocol="sqs", Endpoint=queue_arn
+        )
+        publisher = AmazonSNSPublisher("Lab", config)
+
+        def work(index):
+            for number in range(10):
+                publisher.publish(
+                    "SampleTaken", SampleTakenPayload(id=f"{index}-{number}")
+                )
+
+        with ThreadPoolExecutor(16) as executor:
+            list(executor.map(work, range(16)))
+
+        attributes = sqs.get_queue_attributes(
+            QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+        )["Attributes"]
+    assert attributes["ApproximateNumberOfMessages"] == "160"
+    assert publisher.clients.stats()["created"] <= 4
+    # the caller's config is left untouched
+    assert config["aws"] == {"retries": {"max_attempts": 1}}
+    assert config["region"] == "us-east-1"
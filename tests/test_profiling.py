@@ -0,0 +1,110 @@
+import json
+import os
+import pstats
+import signal
+import threading
+import tracemalloc
+import pytest
+from unittest.mock import Mock
+
+from communicate.utils.eventbus import AmazonSNSSubscriber, Event, EventPayload
+from communicate.utils.eventbus import profiling
+from communicate.utils.eventbus.profiling import ProfileOptions
+
+
+class ReportFiledPayload(EventPayload):
+    id: str
+
+
+@pytest.fixture(autouse=True)
+def profiler_off():
+    profiling.disable()
+    yield
+    profiling.disable()
+
+
+def slow_hook(event, trace_ctx=None):
+    sum(range(10000))
+
+
+def test_disabled_sections_do_nothing():
+    assert profiling.active() is None
+    assert profiling.section("a") is profiling.section("b")
+
+
+def test_options_from_env():
+    options = ProfileOptions.from_env({
+        "EVENTBUS_PROFILE": "sample",
+        "EVENTBUS_PROFILE_EVERY": "5",
+        "EVENTBUS_PROFILE_DUMP_EVERY": "3",
+        "EVENTBUS_PROFILE_WINDOW": "2.5",
+    })
+    assert options.mode == "sample"
+    assert (options.every, options.dump_every, options.window) == (5, 3, 2.5)
+    assert ProfileOptions.from_env({}).dump_every == 10
+    with pytest.raises(ValueError):
+        ProfileOptions.from_env({"EVENTBUS_PROFILE": "perf"})
+
+
+def test_every_nth_message_is_profiled(tmp_path):
+    profiling.enable(ProfileOptions(directory=str(tmp_path), every=2))
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://", queue_name="test_queue", hook=slow_hook
+    )
+    event = Event.create("ReportFiled", "reports", ReportFiledPayload(id="1"))
+    body = json.dumps({"Message": event.json(by_alias=True)})
+    for _ in range(5):
+        subscriber.process_message(body, Mock())
+
+    profiler = profiling.disable()
+    assert profiler.stats()["counters"]["profiled"] == 2
+    path = tmp_path / f"subscriber.process_message-{os.getpid()}.prof"
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "slow_hook" in functions
+    assert profiling.active() is None
+
+
+def test_sampling_window(tmp_path, wait_for):
+    profiling.enable(ProfileOptions(
+        directory=str(tmp_path), mode="sample", interval=0.005, window=0.2,
+    ))
+    stopped = threading.Event()
+
+    def consume():
+        while not stopped.is_set():
+            with profiling.section("subscriber.get_one"):
+                slow_hook(None)
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    # sampling stops by itself after the window
+    wait_for(lambda: profiling.active() is None)
+    stopped.set()
+    thread.join()
+
+    (path,) = tmp_path.glob(f"sample-{os.getpid()}-*.folded")
+    stacks = path.read_text().splitlines()
+    assert any(
+        line.startswith("subscriber.get_one;") and "slow_hook" in line
+        for line in stacks
+    )
+
+
+def test_signal_toggles_tracemalloc_snapshots(tmp_path, monkeypatch, wait_for):
+    monkeypatch.setenv("EVENTBUS_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("EVENTBUS_PROFILE_TRACEMALLOC", "5")
+    previous = signal.getsignal(signal.SIGUSR2)
+    profiling.install_signal_handler()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR2)
+        wait_for(lambda: profiling.active() is not None)
+        assert tracemalloc.is_tracing()
+        os.kill(os.getpid(), signal.SIGUSR2)
+        # stopping writes the snapshot, then stops tracemalloc
+        wait_for(lambda: not tracemalloc.is_tracing())
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
+
+    assert profiling.active() is None
+    (path,) = tmp_path.glob("tracemalloc-*.snap")
+    assert tracemalloc.Snapshot.load(str(path)).traces
@@ -0,0 +1,140 @@
+import pytest
+from pydantic import validator
+from typing import List, Optional
+from uuid import UUID
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from pydantic import BaseModel
+
+from communicate.utils.eventbus import EventFailPayload, EventPayload
+from communicate.utils.eventbus.celery.projection import (
+    Projection,
+    derive_projection,
+)
+from communicate.utils.eventbus.celery.tasks import (
+    DjangoCeleryTaskWithCallback,
+)
+from testapp.models import Package, Shipment, Warehouse
+
+
+class WarehouseSchema(BaseModel):
+    name: str
+
+    class Config:
+        orm_mode = True
+
+
+class PackageSchema(BaseModel):
+    weight: int
+
+    class Config:
+        orm_mode = True
+
+
+class ShipmentDispatchedPayload(EventPayload):
+    id: UUID
+    reference: str
+    warehouse: WarehouseSchema
+    packages: List[PackageSchema]
+
+    @validator("packages", pre=True)
+    def _related_manager(cls, value):
+        return list(value.all()) if hasattr(value, "all") else value
+
+    class Config:
+        orm_mode = True
+
+
+class ShipmentDispatchFailedPayload(EventFailPayload):
+    pass
+
+
+class ShipmentLabelledPayload(EventPayload):
+    id: UUID
+    label: Optional[str]
+
+    class Config:
+        orm_mode = True
+
+
+class DispatchShipmentTask(DjangoCeleryTaskWithCallback):
+    model = Shipment
+    payload_cls = ShipmentDispatchedPayload
+    exception_payload_cls = ShipmentDispatchFailedPayload
+
+
+@pytest.fixture(scope="module")
+def shipments():
+    with connection.schema_editor() as editor:
+        for model in (Warehouse, Shipment, Package):
+            editor.create_model(model)
+    warehouse = Warehouse.objects.create(name="north")
+    ids = []
+    for index in range(20):
+        shipment = Shipment.objects.create(
+            reference=f"S{index}", warehouse=warehouse
+        )
+        Package.objects.bulk_create(
+            Package(shipment=shipment, weight=weight) for weight in range(5)
+        )
+        ids.append(shipment.id)
+    yield ids
+    with connection.schema_editor() as editor:
+        for model in (Package, Shipment, Warehouse):
+            editor.delete_model(model)
+
+
+def _load_and_build(task, shipment_id):
+    task._instance = None
+    task._success_payload = None
+    task.get_instance(id=shipment_id)
+    return task.get_event_payload()
+
+
+def test_derived_projection():
+    projection = derive_projection(Shipment, ShipmentDispatchedPayload)
+    assert projection.only == (
+        "id", "reference", "warehouse", "warehouse__id", "warehouse__name"
+    )
+    assert projection.select_related == ("warehouse",)
+    ((lookup, model, inner),) = projection.prefetch_related
+    assert (lookup, model) == ("packages", Package)
+    assert inner.only == ("id", "shipment", "weight")
+    # a property may read any column
+    assert derive_projection(Shipment, ShipmentLabelledPayload) is None
+
+
+def test_projection_saves_queries_and_columns(shipments):
+    task = DispatchShipmentTask()
+
+    task.projection = False
+    with CaptureQueriesContext(connection) as full:
+        expected = [_load_and_build(task, i) for i in shipments]
+
+    task.projection = None
+    with CaptureQueriesContext(connection) as projected:
+        payloads = [_load_and_build(task, i) for i in shipments]
+
+    assert payloads == expected
+    # shipment + warehouse + packages per instance, vs one join + prefetch
+    assert len(full) == 3 * len(shipments)
+    assert len(projected) == 2 * len(shipments)
+    assert "manifest" in full.captured_queries[0]["sql"]
+    assert all("manifest" not in q["sql"] for q in projected.captured_queries)
+    assert all("contents" not in q["sql"] for q in projected.captured_queries)
+
+
+def test_explicit_projection(shipments):
+    task = DispatchShipmentTask()
+    task.projection = {
+        "only": ["reference", "warehouse__name"],
+        "select_related": ["warehouse"],
+    }
+    assert task.get_projection() == Projection(
+        only=("reference", "warehouse__name"), select_related=("warehouse",)
+    )
+    with CaptureQueriesContext(connection) as queries:
+        instance = task.get_instance(id=shipments[0])
+    assert "notes" not in queries.captured_queries[0]["sql"]
+    assert instance.warehouse.name == "north"
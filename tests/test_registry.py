@@ -0,0 +1,50 @@
+import json
+from pydantic.schema import schema
+from uuid import UUID
+
+from communicate.utils.eventbus import EventPayload, EventRegistry
+
+
+class InvoicePaidPayload(EventPayload):
+    id: UUID
+    amount: int
+    lines: list
+
+
+def _pydantic_schema(registry):
+    expected = schema(
+        registry.events_list(),
+        ref_prefix=registry.ref_prefix,
+        by_alias=True,
+        title="Events for Billing service, version of 1",
+    )
+    expected["id"] = registry.construct_id("Billing", "1")
+    expected["$schema"] = "http://json-schema.org/draft-04/schema#"
+    return expected
+
+
+def test_generate_schema_matches_pydantic():
+    registry = EventRegistry()
+    generated = registry.generate_schema("Billing", "1")
+
+    assert generated == _pydantic_schema(registry)
+    assert InvoicePaidPayload.get_event_name() in generated["definitions"]
+    schema = registry.generate_json_schema(service_name="Billing", version="1")
+    assert json.loads(schema) == generated
+
+
+def test_json_schema_bytes_are_cached_until_registration():
+    registry = EventRegistry()
+    data, etag = registry.generate_json_schema_bytes(service_name="Billing")
+    again, same_etag = registry.generate_json_schema_bytes(service_name="Billing")
+    assert again is data
+    assert same_etag == etag
+
+    class InvoiceRefundedPayload(EventPayload):
+        id: UUID
+
+    data, new_etag = registry.generate_json_schema_bytes(service_name="Billing")
+    assert new_etag != etag
+    definitions = json.loads(data)["definitions"]
+    assert InvoiceRefundedPayload.get_event_name() in definitions
+    assert registry.generate_schema("Billing", "1") == _pydantic_schema(registry)
@@ -0,0 +1,129 @@
+import boto3
+import json
+import pytest
+from moto import mock_aws
+from unittest.mock import patch
+
+from communicate.utils.eventbus import AmazonSNSPublisher, EventPayload
+from communicate.utils.eventbus.relay import Relay, RelayRules, main
+
+
+class ParcelRoutedPayload(EventPayload):
+    id: str
+
+
+class ParcelTestedPayload(EventPayload):
+    id: str
+
+
+def _queue(sqs, sns, topic_arn, name, raw=False):
+    queue_url = sqs.create_queue(QueueName=name)["QueueUrl"]
+    queue_arn = sqs.get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=["QueueArn"]
+    )["Attributes"]["QueueArn"]
+    sns.subscribe(
+        TopicArn=topic_arn,
+        Protocol="sqs",
+        Endpoint=queue_arn,
+        Attributes={"RawMessageDelivery": "true" if raw else "false"},
+    )
+    return queue_url
+
+
+@pytest.fixture
+def aws():
+    with mock_aws():
+        sns = boto3.client("sns", region_name="us-east-1")
+        sqs = boto3.client("sqs", region_name="us-east-1")
+        source_arn = sns.create_topic(Name="source")["TopicArn"]
+        target_arn = sns.create_topic(Name="target")["TopicArn"]
+        source_url = _queue(sqs, sns, source_arn, "relay-source")
+        sink_url = _queue(sqs, sns, target_arn, "relay-sink", raw=True)
+        publisher = AmazonSNSPublisher(
+            "Parcels",
+            {"topic_arn": source_arn, "region": "us-east-1", "endpoint_url": None},
+        )
+        publisher.conn = sns
+        yield sqs, sns, publisher, source_url, sink_url, target_arn
+
+
+def test_relays_rewritten_batches(aws, drain):
+    sqs, sns, publisher, source_url, sink_url, target_arn = aws
+    for index in range(25):
+        publisher.publish(
+            "ParcelRouted", ParcelRoutedPayload(id=str(index)),
+            routing_attrs={"tenant": "acme"},
+        )
+    for index in range(5):
+        publisher.publish("ParcelTested", ParcelTestedPayload(id=str(index)))
+
+    relay = Relay(
+        sqs, sns, source_url, target_arn,
+        rules=RelayRules.from_spec({
+            "include": {"eventName": ["Parcel*"]},
+            "exclude": {"eventName": ["*Tested"]},
+            "rename": {"publisherName": "originPublisher"},
+            "drop": ["tenant"],
+            "set": {"publisherName": "ParcelsRelay"},
+        }),
+        wait_time=0,
+    )
+    while relay.relay_batch():
+        pass
+
+    relayed = drain(sqs, sink_url)
+    assert len(relayed) == 25
+    attrs = relayed[0]["MessageAttributes"]
+    assert attrs["publisherName"]["StringValue"] == "ParcelsRelay"
+    assert attrs["originPublisher"]["StringValue"] == "Parcels"
+    assert "tenant" not in attrs
+    assert json.loads(relayed[0]["Body"])["Metadata"]["PublisherName"] == "Parcels"
+    assert drain(sqs, source_url) == []
+
+    counters = relay.stats()["counters"]
+    assert counters == {"received": 30, "relayed": 25, "filtered": 5}
+    assert relay.stats()["timings"]["lag_seconds"]["count"] == 30
+
+
+def test_failed_publish_keeps_the_source_message(aws):
+    sqs, sns, publisher, source_url, sink_url, target_arn = aws
+    for index in range(3):
+        publisher.publish("ParcelRouted", ParcelRoutedPayload(id=str(index)))
+
+    def publish_batch(TopicArn, PublishBatchRequestEntries):
+        entries = PublishBatchRequestEntries
+        return {
+            "Successful": [{"Id": e["Id"]} for e in entries[1:]],
+            "Failed": [{"Id": entries[0]["Id"], "Code": "Throttled"}],
+        }
+
+    relay = Relay(sqs, sns, source_url, target_arn, wait_time=0)
+    with patch.object(sns, "publish_batch", side_effect=publish_batch):
+        assert relay.relay_batch() == 3
+    assert relay.stats()["counters"]["failed"] == 1
+    attributes = sqs.get_queue_attributes(
+        QueueUrl=source_url, AttributeNames=["All"]
+    )["Attributes"]
+    # the message which failed is left in flight, the others are deleted
+    assert attributes["ApproximateNumberOfMessagesNotVisible"] == "1"
+    assert attributes["ApproximateNumberOfMessages"] == "0"
+
+
+def test_cli_stops_on_signal(aws, tmp_path, drain):
+    sqs, sns, publisher, source_url, sink_url, target_arn = aws
+    publisher.publish("ParcelRouted", ParcelRoutedPayload(id="1"))
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps({"set": {"relayed": "yes"}}))
+
+    def run(relay):
+        relay.relay_batch()
+        relay.stop()
+
+    with patch.object(Relay, "run", autospec=True, side_effect=run), \
+            patch("boto3.session.Session.client", side_effect=[sqs, sns]):
+        main([
+            "--source-queue", "relay-source", "--topic", target_arn,
+            "--rules", str(rules), "--wait-time", "0",
+        ])
+    (message,) = drain(sqs, sink_url)
+    assert message["MessageAttributes"]["relayed"]["StringValue"] == "yes"
@@ -0,0 +1,155 @@
+import boto3
+import json
+import pytest
+from moto import mock_aws
+from unittest.mock import Mock, patch
+
+from communicate.utils.eventbus import AmazonSNSSubscriber, Event, EventPayload
+from communicate.utils.eventbus.retry import (
+    Backoff,
+    RetryPolicy,
+    SQSDeadLetterQueue,
+    receive_count,
+)
+
+
+class InvoiceFailedPayload(EventPayload):
+    id: str
+
+
+@pytest.fixture
+def sqs():
+    with mock_aws():
+        client = boto3.client("sqs", region_name="us-east-1")
+        queue_url = client.create_queue(QueueName="events")["QueueUrl"]
+        dlq_url = client.create_queue(QueueName="events-dlq")["QueueUrl"]
+        yield client, queue_url, dlq_url
+
+
+def _body():
+    event = Event.create("InvoiceFailed", "invoices", InvoiceFailedPayload(id="1"))
+    return json.dumps({"Message": event.json(by_alias=True)})
+
+
+def _received(client, queue_url, body):
+    client.send_message(QueueUrl=queue_url, MessageBody=body)
+    (raw,) = client.receive_message(
+        QueueUrl=queue_url, AttributeNames=["All"]
+    )["Messages"]
+    message = Mock()
+    message.channel.sqs.return_value = client
+    message.channel.canonical_queue_name.side_effect = lambda name: name
+    message.delivery_info = {
+        "sqs_message": raw,
+        "sqs_queue": queue_url,
+        "routing_key": "events",
+    }
+    return message
+
+
+def _subscriber(hook, **kwargs):
+    return AmazonSNSSubscriber(
+        connection_url="memory://", queue_name="test_queue", hook=hook, **kwargs
+    )
+
+
+def test_backoff():
+    backoff = Backoff(base=1, factor=2, cap=10, jitter=False)
+    assert [backoff.delay(n) for n in range(6)] == [1, 2, 4, 8, 10, 10]
+    assert backoff.delay(10_000) == 10
+
+    jittered = Backoff(base=1, factor=2, cap=10, rand=lambda: 0.0)
+    assert jittered.delay(3) == 4
+    jittered = Backoff(base=1, factor=2, cap=10, rand=lambda: 1.0)
+    assert jittered.delay(3) == 8
+
+
+def test_retry_policy():
+    policy = RetryPolicy(Backoff(base=2, cap=900, jitter=False), max_receive_count=3)
+    assert [policy.visibility_timeout(n) for n in (None, 1, 2, 3)] == [2, 2, 4, 8]
+    assert not policy.exhausted(None)
+    assert not policy.exhausted(2)
+    assert policy.exhausted(3)
+
+
+def test_hook_failure_delays_redelivery(sqs):
+    client, queue_url, _ = sqs
+    subscriber = _subscriber(
+        Mock(side_effect=RuntimeError("db down")),
+        retry_policy=RetryPolicy(Backoff(base=30, jitter=False)),
+    )
+    message = _received(client, queue_url, _body())
+    assert receive_count(message) == 1
+
+    subscriber.process_message(_body(), message)
+
+    message.reject.assert_called_once_with(requeue=False)
+    message.ack.assert_not_called()
+    # the message is kept in SQS but invisible for the backoff delay
+    attributes = client.get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=["All"]
+    )["Attributes"]
+    assert attributes["ApproximateNumberOfMessagesNotVisible"] == "1"
+    assert subscriber.stats()["counters"]["retried"] == 1
+
+
+def test_exhausted_message_is_dead_lettered(sqs):
+    client, queue_url, dlq_url = sqs
+    subscriber = _subscriber(
+        Mock(side_effect=RuntimeError("db down")),
+        retry_policy=RetryPolicy(max_receive_count=1),
+        dead_letter=SQSDeadLetterQueue(dlq_url),
+    )
+    message = _received(client, queue_url, _body())
+
+    subscriber.process_message(_body(), message)
+
+    message.ack.assert_called_once_with()
+    (dead,) = client.receive_message(
+        QueueUrl=dlq_url, MessageAttributeNames=["All"]
+    )["Messages"]
+    assert dead["Body"] == _body()
+    reason = dead["MessageAttributes"]["deadLetterReason"]["StringValue"]
+    assert "db down" in reason
+    assert subscriber.stats()["counters"]["dead_lettered"] == 1
+
+
+def test_unparseable_message_is_dead_lettered(sqs):
+    client, queue_url, dlq_url = sqs
+    hook = Mock()
+    subscriber = _subscriber(hook, dead_letter=SQSDeadLetterQueue(dlq_url))
+    message = _received(client, queue_url, "not json")
+
+    subscriber.process_message("not json", message)
+
+    hook.assert_not_called()
+    message.ack.assert_called_once_with()
+    (dead,) = client.receive_message(QueueUrl=dlq_url)["Messages"]
+    assert dead["Body"] == "not json"
+
+
+def test_failed_dead_lettering_keeps_message():
+    dead_letter = Mock()
+    dead_letter.send.side_effect = RuntimeError("unreachable")
+    subscriber = _subscriber(Mock(), dead_letter=dead_letter)
+    message = Mock(delivery_info={})
+
+    subscriber.process_message("{}", message)
+
+    message.reject.assert_called_once_with(requeue=False)
+    message.ack.assert_not_called()
+
+
+def test_run_backs_off_between_reconnects():
+    subscriber = _subscriber(
+        Mock(), reconnect_backoff=Backoff(base=1, cap=4, jitter=False)
+    )
+    error = subscriber.conn.connection_errors[0]
+    subscriber.consume = Mock(
+        side_effect=[error(), error(), error(), KeyboardInterrupt]
+    )
+    with patch.object(subscriber._stopping, "wait") as wait:
+        with pytest.raises(KeyboardInterrupt):
+            subscriber.run()
+    assert [call.args[0] for call in wait.call_args_list] == [1, 2, 4]
+    assert subscriber.stats()["counters"]["reconnects"] == 3
@@ -0,0 +1,259 @@
+import copy
+import json
+import os
+import pytest
+import threading
+from importlib.metadata import EntryPoint
+from unittest.mock import Mock
+
+from communicate.utils.eventbus import Event, EventPayload
+from communicate.utils.eventbus.configuration import get_config_builder
+from communicate.utils.eventbus.exceptions import InvalidProvider, InvalidRoute
+from communicate.utils.eventbus.publisher import PublisherWithRouting
+from communicate.utils.eventbus.publisher import routing
+from communicate.utils.eventbus.publisher.providers import NullProvider
+from communicate.utils.eventbus.publisher.routing import (
+    RouteFileWatcher,
+    Router,
+)
+
+
+def _config(**targets) -> dict:
+    return {
+        "awsAuth": {"profiles": {"default": {"accountId": "1"}}},
+        "eventBus": {
+            "publisher": {
+                "targets": {
+                    name: {"route": route, "provider": "null", "topic": topic}
+                    for name, (route, topic) in targets.items()
+                }
+            }
+        },
+    }
+
+
+@pytest.fixture
+def router():
+    router = Router()
+    snapshot = router.snapshot
+    builder = get_config_builder()
+    config = copy.deepcopy(builder.config)
+    yield router
+    router._snapshot = snapshot
+    builder.config.clear()
+    builder.config.update(config)
+    builder.invalidate()
+
+
+def test_constructing_again_keeps_the_routes(router):
+    snapshot = router.snapshot
+    publisher = PublisherWithRouting(name="Orders")
+    assert publisher.router is router
+    assert router.snapshot is snapshot
+
+
+def test_reload_keeps_providers_of_unchanged_targets(router):
+    router.reload(_config(orders=("Orders.*", "orders"), users=("Users.*", "u")))
+    orders = router.resolve("Orders", "OrderPlaced")
+    users = router.resolve("Users", "UserCreated")
+    assert isinstance(orders, NullProvider)
+    assert router.resolve("Orders", "OrderShipped") is orders
+
+    router.reload(_config(orders=("Orders.*", "orders"), users=("Users.*", "u2")))
+    assert router.resolve("Orders", "OrderPlaced") is orders
+    assert router.resolve("Users", "UserCreated") is not users
+    assert router.resolve("Users", "UserCreated").topic == "u2"
+
+    with pytest.raises(TypeError):
+        router.config["eventBus"]["publisher"]["targets"] = {}
+
+
+def test_file_watcher_reloads_on_change(router, tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps(_config(orders=("Orders.*", "v1"))))
+    watcher = RouteFileWatcher(str(path), router=router)
+    assert watcher.check() is True
+    assert watcher.check() is False
+    assert router.resolve("Orders", "OrderPlaced").topic == "v1"
+
+    path.write_text(json.dumps(_config(orders=("Orders.*", "v2"))))
+    os.utime(path, ns=(1, 1))
+    assert watcher.check() is True
+    assert router.resolve("Orders", "OrderPlaced").topic == "v2"
+
+    path.write_text("{not json")
+    os.utime(path, ns=(2, 2))
+    assert watcher.check() is False
+    assert router.resolve("Orders", "OrderPlaced").topic == "v2"
+    assert watcher.stats()["counters"] == {"reloads": 2, "errors": 1}
+
+
+def test_file_watcher_recovers_from_a_bad_edit(router, tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps(_config(orders=("Orders.*", "v1"))))
+    watcher = RouteFileWatcher(str(path), router=router)
+    assert watcher.check() is True
+
+    broken = _config(orders=("Orders.*", "v2"))
+    del broken["eventBus"]["publisher"]["targets"]["orders"]["route"]
+    path.write_text(json.dumps(broken))
+    os.utime(path, ns=(1, 1))
+    assert watcher.check() is False
+    assert router.resolve("Orders", "OrderPlaced").topic == "v1"
+    targets = get_config_builder().config["eventBus"]["publisher"]["targets"]
+    assert targets["orders"]["route"] == "Orders.*"
+
+    path.write_text(json.dumps(_config(orders=("Orders.*", "v3"))))
+    os.utime(path, ns=(2, 2))
+    assert watcher.check() is True
+    assert router.resolve("Orders", "OrderPlaced").topic == "v3"
+    # a later reload from the builder keeps the routes of the file
+    router.reload()
+    assert router.resolve("Orders", "OrderPlaced").topic == "v3"
+
+
+def test_file_watcher_removes_deleted_routes(router, tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps(
+        _config(orders=("Orders.*", "o"), users=("Users.*", "u"))
+    ))
+    watcher = RouteFileWatcher(str(path), router=router)
+    assert watcher.check() is True
+    assert router.resolve("Users", "UserCreated").topic == "u"
+
+    path.write_text(json.dumps(_config(orders=("Orders.*", "o"))))
+    os.utime(path, ns=(1, 1))
+    assert watcher.check() is True
+    assert router.resolve("Orders", "OrderPlaced").topic == "o"
+    # falls back to the catch-all route of the default configuration
+    assert router.resolver("Users.UserCreated")["route"] == "*"
+    targets = get_config_builder().config["eventBus"]["publisher"]["targets"]
+    assert "users" not in targets
+
+
+def test_file_watcher_keeps_config_added_after_it_started(router, tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps(_config(orders=("Orders.*", "v1"))))
+    builder = get_config_builder()
+    watcher = RouteFileWatcher(str(path), router=router, builder=builder)
+    builder.add_in_memory_collection({"eventBus": {"publisher": {"late": 1}}})
+    assert watcher.check() is True
+
+    publisher = builder.config["eventBus"]["publisher"]
+    assert publisher["late"] == 1
+    assert publisher["targets"]["orders"]["topic"] == "v1"
+    assert router.config["eventBus"]["publisher"]["late"] == 1
+    # the builder tables are not shared with the routes the watcher started
+    publisher["targets"]["allEventsTarget"]["route"] = "Changed.*"
+    assert watcher._base["targets"]["allEventsTarget"]["route"] == "*"
+
+
+def test_providers_use_the_credentials_of_their_snapshot(router, monkeypatch):
+    class RacingProvider(NullProvider):
+        def __init__(self, *args, accountId=None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.account_id = accountId
+            # a reload with other credentials lands between two targets
+            rotated = _config(orders=("Orders.*", "orders"))
+            rotated["awsAuth"]["profiles"]["default"]["accountId"] = "2"
+            router.reload(rotated)
+
+    monkeypatch.setitem(router.providers, "racing", RacingProvider)
+    config = _config()
+    config["eventBus"]["publisher"]["targets"]["orders"] = {
+        "route": "Orders.*",
+        "targets": [
+            {"provider": "racing", "topic": "a"},
+            {"provider": "racing", "topic": "b"},
+        ],
+    }
+    snapshot = router.reload(config)
+
+    fan_out = router.resolve("Orders", "OrderPlaced")
+    assert [p.account_id for p in fan_out.providers] == ["1", "1"]
+    assert list(snapshot.providers.values()) == [fan_out]
+
+
+def test_resolve_during_reloads(router):
+    router.reload(_config(orders=("Orders.*", "v0")))
+    errors = []
+    stop = threading.Event()
+
+    def publish():
+        while not stop.is_set():
+            try:
+                assert router.resolve("Orders", "OrderPlaced").topic[0] == "v"
+            except Exception as err:  # noqa
+                errors.append(err)
+
+    threads = [threading.Thread(target=publish) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for version in range(200):
+        router.reload(_config(orders=("Orders.*", f"v{version % 3}")))
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    router.reload(_config(users=("Users.*", "u")))
+    with pytest.raises(InvalidRoute):
+        router.resolve("Orders", "OrderPlaced")
+
+
+def test_entry_points_which_are_not_providers_are_skipped(router, monkeypatch):
+    group = "ecosystem_events"
+    entry_points = {
+        "event": EntryPoint("event", "communicate.utils.eventbus:Event", group),
+        "null": EntryPoint(
+            "null", "communicate.utils.eventbus.publisher.providers:NullProvider",
+            group,
+        ),
+    }
+    monkeypatch.setattr(routing, "discover_entry_points", lambda: entry_points)
+    monkeypatch.setattr(router, "providers", {})
+    config = _config(orders=("Orders.*", "orders"), users=("Users.*", "users"))
+    config["eventBus"]["publisher"]["targets"]["users"]["provider"] = "event"
+    router.reload(config)
+
+    assert isinstance(router.resolve("Orders", "OrderPlaced"), NullProvider)
+    with pytest.raises(InvalidProvider):
+        router.resolve("Users", "UserCreated")
+
+
+class OrderPlacedPayload(EventPayload):
+    id: str
+
+
+def test_publish_batch_groups_events_by_provider(router, monkeypatch):
+    batching = Mock()
+    batching.publish_batch.return_value = {
+        "Successful": [{"Id": "0"}],
+        "Failed": [{"Id": "1", "Code": "Throttled", "SenderFault": False}],
+    }
+    single = Mock(spec=["publish"])
+    single.publish.side_effect = [None, ConnectionError("down")]
+    monkeypatch.setattr(
+        router,
+        "resolve",
+        lambda publisher, event_name, is_outbox=False: (
+            batching if event_name == "OrderPlaced" else single
+        ),
+    )
+    publisher = PublisherWithRouting(router=router, name="Orders")
+    events = [
+        publisher.build_event(name, OrderPlacedPayload(id=str(index)))
+        for index, name in enumerate(
+            ["OrderPlaced", "OrderShipped", "OrderPlaced", "OrderShipped"]
+        )
+    ]
+
+    response = publisher.publish_batch(events)
+
+    (batch,) = batching.publish_batch.call_args.args
+    assert [event.payload.id for event in batch] == ["0", "2"]
+    assert isinstance(batch[0], Event)
+    assert sorted(item["Id"] for item in response["Successful"]) == ["0", "1"]
+    assert {item["Id"]: item["Code"] for item in response["Failed"]} == {
+        "2": "Throttled", "3": "ConnectionError",
+    }
@@ -0,0 +1,179 @@
+import json
+import pytest
+from datetime import datetime
+from pydantic import BaseModel, ValidationError, validator
+from typing import Any, Dict, List, Optional, Union
+from uuid import UUID, uuid4
+
+from communicate.utils.eventbus import Event, EventPayload, EventRegistry
+from communicate.utils.eventbus.base import CeleryEvent
+from communicate.utils.eventbus.serialization import decode, encode, get_codec
+
+
+class OrderLinePayload(BaseModel):
+    sku: str
+    quantity: int
+    price: float
+
+
+class OrderPlacedPayload(EventPayload):
+    id: UUID
+    customer: Union[UUID, str]
+    lines: List[OrderLinePayload]
+    totals: Dict[str, float]
+    placed_at: datetime
+    note: Optional[str] = None
+    tags: list = []
+    extra: Any = None
+    is_gift: bool = False
+
+
+class OrderValidatedPayload(EventPayload):
+    id: UUID
+    amount: int
+
+    @validator("amount")
+    def positive(cls, value):  # pylint: disable=no-self-argument
+        if value < 0:
+            raise ValueError("negative")
+        return value
+
+
+def _order(**overrides):
+    payload = {
+        "Id": str(uuid4()),
+        "Customer": "customer-1",
+        "Lines": [{"sku": "a", "quantity": 2, "price": 1}],
+        "Totals": {"net": 2, "gross": 2.4},
+        "PlacedAt": "2021-03-17T16:24:23.792955+00:00",
+        "Tags": ["x"],
+        "Extra": {"nested": [1, 2]},
+    }
+    payload.update(overrides)
+    return payload
+
+
+def _raw(payload, event_name="OrderPlaced", **metadata):
+    meta = {
+        "EntityName": "Order",
+        "PublisherName": "shop",
+        "EventName": event_name,
+        "EntityId": str(uuid4()),
+        "PublishDate": "2021-03-17T16:24:23+00:00",
+    }
+    meta.update(metadata)
+    return json.dumps({"metadata": meta, "payload": payload})
+
+
+CASES = [
+    _raw(_order()),
+    _raw(_order(Customer=str(uuid4()), Note="n", IsGift=True)),
+    _raw(_order(id=str(uuid4()))),  # population by field name
+    _raw(_order(Lines=[{"sku": "a", "quantity": "2", "price": 1.5}])),
+    _raw(_order(Totals={"net": "2"}, PlacedAt=1615998263)),
+    _raw(_order(Id="not-a-uuid")),
+    _raw(_order(Customer=12)),
+    _raw({"Id": str(uuid4())}),
+    _raw(_order(), EntityId="plain-entity-id"),
+    _raw(_order(), routing_keys={"a": "b"}),
+    _raw(_order(), ContainsPersonalData="yes"),
+    _raw(_order(), PublishDate="yesterday"),
+    _raw(_order(), publisher_name="by-name"),
+    json.dumps({"metadata": {}, "payload": {}}),
+    json.dumps([1, 2]),
+    "{not json",
+]
+
+
+def _outcome(parse, raw):
+    try:
+        instance = parse(raw)
+    except ValidationError as err:
+        return "error", err.errors()
+    return (
+        instance.dict(),
+        instance.__fields_set__,
+        instance.metadata.__fields_set__,
+        instance.metadata.get_routing_keys(),
+        instance.json(by_alias=True),
+    )
+
+
+@pytest.mark.parametrize("raw", CASES)
+@pytest.mark.parametrize("event_name", ["OrderPlaced", None])
+def test_decode_matches_parse_raw(raw, event_name):
+    model = Event
+    if event_name:
+        model = EventRegistry().get_event_by_name(
+            OrderPlacedPayload.get_event_name()
+        )
+    assert _outcome(get_codec(model).decode, raw) == _outcome(
+        model.parse_raw, raw
+    )
+
+
+def test_registered_events_are_compiled():
+    registry = EventRegistry()
+    placed = registry.get_codec(OrderPlacedPayload.get_event_name())
+    validated = registry.get_codec(OrderValidatedPayload.get_event_name())
+
+    assert placed.compiled and placed.decoder_supported
+    assert get_codec(OrderPlacedPayload).decoder_supported
+    # validators are only run by pydantic
+    assert not get_codec(OrderValidatedPayload).decoder_supported
+    raw = _raw({"Id": str(uuid4()), "Amount": -1})
+    with pytest.raises(ValidationError):
+        validated.decode(raw)
+
+
+@pytest.mark.parametrize("raw", CASES[:5])
+def test_encode_matches_json(raw):
+    model = EventRegistry().get_event_by_name(
+        OrderPlacedPayload.get_event_name()
+    )
+    event = model.parse_raw(raw)
+    assert encode(event) == event.json(by_alias=True)
+
+    created = Event.create(
+        "OrderPlaced", "shop", OrderPlacedPayload.parse_obj(_order())
+    )
+    created.metadata.update_routing_keys({"a": "b"})
+    assert encode(created) == created.json(by_alias=True)
+    assert decode(Event, encode(created)) == Event.parse_raw(
+        created.json(by_alias=True)
+    )
+
+
+def test_celery_event_decode():
+    raw = _raw(_order())
+    assert decode(CeleryEvent, raw) == CeleryEvent.parse_raw(raw)
+
+
+def test_valid_messages_skip_pydantic(monkeypatch):
+    model = EventRegistry().get_event_by_name(
+        OrderPlacedPayload.get_event_name()
+    )
+    raw = CASES[0]
+    expected = model.parse_raw(raw)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pydantic fallback used")
+
+    monkeypatch.setattr(model, "parse_obj", fail)
+    assert get_codec(model).decode(raw) == expected
+
+
+class ShipmentPayload(EventPayload):
+    id: str
+    label: str = ""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.label = self.label or f"shipment-{self.id}"
+
+
+def test_custom_init_is_decoded_by_pydantic():
+    codec = get_codec(ShipmentPayload)
+    assert not codec.decoder_supported
+    assert codec.decode('{"Id": "7"}').label == "shipment-7"
+    assert get_codec(Event).decoder_supported
@@ -0,0 +1,90 @@
+import os
+import pytest
+import threading
+import time
+
+from communicate.utils.eventbus import AmazonSNSSubscriber
+from communicate.utils.eventbus.retry import Backoff
+from communicate.utils.eventbus.supervisor import (
+    Supervisor,
+    WorkerOptions,
+    import_string,
+)
+
+OPTIONS = WorkerOptions(
+    hook=f"{__name__}:handle",
+    queue="test_queue",
+    url="memory://",
+    poll_timeout=0.1,
+    report_interval=0.1,
+)
+
+
+def handle(event, trace_ctx=None):
+    pass
+
+
+def crash(index, options, reports):
+    os._exit(3)
+
+
+def test_import_string():
+    assert import_string(f"{__name__}:handle") is handle
+    assert import_string(f"{__name__}.handle") is handle
+    assert import_string("os.path:join") is os.path.join
+    with pytest.raises(ImportError):
+        import_string(f"{__name__}:missing")
+    with pytest.raises(ImportError):
+        import_string("handle")
+
+
+def test_subscriber_stop_leaves_run():
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://", queue_name="test_queue", hook=handle
+    )
+    subscriber.poll_timeout = 0.05
+    thread = threading.Thread(target=subscriber.run)
+    thread.start()
+    time.sleep(0.2)
+    subscriber.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_supervisor_restarts_crashed_workers(wait_for):
+    supervisor = Supervisor(
+        OPTIONS,
+        processes=2,
+        restart_backoff=Backoff(base=0.01, jitter=False),
+        start_method="fork",
+        target=crash,
+    )
+    supervisor.start()
+    try:
+        def restarted():
+            supervisor.check()
+            return all(s["restarts"] >= 2 for s in supervisor.stats().values())
+
+        wait_for(restarted)
+    finally:
+        supervisor.shutdown()
+    assert not any(s["alive"] for s in supervisor.stats().values())
+
+
+def test_supervisor_drains_workers_on_shutdown(wait_for):
+    supervisor = Supervisor(
+        OPTIONS, processes=2, shutdown_timeout=10, start_method="fork"
+    )
+    supervisor.start()
+    try:
+        def reported():
+            supervisor.collect(timeout=0.1)
+            return all(
+                slot.reported_at is not None for slot in supervisor._slots
+            )
+
+        wait_for(reported)
+    finally:
+        supervisor.shutdown()
+    # SIGTERM let the workers leave their loop instead of being killed
+    assert [slot.process.exitcode for slot in supervisor._slots] == [0, 0]
@@ -0,0 +1,101 @@
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from unittest.mock import Mock, patch
+
+from communicate.utils.eventbus import Event, EventPayload
+from communicate.utils.eventbus.publisher.providers import ProviderSNS
+from communicate.utils.eventbus.publisher.throttle import (
+    TokenBucket,
+    watch_client,
+)
+
+
+class CargoLoadedPayload(EventPayload):
+    id: str
+
+
+def _throttling() -> ClientError:
+    return ClientError(
+        {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}}, "Publish"
+    )
+
+
+def test_bucket_spaces_out_bursts(clock):
+    bucket = TokenBucket(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+    waits = [bucket.acquire() for _ in range(15)]
+    assert waits[:5] == [0.0] * 5
+    assert clock.now == pytest.approx(1.0)
+    assert bucket.stats()["counters"] == {"acquired": 15, "waits": 10}
+
+    clock.now += 10
+    assert bucket.stats()["tokens"] == 5
+    assert bucket.acquire(5) == 0.0
+
+
+def test_rate_adapts_to_throttling(clock):
+    bucket = TokenBucket(
+        rate=100, min_rate=10, recovery=10, clock=clock, sleep=clock.sleep
+    )
+    bucket.record_throttle()
+    bucket.record_throttle()  # same burst, within the cooldown
+    assert bucket.current_rate == 50
+
+    clock.now += 1
+    bucket.record_throttle()
+    # recovered to 60 during the second, then halved
+    assert bucket.current_rate == pytest.approx(30)
+    assert bucket.stats()["counters"]["throttles"] == 3
+
+    clock.now += 4
+    assert bucket.current_rate == pytest.approx(70)
+    clock.now += 60
+    assert bucket.current_rate == 100
+
+    bucket = TokenBucket(rate=100, min_rate=10, cooldown=0, clock=clock)
+    for _ in range(5):
+        bucket.record_throttle()
+    assert bucket.current_rate == 10
+
+
+def test_provider_reports_throttling(clock):
+    with patch("boto3.session.Session"):
+        provider = ProviderSNS(
+            accountId="1",
+            rate_limit={"rate": 10, "clock": clock, "sleep": clock.sleep},
+        )
+    provider.conn = Mock()
+    event = Event.create("CargoLoaded", "cargo", CargoLoadedPayload(id="1"))
+
+    provider.conn.publish.side_effect = _throttling()
+    with pytest.raises(ClientError):
+        provider.publish(event)
+    assert provider.limiter.current_rate == 5
+
+    clock.now += 1
+    provider.conn.publish_batch.return_value = {
+        "Successful": [], "Failed": [{"Id": "0", "Code": "Throttling"}],
+    }
+    provider.publish_batch([event] * 20)
+    stats = provider.limiter.stats()
+    assert stats["current_rate"] < 5
+    assert stats["counters"]["throttles"] == 2
+    assert stats["counters"]["acquired"] == 21
+
+
+def test_retried_throttling_is_reported():
+    client = boto3.client("sns", region_name="us-east-1")
+    bucket = TokenBucket(rate=10)
+    watch_client(client, bucket)
+    handler, delay = client.meta.events.emit_until_response(
+        "needs-retry.sns.Publish",
+        response=(Mock(status_code=400), {"Error": {"Code": "Throttling"}}),
+        endpoint=Mock(),
+        operation=client.meta.service_model.operation_model("Publish"),
+        attempts=1,
+        caught_exception=None,
+        request_dict={"context": {}},
+    )
+    # botocore still retries
+    assert delay is not None
+    assert bucket.stats()["counters"]["throttles"] == 1
@@ -0,0 +1,95 @@
+import boto3
+import json
+import pytest
+import time
+from moto import mock_aws
+from unittest.mock import Mock
+
+from communicate.utils.eventbus import AmazonSNSSubscriber, Event, EventPayload
+from communicate.utils.eventbus.visibility import SQSTarget, VisibilityHeartbeat
+
+
+class ReportBuiltPayload(EventPayload):
+    id: str
+
+
+@pytest.fixture
+def sqs():
+    with mock_aws():
+        client = boto3.client("sqs", region_name="us-east-1")
+        queue_url = client.create_queue(
+            QueueName="events", Attributes={"VisibilityTimeout": "1"}
+        )["QueueUrl"]
+        yield client, queue_url
+
+
+def _receive(client, queue_url):
+    return client.receive_message(
+        QueueUrl=queue_url, MaxNumberOfMessages=10
+    ).get("Messages", [])
+
+
+def test_heartbeat_extends_visibility(sqs, clock):
+    client, queue_url = sqs
+    for i in range(12):
+        client.send_message(QueueUrl=queue_url, MessageBody=str(i))
+    messages = _receive(client, queue_url) + _receive(client, queue_url)
+    assert len(messages) == 12
+
+    heartbeat = VisibilityHeartbeat(visibility_timeout=1, extension=30, clock=clock)
+    heartbeat.start = Mock()  # beats are driven by the test
+    for message in messages:
+        heartbeat.track(SQSTarget(client, queue_url, message["ReceiptHandle"]))
+
+    heartbeat.beat(now=0.0)
+    assert heartbeat.stats()["extensions"] == 0
+    heartbeat.beat(now=0.8)
+    assert heartbeat.stats()["extensions"] == 12
+    assert heartbeat.stats()["batches"] == 2
+
+    time.sleep(1.2)
+    assert _receive(client, queue_url) == []
+
+
+def test_heartbeat_respects_cap(sqs, clock):
+    client, queue_url = sqs
+    client.send_message(QueueUrl=queue_url, MessageBody="slow")
+    (message,) = _receive(client, queue_url)
+
+    heartbeat = VisibilityHeartbeat(
+        visibility_timeout=1, extension=10, max_visibility=15, clock=clock
+    )
+    heartbeat.start = Mock()
+    token = heartbeat.track(SQSTarget(client, queue_url, message["ReceiptHandle"]))
+    for now in (0.8, 10.8, 14.9):
+        heartbeat.beat(now=now)
+    stats = heartbeat.stats()
+    assert stats["extensions"] == 2  # the second one only up to the cap
+    assert stats["capped"] == 1
+    heartbeat.untrack(token)
+    assert heartbeat.stats()["in_flight"] == 0
+
+
+def test_subscriber_tracks_message_while_hook_runs():
+    heartbeat = VisibilityHeartbeat(visibility_timeout=30)
+    heartbeat.start = Mock()
+    seen = []
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://",
+        queue_name="test_queue",
+        hook=lambda event, trace_ctx: seen.append(heartbeat.stats()["in_flight"]),
+        visibility_heartbeat=heartbeat,
+    )
+    message = Mock()
+    message.delivery_info = {
+        "sqs_message": {"ReceiptHandle": "handle"},
+        "sqs_queue": "https://sqs/events",
+        "routing_key": "events",
+    }
+    event = Event.create("ReportBuilt", "reports", ReportBuiltPayload(id="1"))
+    subscriber.process_message(
+        json.dumps({"Message": event.json(by_alias=True)}), message
+    )
+    assert seen == [1]
+    assert heartbeat.stats()["in_flight"] == 0
+    message.ack.assert_called_once()
@@ -0,0 +1,140 @@
+import json
+import pytest
+import sys
+from datetime import datetime
+from typing import List
+from unittest.mock import Mock, patch
+from uuid import UUID, uuid4
+
+from communicate.utils.eventbus import (
+    AmazonSNSPublisher,
+    AmazonSNSSubscriber,
+    Event,
+    EventPayload,
+)
+from communicate.utils.eventbus import wire
+from communicate.utils.eventbus.publisher.providers import ProviderSNS
+from communicate.utils.eventbus.wire import (
+    UnknownContentType,
+    content_type_of,
+    get_wire_codec,
+)
+
+msgpack = pytest.importorskip("msgpack")
+
+
+class MeterReadPayload(EventPayload):
+    id: UUID
+    values: List[float]
+    read_at: datetime
+
+
+def _event() -> Event:
+    event = Event.create(
+        "MeterRead",
+        "meters",
+        MeterReadPayload(
+            id=uuid4(), values=[0.5, 1, 2.25], read_at=datetime(2024, 1, 1)
+        ),
+    )
+    event.metadata.add_routing_key("region", "eu")
+    return event
+
+
+def _notification(entry: dict) -> str:
+    """SNS envelope of a published entry, as delivered to SQS"""
+    return json.dumps({
+        "Type": "Notification",
+        "Message": entry["Message"],
+        "MessageAttributes": {
+            name: {"Type": attr["DataType"], "Value": attr["StringValue"]}
+            for name, attr in entry["MessageAttributes"].items()
+        },
+    })
+
+
+def test_msgpack_round_trip_matches_json():
+    event = _event()
+    raw = get_wire_codec("msgpack").encode(event)
+    assert raw.isascii()
+    assert get_wire_codec("application/x-msgpack").decode(raw) == (
+        Event.parse_raw(event.json(by_alias=True))
+    )
+
+
+def test_unknown_codec():
+    with pytest.raises(UnknownContentType):
+        get_wire_codec("avro")
+    assert get_wire_codec(None).name == "json"
+
+
+def test_missing_msgpack_is_an_unknown_content_type(monkeypatch):
+    monkeypatch.setattr(wire, "_codecs", {})
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    with pytest.raises(UnknownContentType, match="not available"):
+        get_wire_codec("application/x-msgpack")
+
+    with patch("boto3.session.Session"):
+        provider = ProviderSNS(accountId="1")
+    entry = provider.build_entry(_event())
+    entry["MessageAttributes"]["contentType"] = {
+        "DataType": "String", "StringValue": "application/x-msgpack"
+    }
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://", queue_name="test_queue", hook=Mock()
+    )
+    message = Mock()
+    subscriber.process_message(_notification(entry), message)
+    assert subscriber.stats()["counters"]["dropped"] == 1
+
+
+def test_publisher_advertises_the_codec():
+    with patch("boto3.session.Session"):
+        publisher = AmazonSNSPublisher(
+            "Meters",
+            {"topic_arn": "arn:aws:sns:us-east-1:000000000000:t", "codec": "msgpack"},
+        )
+    publisher.conn = Mock()
+    publisher.publish_event(_event())
+    sent = publisher.conn.publish.call_args.kwargs
+    assert sent["MessageAttributes"]["contentType"] == {
+        "DataType": "String", "StringValue": "application/x-msgpack"
+    }
+    assert content_type_of(json.loads(_notification(sent))) == (
+        "application/x-msgpack"
+    )
+
+
+def test_route_codec_and_json_default():
+    with patch("boto3.session.Session"):
+        provider = ProviderSNS(accountId="1", codec="msgpack")
+        default = ProviderSNS(accountId="1")
+    assert provider.build_entry(_event())["MessageAttributes"]["contentType"]
+    entry = default.build_entry(_event())
+    assert "contentType" not in entry["MessageAttributes"]
+    assert Event.parse_raw(entry["Message"]).metadata.event_name == "MeterRead"
+
+
+@pytest.mark.parametrize("lazy_events", [False, True])
+def test_subscriber_decodes_by_content_type(lazy_events):
+    with patch("boto3.session.Session"):
+        provider = ProviderSNS(accountId="1", codec="msgpack")
+    hook = Mock()
+    subscriber = AmazonSNSSubscriber(
+        connection_url="memory://",
+        queue_name="test_queue",
+        hook=hook,
+        lazy_events=lazy_events,
+    )
+    event = _event()
+    message = Mock()
+    subscriber.process_message(
+        _notification(provider.build_entry(event)), message
+    )
+    message.ack.assert_called_once()
+    assert hook.call_args.args[0].metadata == event.metadata
+
+    entry = provider.build_entry(event)
+    entry["MessageAttributes"]["contentType"]["StringValue"] = "text/avro"
+    subscriber.process_message(_notification(entry), Mock())
+    assert subscriber.stats()["counters"]["dropped"] == 1
@@ -0,0 +1,44 @@
+from django.db import models
+from uuid import uuid4
+
+
+class Warehouse(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid4)
+    name = models.CharField(max_length=50)
+    address = models.TextField(default="x" * 2000)
+
+
+class Shipment(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid4)
+    reference = models.CharField(max_length=50)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    manifest = models.TextField(default="y" * 20000)
+    notes = models.TextField(default="z" * 20000)
+
+    @property
+    def label(self):
+        return f"{self.reference}/{self.notes[:3]}"
+
+
+class Package(models.Model):
+    shipment = models.ForeignKey(
+        Shipment, on_delete=models.CASCADE, related_name="packages"
+    )
+    weight = models.IntegerField()
+    contents = models.TextField(default="w" * 5000)
+
+
+class Voucher(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid4)
+    code = models.CharField(max_length=20)
+    redeemed = models.BooleanField(default=False)
+    terms = models.TextField(default="t" * 5000)
+
+
+class Account(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid4)
+    email = models.CharField(max_length=100)
+    plan = models.CharField(max_length=20)
+    bio = models.TextField(default="b" * 5000)
+    billing_cycle = models.CharField(max_length=20, default="monthly")
+    version = models.IntegerField(default=1)